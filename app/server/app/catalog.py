@@ -0,0 +1,31 @@
+"""Catalog constants and checks shared by the routers and the scripts.
+
+Kept apart from app.routers.book so the import script and other routers can
+read them without importing the book router and what it starts.
+"""
+from fastapi import HTTPException
+
+# Available book categories
+AVAILABLE_CATEGORIES = [
+    "ความรู้", "นิยาย", "มังงะ", "ศิลปะ", "วิทยาศาสตร์",
+    "ประวัติศาสตร์", "ธุรกิจ", "การศึกษา", "เทคโนโลยี",
+    "สุขภาพ", "การเงิน", "จิตวิทยา", "อื่นๆ"
+]
+
+# Maximum upload size per file type
+MAX_UPLOAD_SIZES = {
+    "pdf": 100 * 1024 * 1024,
+    "cover": 5 * 1024 * 1024
+}
+
+# Image types accepted as covers
+COVER_EXTENSIONS = {'jpg', 'jpeg', 'png', 'gif', 'webp'}
+
+def validate_cover_filename(filename: str):
+    """Reject cover uploads that are not a supported image type"""
+    file_extension = filename.split('.')[-1].lower()
+    if file_extension not in COVER_EXTENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid cover file type. Allowed: {', '.join(COVER_EXTENSIONS)}"
+        )
@@ -1,10 +1,58 @@
 from dotenv import load_dotenv
 import os
+import tempfile
 
 dotenv_path = os.path.join(os.path.dirname(__file__), ".env")
 load_dotenv(dotenv_path=dotenv_path)
 
 MONGO_URI = os.getenv("MONGO_URI")
+MONGO_TLS = os.getenv("MONGO_TLS", "true").lower() == "true"
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
\ No newline at end of file
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))
+
+# Local disk cache for hot PDF blobs (0 disables it)
+BLOB_CACHE_DIR = os.getenv("BLOB_CACHE_DIR", os.path.join(tempfile.gettempdir(), "san-blob-cache"))
+BLOB_CACHE_MAX_BYTES = int(os.getenv("BLOB_CACHE_MAX_MB", "2048")) * 1024 * 1024
+
+# Linearize ("fast web view") uploaded PDFs before they are stored
+PDF_LINEARIZE_ON_UPLOAD = os.getenv("PDF_LINEARIZE_ON_UPLOAD", "true").lower() == "true"
+
+# Processes for CPU-heavy work such as image resizing and PDF splitting (0 = one per CPU but one)
+PROCESS_POOL_WORKERS = int(os.getenv("PROCESS_POOL_WORKERS", "0"))
+
+# Where blob bytes live: "gridfs", "local" or "s3"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "gridfs").lower()
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", os.path.abspath("blob-storage"))
+
+# S3-compatible object store (set S3_ENDPOINT_URL for MinIO or other providers)
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
+S3_BUCKET = os.getenv("S3_BUCKET", "san-blobs")
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+S3_ACCESS_KEY_ID = os.getenv("S3_ACCESS_KEY_ID")
+S3_SECRET_ACCESS_KEY = os.getenv("S3_SECRET_ACCESS_KEY")
+
+# Background ingestion of uploaded books (0 workers = this process only enqueues)
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_LEASE_SECONDS = int(os.getenv("INGEST_LEASE_SECONDS", "300"))
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "5"))
+INGEST_POLL_SECONDS = float(os.getenv("INGEST_POLL_SECONDS", "2"))
+
+# Resumable uploads: sessions idle for longer than this are deleted with their data
+UPLOAD_SESSION_TTL_HOURS = float(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24"))
+
+# Log queries that read whole book documents as a list (development aid)
+WARN_UNPROJECTED_QUERIES = os.getenv("WARN_UNPROJECTED_QUERIES", "false").lower() == "true"
+
+# In-process cache of catalog listing results (0 entries or TTL disables it)
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "2000"))
+QUERY_CACHE_MAX_BYTES = int(os.getenv("QUERY_CACHE_MAX_MB", "64")) * 1024 * 1024
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", "30"))
+
+# Typeahead: how often books inserted by other processes are picked up (0 = never)
+SUGGEST_REFRESH_SECONDS = float(os.getenv("SUGGEST_REFRESH_SECONDS", "60"))
+# Typeahead: how often books deleted or rated by other processes are caught up with (0 = never)
+SUGGEST_RECONCILE_SECONDS = float(os.getenv("SUGGEST_RECONCILE_SECONDS", "600"))
+
+# Faceted search: category counts stop after this many matches (0 = always count exactly)
+FACET_COUNT_LIMIT = int(os.getenv("FACET_COUNT_LIMIT", "10000"))
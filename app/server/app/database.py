@@ -1,20 +1,26 @@
-from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo.server_api import ServerApi
 import certifi
 import logging
 import asyncio
-from app.config import MONGO_URI
+from app.config import MONGO_TLS, MONGO_URI, WARN_UNPROJECTED_QUERIES
+from app.utils.projections import UnprojectedQueryListener
 
 # Setup logging
 logger = logging.getLogger(__name__)
 
-# MongoDB client with SSL configuration
-client = AsyncIOMotorClient(
-    MONGO_URI,
+# SSL configuration (MONGO_TLS=false for a local mongod without TLS)
+tls_options = dict(
     tls=True,
     tlsCAFile=certifi.where(),
     tlsAllowInvalidCertificates=True,   # For development
     tlsAllowInvalidHostnames=True,      # For development
+) if MONGO_TLS else {}
+
+# MongoDB client
+client = AsyncIOMotorClient(
+    MONGO_URI,
+    **tls_options,
     server_api=ServerApi('1'),
     connectTimeoutMS=10000,
     socketTimeoutMS=10000,
@@ -24,16 +30,23 @@ client = AsyncIOMotorClient(
     retryWrites=True,
     retryReads=True,
     heartbeatFrequencyMS=30000,
+    event_listeners=[UnprojectedQueryListener(["books"])] if WARN_UNPROJECTED_QUERIES else [],
 )
 
 # Database and collections
 database = client.fastapi_jwt_db
 user_collection = database.get_collection("users")
 book_collection = database.get_collection("books")  # Changed from "book" to "books"
-
-# GridFS buckets for file storage
-pdf_gridfs_bucket = AsyncIOMotorGridFSBucket(database, bucket_name="pdfs")
-cover_gridfs_bucket = AsyncIOMotorGridFSBucket(database, bucket_name="covers")
+blob_collection = database.get_collection("blobs")  # Content-addressed registry of stored files
+derivative_collection = database.get_collection("blob_derivatives")  # Files generated from a blob
+local_file_collection = database.get_collection("local_blob_files")  # File documents of the local filesystem backend
+s3_file_collection = database.get_collection("s3_blob_files")  # File documents of the S3 backend
+ingest_job_collection = database.get_collection("ingest_jobs")  # Background processing of uploaded books
+upload_session_collection = database.get_collection("upload_sessions")  # Resumable uploads in progress
+storage_stats_collection = database.get_collection("storage_stats")  # Incrementally maintained file and book counters
+search_posting_collection = database.get_collection("search_postings")  # N-gram postings of the catalog search index
+search_doc_collection = database.get_collection("search_docs")  # Books in the search index, by document number
+search_term_collection = database.get_collection("search_terms")  # Document frequency of each indexed n-gram
 
 async def test_connection():
     """ทดสอบการเชื่อมต่อ MongoDB"""
@@ -46,13 +59,13 @@ async def test_connection():
         
         # Test basic operations
         await asyncio.wait_for(
-            user_collection.count_documents({}),
+            user_collection.estimated_document_count(),
             timeout=5.0
         )
         logger.info("✓ Database operations working")
         
-        # Test GridFS buckets
-        await test_gridfs_buckets()
+        # Test blob storage
+        await test_blob_storage()
         
         return True
     except asyncio.TimeoutError:
@@ -62,19 +75,20 @@ async def test_connection():
         logger.error(f"✗ MongoDB connection failed: {e}")
         return False
 
-async def test_gridfs_buckets():
-    """Test GridFS buckets functionality"""
+async def test_blob_storage():
+    """Test blob storage functionality"""
     try:
-        # Test if we can access GridFS buckets
-        pdf_files = await pdf_gridfs_bucket.find().to_list(length=1)
-        cover_files = await cover_gridfs_bucket.find().to_list(length=1)
+        from app.storage.stats import read_stats
+        from app.storage.store import storage
         
-        logger.info("✓ GridFS buckets accessible")
-        logger.info(f"  - PDF files in GridFS: {len(pdf_files) if pdf_files else 0}")
-        logger.info(f"  - Cover files in GridFS: {len(cover_files) if cover_files else 0}")
+        stats = await read_stats(storage, ["pdfs", "covers"])
+        
+        logger.info(f"✓ Blob storage accessible ({storage.name})")
+        logger.info(f"  - PDF files: {stats['buckets']['pdfs']['files']}")
+        logger.info(f"  - Cover files: {stats['buckets']['covers']['files']}")
         
     except Exception as e:
-        logger.warning(f"GridFS bucket test failed: {e}")
+        logger.warning(f"Blob storage test failed: {e}")
 
 async def get_database_info():
     """ดึงข้อมูล database สำหรับ debugging"""
@@ -110,110 +124,35 @@ async def get_database_info():
         return None
 
 async def ensure_indexes():
-    """สร้าง indexes ที่จำเป็น"""
+    """Start building the missing indexes of the registry (app.indexes) in the background"""
     try:
         if not await test_connection():
             logger.warning("Skipping index creation - no database connection")
             return
-            
-        # User collection indexes
-        await user_collection.create_index("username", unique=True)
-        await user_collection.create_index("email", unique=True)
-        
-        # Book collection indexes
-        await book_collection.create_index("title")
-        await book_collection.create_index("author")
-        await book_collection.create_index("category")
-        await book_collection.create_index("created_at")
-        await book_collection.create_index("rating")
-        
-        # GridFS indexes are automatically created by MongoDB
-        # But we can create additional indexes for better performance
-        await database.get_collection("pdfs.files").create_index("metadata.file_type")
-        await database.get_collection("covers.files").create_index("metadata.file_type")
         
-        logger.info("✓ Database indexes created successfully")
+        from app.indexes import start_index_builds
+        start_index_builds()
     except Exception as e:
         logger.warning(f"Index creation warning: {e}")
 
-async def cleanup_orphaned_files():
-    """Clean up GridFS files that don't have corresponding book records"""
-    try:
-        # Get all PDF file IDs from GridFS
-        pdf_files = await pdf_gridfs_bucket.find().to_list(length=None)
-        pdf_file_ids = [file._id for file in pdf_files]
-        
-        # Get all cover file IDs from GridFS
-        cover_files = await cover_gridfs_bucket.find().to_list(length=None)
-        cover_file_ids = [file._id for file in cover_files]
-        
-        # Get all book records
-        books = await book_collection.find({}, {"pdf_id": 1, "cover_id": 1}).to_list(length=None)
-        
-        # Extract referenced file IDs from books
-        referenced_pdf_ids = set()
-        referenced_cover_ids = set()
-        
-        for book in books:
-            if book.get("pdf_id"):
-                referenced_pdf_ids.add(book["pdf_id"])
-            if book.get("cover_id"):
-                referenced_cover_ids.add(book["cover_id"])
-        
-        # Find orphaned files
-        orphaned_pdfs = set(pdf_file_ids) - referenced_pdf_ids
-        orphaned_covers = set(cover_file_ids) - referenced_cover_ids
-        
-        # Delete orphaned files
-        deleted_pdfs = 0
-        deleted_covers = 0
-        
-        for pdf_id in orphaned_pdfs:
-            await pdf_gridfs_bucket.delete(pdf_id)
-            deleted_pdfs += 1
-        
-        for cover_id in orphaned_covers:
-            await cover_gridfs_bucket.delete(cover_id)
-            deleted_covers += 1
-        
-        if deleted_pdfs > 0 or deleted_covers > 0:
-            logger.info(f"✓ Cleanup completed: {deleted_pdfs} PDFs, {deleted_covers} covers deleted")
-        else:
-            logger.info("✓ No orphaned files found")
-            
-        return {"deleted_pdfs": deleted_pdfs, "deleted_covers": deleted_covers}
-        
-    except Exception as e:
-        logger.error(f"Error during cleanup: {e}")
-        return {"error": str(e)}
-
 async def get_storage_stats():
-    """Get detailed storage statistics"""
+    """Get detailed storage statistics from the incrementally maintained counters"""
     try:
-        # Book collection stats
-        total_books = await book_collection.count_documents({})
-        books_with_pdf = await book_collection.count_documents({"pdf_id": {"$exists": True}})
-        books_with_cover = await book_collection.count_documents({"cover_id": {"$exists": True}})
-        
-        # GridFS stats
-        pdf_files = await pdf_gridfs_bucket.find().to_list(length=None)
-        cover_files = await cover_gridfs_bucket.find().to_list(length=None)
+        from app.storage.stats import read_stats
+        from app.storage.store import storage
+        stats = await read_stats(storage, ["pdfs", "covers"])
         
-        # Calculate total sizes
-        total_pdf_size = 0
-        for pdf_file in pdf_files:
-            total_pdf_size += pdf_file.length
-            
-        total_cover_size = 0
-        for cover_file in cover_files:
-            total_cover_size += cover_file.length
+        pdf_usage = stats["buckets"]["pdfs"]
+        cover_usage = stats["buckets"]["covers"]
+        total_pdf_size = pdf_usage["bytes"]
+        total_cover_size = cover_usage["bytes"]
         
         return {
-            "total_books": total_books,
-            "books_with_pdf": books_with_pdf,
-            "books_with_cover": books_with_cover,
-            "total_pdf_files": len(pdf_files),
-            "total_cover_files": len(cover_files),
+            "total_books": stats["books"]["books"],
+            "books_with_pdf": stats["books"]["books_with_pdf"],
+            "books_with_cover": stats["books"]["books_with_cover"],
+            "total_pdf_files": pdf_usage["files"],
+            "total_cover_files": cover_usage["files"],
             "total_pdf_size_mb": round(total_pdf_size / (1024 * 1024), 2),
             "total_cover_size_mb": round(total_cover_size / (1024 * 1024), 2),
             "total_storage_mb": round((total_pdf_size + total_cover_size) / (1024 * 1024), 2)
@@ -231,10 +170,12 @@ async def close_connection():
     except Exception as e:
         logger.error(f"Error closing MongoDB connection: {e}")
 
-# Export GridFS buckets for use in other modules
+# Export collections for use in other modules
 __all__ = [
     'client', 'database', 'user_collection', 'book_collection',
-    'pdf_gridfs_bucket', 'cover_gridfs_bucket',
+    'blob_collection', 'derivative_collection', 'local_file_collection', 's3_file_collection',
+    'ingest_job_collection', 'upload_session_collection', 'storage_stats_collection',
+    'search_posting_collection', 'search_doc_collection', 'search_term_collection',
     'test_connection', 'ensure_indexes', 'close_connection',
-    'get_database_info', 'cleanup_orphaned_files', 'get_storage_stats'
+    'get_database_info', 'get_storage_stats'
 ]
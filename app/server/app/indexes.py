@@ -0,0 +1,245 @@
+"""Registry of the MongoDB indexes the application's queries rely on.
+
+Every index is declared once in ``INDEXES`` together with the query shapes
+it serves, so an index is added with the query that needs it and can be
+dropped with the last one. At startup ``start_index_builds`` compares the
+registry with the indexes that exist and builds the missing ones in a
+background task; the application serves requests meanwhile (queries
+needing an index still being built are just slower).
+
+``index_report`` (GET /admin/indexes) lists registered indexes that are
+missing, registered indexes that ``$indexStats`` shows no use of since the
+server started, and existing indexes the registry does not know about.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import IndexModel
+
+from app.database import database
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class IndexSpec:
+    collection: str
+    keys: Tuple[Tuple[str, int], ...]
+    serves: Tuple[str, ...]  # query shapes, for the report
+    options: Dict[str, Any] = field(default_factory=dict)  # unique, sparse, partialFilterExpression
+
+    @property
+    def name(self) -> str:
+        # MongoDB's default name for the key pattern
+        return "_".join(f"{key}_{direction}" for key, direction in self.keys)
+
+    def model(self) -> IndexModel:
+        return IndexModel(list(self.keys), name=self.name, **self.options)
+
+def index(collection: str, keys: List[Tuple[str, int]], *serves: str, **options) -> IndexSpec:
+    return IndexSpec(collection, tuple(keys), serves, options)
+
+INDEXES: List[IndexSpec] = [
+    # ============ USERS ============
+    index("users", [("username", 1)],
+          "login and every /users/me lookup and update by username",
+          "reading history update: {username, reading_history.book_id}",
+          unique=True),
+    index("users", [("email", 1)], "registration: email already taken", unique=True),
+    # Multikey: one entry per book in a library
+    index("users", [("library.book_id", 1)],
+          "creator stats and sales history: {library.book_id: {$in}}",
+          "creator books: readers per book {library.book_id}"),
+    # Multikey: one entry per followed creator
+    index("users", [("following", 1)], "follower count of a creator: {following}"),
+
+    # ============ BOOKS ============
+    # Listings page by (sort field, _id) keysets, optionally within one category
+    index("books", [("created_at", 1), ("_id", 1)], "GET /books sorted by created_at"),
+    index("books", [("rating", 1), ("_id", 1)],
+          "GET /books sorted by rating",
+          "recommendations without reading history: best rated books"),
+    index("books", [("title", 1), ("_id", 1)], "GET /books sorted by title"),
+    index("books", [("author", 1), ("_id", 1)], "GET /books sorted by author"),
+    index("books", [("category", 1), ("created_at", 1), ("_id", 1)], "GET /books?category= sorted by created_at"),
+    index("books", [("category", 1), ("rating", 1), ("_id", 1)],
+          "GET /books?category= sorted by rating",
+          "recommendations: {category} or {category: {$in}} by rating"),
+    index("books", [("category", 1), ("title", 1), ("_id", 1)], "GET /books?category= sorted by title"),
+    index("books", [("category", 1), ("author", 1), ("_id", 1)], "GET /books?category= sorted by author"),
+    index("books", [("author", 1), ("created_at", 1), ("_id", 1)],
+          "creator dashboard and profile: {author} newest first"),
+    # Files are looked up by the books that reference them
+    index("books", [("pdf_id", 1)], "blob replacement and page counts: {pdf_id}", sparse=True),
+    index("books", [("cover_id", 1)], "blob replacement: {cover_id}", sparse=True),
+    # Multikey: one entry per review
+    index("books", [("reviews.user_id", 1)], "GET /books/user/reviews: {reviews.user_id}"),
+
+    # ============ READING SESSIONS ============
+    index("reading_sessions", [("user_id", 1), ("status", 1), ("last_read", 1), ("_id", 1)],
+          "reading lists: {user_id, status} by (last_read, _id)",
+          "reading stats: count {user_id, status}"),
+    index("reading_sessions", [("user_id", 1), ("book_id", 1)],
+          "progress updates and completion: {user_id, book_id}",
+          "recommendations: books read {user_id}"),
+    index("reading_sessions", [("user_id", 1), ("last_read", 1)],
+          "reading stats: {user_id, last_read: {$gte}}"),
+
+    # ============ BLOB STORAGE ============
+    # One live blob per digest and bucket
+    index("blobs", [("bucket", 1), ("sha256", 1)],
+          "upload deduplication: {bucket, sha256}",
+          unique=True, partialFilterExpression={"sha256": {"$type": "string"}}),
+    index("blobs", [("bucket", 1), ("refcount", 1)], "reference counting: {bucket, refcount}"),
+    index("blobs", [("bucket", 1), ("_id", 1)], "orphan cleanup: each bucket in _id order"),
+    index("blob_derivatives", [("source_id", 1), ("kind", 1), ("page", 1)],
+          "page images and cover variants: {source_id, kind, page}"),
+    # One page split claim per PDF (app.media.pdf_pages.SPLIT_KIND)
+    index("blob_derivatives", [("source_id", 1), ("kind", 1)],
+          "page splits: claim of a PDF {source_id, kind}",
+          unique=True, partialFilterExpression={"kind": "pdf_page_split"}),
+    index("local_blob_files", [("bucket", 1), ("uploadDate", 1)], "local backend listings: {bucket} by uploadDate"),
+    index("s3_blob_files", [("bucket", 1), ("uploadDate", 1)], "S3 backend listings: {bucket} by uploadDate"),
+
+    # ============ INGESTION ============
+    index("ingest_jobs", [("status", 1), ("available_at", 1)], "leasing: queued jobs due first"),
+    index("ingest_jobs", [("status", 1), ("lease_expires_at", 1)], "leasing: expired leases"),
+    index("ingest_jobs", [("book_id", 1)], "job of a book"),
+    index("ingest_jobs", [("finished_at", 1)], "queue metrics: recently finished jobs"),
+    index("upload_sessions", [("status", 1), ("expires_at", 1)], "resumable upload sweeper: expired sessions"),
+
+    # ============ SEARCH ============
+    index("search_postings", [("term", 1), ("block", 1)], "search: postings blocks of a term", unique=True),
+    index("search_docs", [("book_id", 1)], "search index updates: entry of a book", unique=True),
+]
+
+# Build state of each registered index by "collection.name", for the report
+build_status: Dict[str, str] = {}
+
+_builder: Optional[asyncio.Task] = None
+
+def indexes_for(collection: str) -> List[IndexSpec]:
+    return [spec for spec in INDEXES if spec.collection == collection]
+
+def _key_pattern(keys) -> Tuple[Tuple[str, Any], ...]:
+    return tuple((key, int(direction) if isinstance(direction, (int, float)) else direction) for key, direction in keys)
+
+async def missing_indexes(collection: AsyncIOMotorCollection, specs: List[IndexSpec]) -> List[IndexSpec]:
+    """Specs with no existing index on the same key pattern"""
+    existing = {_key_pattern(info["key"].items()) async for info in collection.list_indexes()}
+    return [spec for spec in specs if _key_pattern(spec.keys) not in existing]
+
+async def ensure_collection_indexes(collection: AsyncIOMotorCollection):
+    """Create the registered indexes of one collection now (scripts, scratch databases)"""
+    specs = indexes_for(collection.name)
+    if specs:
+        await collection.create_indexes([spec.model() for spec in specs])
+
+async def build_missing_indexes():
+    """Build the registered indexes that do not exist yet, one at a time"""
+    pending: List[IndexSpec] = []
+    for collection_name in dict.fromkeys(spec.collection for spec in INDEXES):
+        collection = database.get_collection(collection_name)
+        for spec in await missing_indexes(collection, indexes_for(collection_name)):
+            build_status[f"{spec.collection}.{spec.name}"] = "pending"
+            pending.append(spec)
+    if not pending:
+        logger.info("✓ All registered indexes exist")
+        return
+
+    logger.info(f"Building {len(pending)} missing indexes in the background")
+    for spec in pending:
+        key = f"{spec.collection}.{spec.name}"
+        build_status[key] = "building"
+        try:
+            await database.get_collection(spec.collection).create_indexes([spec.model()])
+            build_status[key] = "ready"
+            logger.info(f"✓ Built index {key}")
+        except asyncio.CancelledError:
+            build_status[key] = "pending"
+            raise
+        except Exception as e:
+            # e.g. duplicates under a unique index; the others are still built
+            build_status[key] = f"failed: {e}"
+            logger.warning(f"⚠️ Could not build index {key}: {e}")
+
+async def _build_forever():
+    try:
+        await build_missing_indexes()
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.warning(f"⚠️ Index builds stopped: {e}")
+
+def start_index_builds():
+    global _builder
+    if _builder is None or _builder.done():
+        _builder = asyncio.create_task(_build_forever())
+
+async def stop_index_builds():
+    global _builder
+    if _builder is not None:
+        _builder.cancel()
+        await asyncio.gather(_builder, return_exceptions=True)
+        _builder = None
+
+async def _index_usage(collection: AsyncIOMotorCollection) -> Dict[str, dict]:
+    """Operations per index since the server started (summed over the members reporting)"""
+    usage: Dict[str, dict] = {}
+    async for stats in collection.aggregate([{"$indexStats": {}}]):
+        entry = usage.setdefault(stats["name"], {"ops": 0, "since": None})
+        entry["ops"] += int(stats["accesses"]["ops"])
+        since = stats["accesses"].get("since")
+        if since is not None and (entry["since"] is None or since < entry["since"]):
+            entry["since"] = since
+    return usage
+
+async def index_report() -> dict:
+    """Missing, unused and unregistered indexes of every registered collection"""
+    missing, unused, unregistered, indexes = [], [], [], []
+    for collection_name in dict.fromkeys(spec.collection for spec in INDEXES):
+        collection = database.get_collection(collection_name)
+        existing = {info["name"]: _key_pattern(info["key"].items()) async for info in collection.list_indexes()}
+        usage = await _index_usage(collection) if existing else {}
+        registered = set()
+
+        for spec in indexes_for(collection_name):
+            key_pattern = _key_pattern(spec.keys)
+            name = next((name for name, keys in existing.items() if keys == key_pattern), None)
+            entry = {
+                "collection": collection_name,
+                "name": name or spec.name,
+                "keys": dict(spec.keys),
+                "serves": list(spec.serves),
+                "exists": name is not None,
+                "ops": usage.get(name, {}).get("ops", 0),
+                "since": usage.get(name, {}).get("since")
+            }
+            indexes.append(entry)
+            if name is None:
+                missing.append({**entry, "build": build_status.get(f"{collection_name}.{spec.name}", "not started")})
+                continue
+            registered.add(name)
+            # Unique indexes are needed for their constraint whether read or not
+            if entry["ops"] == 0 and not spec.options.get("unique"):
+                unused.append(entry)
+
+        for name, keys in existing.items():
+            if name != "_id_" and name not in registered:
+                unregistered.append({
+                    "collection": collection_name,
+                    "name": name,
+                    "keys": dict(keys),
+                    "ops": usage.get(name, {}).get("ops", 0),
+                    "since": usage.get(name, {}).get("since")
+                })
+
+    return {
+        "registered": len(INDEXES),
+        "missing": missing,
+        "unused": unused,
+        "unregistered": unregistered,
+        "indexes": indexes
+    }
@@ -0,0 +1,224 @@
+"""MongoDB-backed job queue with leases and retries.
+
+A job document looks like::
+
+    {"_id": ObjectId, "type": "book_ingest", "book_id": ObjectId,
+     "status": "queued" | "running" | "succeeded" | "failed" | "cancelled",
+     "payload": {...}, "result": {...}, "stage": "store_pdf",
+     "completed_stages": [...], "stage_timings": {"store_pdf": 1.42},
+     "attempts": 1, "max_attempts": 5, "error": None,
+     "available_at": datetime, "lease_expires_at": datetime, "worker_id": "...",
+     "created_at": datetime, "started_at": datetime, "finished_at": datetime}
+
+A worker leases a job by atomically moving it to ``running`` with a lease
+expiry. Leases are extended while the job runs; a job whose worker died is
+leased again once its lease runs out. Failed attempts are retried with
+exponential backoff until ``max_attempts`` is reached.
+
+Every write a worker makes to a job it runs is fenced by its ``worker_id``:
+once the lease was lost and another worker took the job over, the writes of
+the first one match nothing and raise ``LeaseLost`` instead.
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from app.config import INGEST_LEASE_SECONDS, INGEST_MAX_ATTEMPTS
+from app.database import ingest_job_collection
+
+logger = logging.getLogger(__name__)
+
+# Delay before the first retry; doubles with every further attempt
+RETRY_BASE_DELAY = timedelta(seconds=10)
+RETRY_MAX_DELAY = timedelta(minutes=30)
+
+# Finished jobs considered for the latency metrics
+METRICS_WINDOW = timedelta(hours=1)
+
+class LeaseLost(Exception):
+    """The job is no longer leased to this worker"""
+
+def _leased(job: dict) -> dict:
+    """Filter matching the job only while the worker that leased it still holds it"""
+    return {"_id": job["_id"], "status": "running", "worker_id": job["worker_id"]}
+
+async def _update_leased(job: dict, update: dict):
+    result = await ingest_job_collection.update_one(_leased(job), update)
+    if result.matched_count != 1:
+        raise LeaseLost(f"Job {job['_id']} is no longer leased to {job['worker_id']}")
+
+async def enqueue_job(job_type: str, book_id: Optional[ObjectId], payload: dict) -> ObjectId:
+    """Add a job that any worker may run right away"""
+    now = datetime.utcnow()
+    result = await ingest_job_collection.insert_one({
+        "type": job_type,
+        "book_id": book_id,
+        "status": "queued",
+        "payload": payload,
+        "result": {},
+        "stage": None,
+        "completed_stages": [],
+        "stage_timings": {},
+        "attempts": 0,
+        "max_attempts": INGEST_MAX_ATTEMPTS,
+        "error": None,
+        "available_at": now,
+        "lease_expires_at": None,
+        "worker_id": None,
+        "created_at": now,
+        "started_at": None,
+        "finished_at": None
+    })
+    return result.inserted_id
+
+async def lease_job(worker_id: str) -> Optional[dict]:
+    """Take the oldest due job, or one whose previous lease expired"""
+    now = datetime.utcnow()
+    return await ingest_job_collection.find_one_and_update(
+        {
+            "$or": [
+                {"status": "queued", "available_at": {"$lte": now}},
+                {"status": "running", "lease_expires_at": {"$lt": now}}
+            ]
+        },
+        {
+            "$set": {
+                "status": "running",
+                "worker_id": worker_id,
+                "lease_expires_at": now + timedelta(seconds=INGEST_LEASE_SECONDS),
+                "started_at": now
+            },
+            "$inc": {"attempts": 1}
+        },
+        sort=[("available_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+async def extend_lease(job_id: ObjectId, worker_id: str) -> bool:
+    """Push the lease expiry forward; False if another worker took the job over"""
+    result = await ingest_job_collection.update_one(
+        {"_id": job_id, "status": "running", "worker_id": worker_id},
+        {"$set": {"lease_expires_at": datetime.utcnow() + timedelta(seconds=INGEST_LEASE_SECONDS)}}
+    )
+    return result.matched_count == 1
+
+async def record_stage(job: dict, stage: str, seconds: float, result: Optional[dict] = None):
+    """Mark a stage finished with its duration and any values later stages need"""
+    update = {
+        "$set": {f"stage_timings.{stage}": round(seconds, 4)},
+        "$addToSet": {"completed_stages": stage}
+    }
+    for key, value in (result or {}).items():
+        update["$set"][f"result.{key}"] = value
+    await _update_leased(job, update)
+
+async def save_progress(job: dict, values: dict):
+    """Store intermediate results (e.g. a checkpoint) so a retried attempt resumes from them"""
+    await _update_leased(job, {"$set": {f"result.{key}": value for key, value in values.items()}})
+
+async def set_stage(job: dict, stage: str):
+    await _update_leased(job, {"$set": {"stage": stage}})
+
+async def complete_job(job: dict, status: str = "succeeded"):
+    await _update_leased(job, {"$set": {
+        "status": status,
+        "stage": None,
+        "lease_expires_at": None,
+        "error": None,
+        "finished_at": datetime.utcnow()
+    }})
+
+async def fail_job(job: dict, error: str) -> bool:
+    """Schedule a retry with backoff, or fail the job for good.
+
+    Returns True when the job will be retried.
+    """
+    now = datetime.utcnow()
+    if job["attempts"] < job["max_attempts"]:
+        delay = min(RETRY_BASE_DELAY * (2 ** (job["attempts"] - 1)), RETRY_MAX_DELAY)
+        await _update_leased(job, {"$set": {
+            "status": "queued",
+            "error": error,
+            "available_at": now + delay,
+            "lease_expires_at": None,
+            "worker_id": None
+        }})
+        return True
+
+    await _update_leased(job, {"$set": {
+        "status": "failed",
+        "error": error,
+        "lease_expires_at": None,
+        "finished_at": now
+    }})
+    return False
+
+async def get_job(job_id: ObjectId) -> Optional[dict]:
+    return await ingest_job_collection.find_one({"_id": job_id}, {"payload": 0})
+
+async def queue_metrics() -> dict:
+    """Queue depth by status and per-stage latency of recently finished jobs"""
+    now = datetime.utcnow()
+    depth = {
+        doc["_id"]: doc["count"]
+        for doc in await ingest_job_collection.aggregate([
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+        ]).to_list(length=None)
+    }
+
+    oldest = await ingest_job_collection.find_one(
+        {"status": "queued", "available_at": {"$lte": now}},
+        {"created_at": 1},
+        sort=[("available_at", 1)]
+    )
+
+    since = now - METRICS_WINDOW
+    stages = {
+        doc["_id"]: {
+            "count": doc["count"],
+            "avg_seconds": round(doc["avg"], 3),
+            "max_seconds": round(doc["max"], 3)
+        }
+        for doc in await ingest_job_collection.aggregate([
+            {"$match": {"finished_at": {"$gte": since}}},
+            {"$project": {"timings": {"$objectToArray": "$stage_timings"}}},
+            {"$unwind": "$timings"},
+            {"$group": {
+                "_id": "$timings.k",
+                "count": {"$sum": 1},
+                "avg": {"$avg": "$timings.v"},
+                "max": {"$max": "$timings.v"}
+            }}
+        ]).to_list(length=None)
+    }
+
+    totals = await ingest_job_collection.aggregate([
+        {"$match": {"finished_at": {"$gte": since}, "status": "succeeded"}},
+        {"$group": {
+            "_id": None,
+            "count": {"$sum": 1},
+            "avg_ms": {"$avg": {"$subtract": ["$finished_at", "$created_at"]}},
+            "max_ms": {"$max": {"$subtract": ["$finished_at", "$created_at"]}}
+        }}
+    ]).to_list(length=1)
+
+    return {
+        "queue_depth": {
+            "queued": depth.get("queued", 0),
+            "running": depth.get("running", 0),
+            "succeeded": depth.get("succeeded", 0),
+            "failed": depth.get("failed", 0),
+            "cancelled": depth.get("cancelled", 0)
+        },
+        "oldest_queued_seconds": round((now - oldest["created_at"]).total_seconds(), 1) if oldest else 0.0,
+        "window_minutes": int(METRICS_WINDOW.total_seconds() // 60),
+        "stage_latency": stages,
+        "end_to_end": {
+            "count": totals[0]["count"],
+            "avg_seconds": round(totals[0]["avg_ms"] / 1000, 3),
+            "max_seconds": round(totals[0]["max_ms"] / 1000, 3)
+        } if totals else {"count": 0, "avg_seconds": 0.0, "max_seconds": 0.0}
+    }
@@ -0,0 +1,225 @@
+"""Processing of uploaded books after the upload request has returned.
+
+``upload_book`` (or the finalize step of a resumable upload) only leaves the
+raw files in the ``staging`` bucket and inserts the book with
+``status: "processing"``. A ``book_ingest`` job then
+runs these stages, each timed and recorded on the job so a retry skips the
+ones already done:
+
+    store_cover -> cover_variants -> linearize -> store_pdf -> split_pages
+
+Files are attached to the book as soon as they are stored, and the book
+becomes ``ready`` once every stage has finished.
+"""
+import logging
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from typing import Awaitable, Callable, Optional
+
+from bson import ObjectId
+from fastapi import UploadFile
+
+from app.config import PDF_LINEARIZE_ON_UPLOAD
+from app.database import book_collection
+from app.ingest.jobs import record_stage, set_stage
+from app.media.covers import generate_cover_variants
+from app.media.pdf_linearize import linearize_file
+from app.media.pdf_pages import generate_pdf_pages
+from app.storage.blobs import BOOK_REFERENCE_FIELDS, release_blob, store_blob
+from app.storage.stats import record_book_files
+from app.storage.store import storage
+from app.utils.blob_stream import COVER_BUCKET, PDF_BUCKET, STAGING_BUCKET, iter_blob, stream_upload
+from app.utils.query_cache import invalidate_book
+
+logger = logging.getLogger(__name__)
+
+JOB_TYPE = "book_ingest"
+
+class BookDeleted(Exception):
+    """The book was deleted while its files were being processed"""
+
+async def stage_upload(file: UploadFile, file_type: str, max_size: int) -> dict:
+    """Stream a raw upload into the staging bucket; returns its payload entry"""
+    staging_id, size, _ = await stream_upload(
+        file,
+        STAGING_BUCKET,
+        filename=f"{file_type}_{uuid.uuid4()}_{file.filename}",
+        metadata={
+            "filename": file.filename,
+            "content_type": file.content_type,
+            "file_type": file_type
+        },
+        max_size=max_size
+    )
+    return {
+        "staging_id": staging_id,
+        "filename": file.filename,
+        "content_type": file.content_type,
+        "size": size
+    }
+
+def _staged_ids(entry: dict) -> list:
+    """Staging files of a payload entry: one upload, or the parts of a resumable upload"""
+    if entry.get("staging_parts"):
+        return list(entry["staging_parts"])
+    return [entry["staging_id"]] if entry.get("staging_id") else []
+
+async def drop_staged_files(payload: dict):
+    """Delete the staged uploads of a job"""
+    for entry in payload.values():
+        for staging_id in _staged_ids(entry or {}):
+            await storage.delete(STAGING_BUCKET, staging_id)
+
+async def _run_stage(job: dict, stage: str, func: Callable[[], Awaitable[Optional[dict]]]) -> dict:
+    """Run one stage and record its duration and result on the job"""
+    await set_stage(job, stage)
+    started = time.perf_counter()
+    result = await func() or {}
+    await record_stage(job, stage, time.perf_counter() - started, result)
+    return result
+
+async def _attach(book_id: ObjectId, bucket_name: str, file_id: ObjectId, fields: dict):
+    """Point the book at a stored file, releasing it if the book is gone.
+    
+    The book holds one reference per file: when a retried stage stores the
+    file again, the reference the earlier attempt attached is given back.
+    """
+    before = await book_collection.find_one_and_update(
+        {"_id": book_id},
+        {"$set": fields},
+        projection={"pdf_id": 1, "cover_id": 1, "file_size": 1}
+    )
+    if before is None:
+        await release_blob(bucket_name, file_id)
+        raise BookDeleted()
+    attached = before.get(BOOK_REFERENCE_FIELDS[bucket_name])
+    if attached:
+        await release_blob(bucket_name, attached)
+    await record_book_files(before, fields)
+
+async def store_local_file(
+    entry: dict,
+    bucket_name: str,
+    file_type: str,
+    path: str,
+    extra_metadata: Optional[dict] = None
+):
+    """Store a local file as a blob (reusing identical content)"""
+    metadata = {
+        "filename": entry["filename"],
+        "content_type": entry["content_type"],
+        "upload_date": datetime.utcnow(),
+        "file_type": file_type,
+        **(extra_metadata or {})
+    }
+    size = os.path.getsize(path)
+    with open(path, "rb") as fh:
+        upload = UploadFile(fh, size=size, filename=entry["filename"])
+        file_id, file_size, _, _ = await store_blob(
+            upload,
+            bucket_name,
+            filename=f"{file_type}_{uuid.uuid4()}_{entry['filename']}",
+            metadata=metadata,
+            max_size=size
+        )
+    return file_id, file_size
+
+async def _download_staged(entry: dict, work_dir: str) -> str:
+    """Copy a staged upload to local disk, joining resumable upload parts in order"""
+    path = os.path.join(work_dir, f"staged_{uuid.uuid4().hex}")
+    with open(path, "wb") as fh:
+        for staging_id in _staged_ids(entry):
+            file_doc = await storage.stat(STAGING_BUCKET, staging_id)
+            if not file_doc:
+                raise IOError(f"Staged upload {staging_id} is missing")
+            async for data in iter_blob(STAGING_BUCKET, file_doc):
+                fh.write(data)
+
+    if os.path.getsize(path) != entry["size"]:
+        raise IOError(f"Staged upload is {os.path.getsize(path)} bytes, expected {entry['size']}")
+    return path
+
+async def run_book_ingest(job: dict) -> str:
+    """Process the staged files of one book; returns the final job status"""
+    book_id = job["book_id"]
+    payload = job["payload"]
+    done = set(job.get("completed_stages") or [])
+    result = dict(job.get("result") or {})
+
+    if not await book_collection.find_one({"_id": book_id}, {"_id": 1}):
+        await drop_staged_files(payload)
+        return "cancelled"
+
+    work_dir = tempfile.mkdtemp(prefix="san-ingest-")
+    try:
+        cover = payload.get("cover")
+        if cover:
+            if "store_cover" not in done:
+                async def store_cover():
+                    path = await _download_staged(cover, work_dir)
+                    cover_id, _ = await store_local_file(cover, COVER_BUCKET, "cover", path)
+                    await _attach(book_id, COVER_BUCKET, cover_id, {"cover_id": cover_id})
+                    return {"cover_id": cover_id}
+                result.update(await _run_stage(job, "store_cover", store_cover))
+
+            if "cover_variants" not in done:
+                async def cover_variants():
+                    await generate_cover_variants(result["cover_id"])
+                await _run_stage(job, "cover_variants", cover_variants)
+
+        pdf = payload.get("pdf")
+        if pdf:
+            if "store_pdf" not in done:
+                # The linearized copy only lives in work_dir, so it is redone on retry
+                prepared = {"path": None, "metadata": {}}
+
+                async def linearize():
+                    prepared["path"] = await _download_staged(pdf, work_dir)
+                    if PDF_LINEARIZE_ON_UPLOAD:
+                        prepared["path"], linearized = await linearize_file(prepared["path"], work_dir)
+                        prepared["metadata"]["linearized"] = linearized
+                await _run_stage(job, "linearize", linearize)
+
+                async def store_pdf():
+                    pdf_id, file_size = await store_local_file(pdf, PDF_BUCKET, "pdf", prepared["path"], prepared["metadata"])
+                    await _attach(book_id, PDF_BUCKET, pdf_id, {"pdf_id": pdf_id, "file_size": file_size})
+                    return {"pdf_id": pdf_id}
+                result.update(await _run_stage(job, "store_pdf", store_pdf))
+
+            if "split_pages" not in done:
+                async def split_pages():
+                    # A split interrupted by a failed attempt is not marked done, so it is redone
+                    await generate_pdf_pages(result["pdf_id"])
+                await _run_stage(job, "split_pages", split_pages)
+    except BookDeleted:
+        await drop_staged_files(payload)
+        return "cancelled"
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    book = await book_collection.find_one_and_update(
+        {"_id": book_id},
+        {"$set": {"status": "ready"}, "$unset": {"processing_error": ""}},
+        projection={"category": 1}
+    )
+    if book:
+        invalidate_book(book.get("category"))
+    await drop_staged_files(payload)
+    logger.info(f"✓ Book {book_id} ingested")
+    return "succeeded"
+
+async def abandon_book_ingest(job: dict, error: str):
+    """Mark the book failed once its job has run out of attempts"""
+    book = await book_collection.find_one_and_update(
+        {"_id": job["book_id"]},
+        {"$set": {"status": "failed", "processing_error": error}},
+        projection={"category": 1}
+    )
+    if book:
+        invalidate_book(book.get("category"))
+    await drop_staged_files(job["payload"])
+    logger.error(f"Book {job['book_id']} ingestion failed after {job['attempts']} attempts: {error}")
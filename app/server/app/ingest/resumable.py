@@ -0,0 +1,190 @@
+"""Resumable upload sessions in the style of the tus protocol.
+
+A session document tracks how many bytes the server holds::
+
+    {"_id": ObjectId, "username": "...", "file_type": "pdf",
+     "filename": "...", "content_type": "application/pdf",
+     "length": 104857600, "offset": 31457280,
+     "parts": [{"file_id": ObjectId, "offset": 0, "length": 31457280}],
+     "status": "active", "created_at": datetime, "expires_at": datetime}
+
+Every PATCH is streamed into its own part in the ``staging`` bucket, and
+the offset only moves forward once that part is stored. If the connection
+drops mid-chunk, the bytes that arrived are kept, so the client resumes
+from the last byte the server received. On finalize the parts are handed to
+the ingestion job as they are; nothing is copied. Sessions idle past
+UPLOAD_SESSION_TTL_HOURS are swept along with their parts.
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Optional
+
+from bson import ObjectId
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+
+from app.config import UPLOAD_SESSION_TTL_HOURS
+from app.database import upload_session_collection
+from app.storage.store import storage
+from app.utils.blob_stream import STAGING_BUCKET
+
+logger = logging.getLogger(__name__)
+
+SESSION_TTL = timedelta(hours=UPLOAD_SESSION_TTL_HOURS)
+
+# How often expired sessions are looked for
+SWEEP_INTERVAL_SECONDS = 15 * 60
+
+_sweeper: Optional[asyncio.Task] = None
+
+async def create_session(username: str, file_type: str, filename: str, content_type: str, length: int) -> dict:
+    now = datetime.utcnow()
+    session = {
+        "username": username,
+        "file_type": file_type,
+        "filename": filename,
+        "content_type": content_type,
+        "length": length,
+        "offset": 0,
+        "parts": [],
+        "status": "active",
+        "created_at": now,
+        "updated_at": now,
+        "expires_at": now + SESSION_TTL
+    }
+    result = await upload_session_collection.insert_one(session)
+    session["_id"] = result.inserted_id
+    return session
+
+async def get_session(upload_id: str, username: str) -> dict:
+    """Active session owned by the user, or 404"""
+    if not ObjectId.is_valid(upload_id):
+        raise HTTPException(status_code=404, detail="Upload not found")
+    session = await upload_session_collection.find_one({
+        "_id": ObjectId(upload_id),
+        "username": username,
+        "status": "active",
+        "expires_at": {"$gt": datetime.utcnow()}
+    })
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return session
+
+async def append_chunk(session: dict, offset: int, body: AsyncIterator[bytes]) -> dict:
+    """Store the bytes of one PATCH at `offset` and return the updated session.
+
+    The body may end early (client disconnect); whatever arrived is kept.
+    """
+    if offset != session["offset"]:
+        raise HTTPException(status_code=409, detail="Upload-Offset does not match the current offset")
+
+    remaining = session["length"] - offset
+    too_large = HTTPException(status_code=413, detail="Chunk exceeds the declared Upload-Length")
+
+    async def pieces():
+        received = 0
+        async for data in body:
+            received += len(data)
+            if received > remaining:
+                raise too_large
+            yield data
+
+    part = await storage.put_stream(
+        STAGING_BUCKET,
+        pieces(),
+        f"upload_{session['_id']}_{offset}",
+        metadata={"upload_session": session["_id"], "offset": offset}
+    )
+    if part["length"] == 0:
+        await storage.delete(STAGING_BUCKET, part["_id"])
+        return session
+
+    new_offset = offset + part["length"]
+    now = datetime.utcnow()
+    updated = await upload_session_collection.find_one_and_update(
+        {"_id": session["_id"], "status": "active", "offset": offset},
+        {
+            "$set": {"offset": new_offset, "updated_at": now, "expires_at": now + SESSION_TTL},
+            "$push": {"parts": {"file_id": part["_id"], "offset": offset, "length": part["length"]}}
+        },
+        return_document=ReturnDocument.AFTER
+    )
+    if updated is None:
+        # Another PATCH for the same offset won the race
+        await storage.delete(STAGING_BUCKET, part["_id"])
+        raise HTTPException(status_code=409, detail="Upload-Offset does not match the current offset")
+    return updated
+
+async def claim_for_finalize(session: dict) -> dict:
+    """Take a complete session out of the active set so it is finalized once"""
+    if session["offset"] != session["length"]:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Upload incomplete: {session['offset']} of {session['length']} bytes received"
+        )
+    claimed = await upload_session_collection.find_one_and_update(
+        {"_id": session["_id"], "status": "active"},
+        {"$set": {"status": "finalizing", "updated_at": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER
+    )
+    if claimed is None:
+        raise HTTPException(status_code=409, detail="Upload is already being finalized")
+    return claimed
+
+def staged_entry(session: dict) -> dict:
+    """Ingestion payload entry for the parts of a finalized session"""
+    return {
+        "staging_parts": [part["file_id"] for part in sorted(session["parts"], key=lambda p: p["offset"])],
+        "filename": session["filename"],
+        "content_type": session["content_type"],
+        "size": session["length"]
+    }
+
+async def release_claim(session: dict):
+    """Make a session active again after a failed finalize"""
+    await upload_session_collection.update_one(
+        {"_id": session["_id"], "status": "finalizing"},
+        {"$set": {"status": "active"}}
+    )
+
+async def delete_session(session: dict, keep_parts: bool = False):
+    """Remove a session, and its stored parts unless a job now owns them"""
+    if not keep_parts:
+        for part in session.get("parts", []):
+            await storage.delete(STAGING_BUCKET, part["file_id"])
+    await upload_session_collection.delete_one({"_id": session["_id"]})
+
+async def expire_sessions() -> int:
+    """Delete sessions idle past their expiry along with their parts"""
+    expired = 0
+    cursor = upload_session_collection.find({
+        "status": {"$in": ["active", "finalizing"]},
+        "expires_at": {"$lt": datetime.utcnow()}
+    })
+    async for session in cursor:
+        await delete_session(session)
+        expired += 1
+    if expired:
+        logger.info(f"✓ Expired {expired} abandoned upload sessions")
+    return expired
+
+async def _sweep_forever():
+    while True:
+        try:
+            await expire_sessions()
+        except Exception as e:
+            logger.warning(f"Upload session sweep failed: {e}")
+        await asyncio.sleep(SWEEP_INTERVAL_SECONDS)
+
+def start_sweeper():
+    global _sweeper
+    if _sweeper is None:
+        _sweeper = asyncio.create_task(_sweep_forever())
+
+async def stop_sweeper():
+    global _sweeper
+    if _sweeper is not None:
+        _sweeper.cancel()
+        await asyncio.gather(_sweeper, return_exceptions=True)
+        _sweeper = None
@@ -0,0 +1,151 @@
+"""Bounded pool of asyncio workers that lease and run ingestion jobs.
+
+I/O-bound stages run on the event loop; CPU-heavy steps (linearization,
+page splitting, thumbnails) are sent to the shared process pool by the
+stages themselves, so the number of workers bounds both.
+"""
+import asyncio
+import logging
+import os
+import socket
+from collections import Counter
+from typing import Awaitable, Callable, Dict, List
+
+from bson import ObjectId
+
+from app.config import INGEST_LEASE_SECONDS, INGEST_POLL_SECONDS, INGEST_WORKERS
+from app.ingest import pipeline
+from app.ingest.jobs import LeaseLost, complete_job, extend_lease, fail_job, lease_job
+from app.storage import cleanup
+
+logger = logging.getLogger(__name__)
+
+# Runner and give-up handler for every job type
+JOB_HANDLERS: Dict[str, Callable[[dict], Awaitable[str]]] = {
+    pipeline.JOB_TYPE: pipeline.run_book_ingest,
+    cleanup.JOB_TYPE: cleanup.run_cleanup_job
+}
+FAILURE_HANDLERS: Dict[str, Callable[[dict, str], Awaitable[None]]] = {
+    pipeline.JOB_TYPE: pipeline.abandon_book_ingest
+}
+
+class IngestWorkerPool:
+    """`concurrency` workers polling the job collection"""
+
+    def __init__(self, concurrency: int, poll_seconds: float):
+        self.concurrency = concurrency
+        self.poll_seconds = poll_seconds
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self.running = 0
+        self.outcomes = Counter()
+
+    def start(self):
+        if self._tasks or self.concurrency <= 0:
+            return
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._work(index)) for index in range(self.concurrency)]
+        logger.info(f"✓ Started {self.concurrency} ingestion workers")
+
+    def notify(self):
+        """Wake idle workers, e.g. right after a job was enqueued by this process"""
+        self._wakeup.set()
+
+    async def stop(self):
+        """Stop the workers; jobs they were running are leased again after their lease expires"""
+        self._stopping = True
+        self._wakeup.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _work(self, index: int):
+        worker_id = f"{self.worker_id}-{index}"
+        while not self._stopping:
+            try:
+                job = await lease_job(worker_id)
+            except Exception as e:
+                logger.warning(f"Could not lease an ingestion job: {e}")
+                job = None
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            await self._execute(job, worker_id)
+
+    async def _heartbeat(self, job_id: ObjectId, worker_id: str, work: asyncio.Task):
+        """Keep the lease alive while `work` runs; cancel it once the lease is lost"""
+        while True:
+            await asyncio.sleep(INGEST_LEASE_SECONDS / 3)
+            try:
+                leased = await extend_lease(job_id, worker_id)
+            except Exception as e:
+                logger.warning(f"Could not extend the lease on job {job_id}: {e}")
+                continue
+            if not leased:
+                logger.warning(f"Lost the lease on job {job_id}, stopping it")
+                work.cancel()
+                return
+
+    async def _execute(self, job: dict, worker_id: str):
+        self.running += 1
+        heartbeat = None
+        try:
+            handler = JOB_HANDLERS.get(job["type"])
+            if handler is None:
+                raise ValueError(f"Unknown job type '{job['type']}'")
+            work = asyncio.create_task(handler(job))
+            heartbeat = asyncio.create_task(self._heartbeat(job["_id"], worker_id, work))
+            try:
+                status = await work
+            except asyncio.CancelledError:
+                # The heartbeat only finishes after cancelling the handler on a lost lease
+                if heartbeat.done():
+                    raise LeaseLost(f"Job {job['_id']} was leased again while {worker_id} ran it")
+                raise
+            await complete_job(job, status)
+            self.outcomes[status] += 1
+        except asyncio.CancelledError:
+            raise
+        except LeaseLost as e:
+            # The worker now holding the job records its outcome
+            logger.warning(f"Dropped job {job['_id']} attempt {job['attempts']}: {e}")
+            self.outcomes["lease_lost"] += 1
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            logger.warning(f"Job {job['_id']} attempt {job['attempts']} failed: {error}")
+            try:
+                if await fail_job(job, error):
+                    self.outcomes["retried"] += 1
+                else:
+                    self.outcomes["failed"] += 1
+                    failure_handler = FAILURE_HANDLERS.get(job["type"])
+                    if failure_handler:
+                        await failure_handler(job, error)
+            except LeaseLost as e:
+                logger.warning(f"Dropped failure of job {job['_id']}: {e}")
+                self.outcomes["lease_lost"] += 1
+            except Exception as e:
+                logger.error(f"Could not record failure of job {job['_id']}: {e}")
+        finally:
+            if heartbeat:
+                heartbeat.cancel()
+            self.running -= 1
+
+    def stats(self) -> dict:
+        return {
+            "worker_id": self.worker_id,
+            "workers": len(self._tasks),
+            "running": self.running,
+            "outcomes": dict(self.outcomes)
+        }
+
+ingest_workers = IngestWorkerPool(INGEST_WORKERS, INGEST_POLL_SECONDS)
@@ -1,9 +1,10 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Query, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 import os
 import logging
+from typing import Optional
 
 # Import your routers
 from app.routers import auth
@@ -11,7 +12,11 @@ from app.routers import users
 from app.routers import book 
 from app.routers import reviews
 from app.routers import creator
+from app.routers import uploads
+from app.catalog import MAX_UPLOAD_SIZES
 from app.database import test_connection, get_database_info, get_storage_stats
+from app.storage.store import storage
+from app.utils.upload_limits import BodySizeLimitMiddleware
 
 # กำหนด logging
 logging.basicConfig(
@@ -26,6 +31,15 @@ app = FastAPI(
     description="Book management API with MongoDB GridFS for PDF and image storage"
 )
 
+# Abort oversized book uploads while the body is still arriving
+# (registered before CORS so the 413 still carries CORS headers)
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    limits={
+        ("POST", "/books/"): MAX_UPLOAD_SIZES["pdf"] + MAX_UPLOAD_SIZES["cover"] + 1024 * 1024
+    }
+)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -39,8 +53,18 @@ app.add_middleware(
         "*"
     ],
     allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],  # เพิ่ม PATCH
+    allow_methods=["GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],  # เพิ่ม PATCH
     allow_headers=["*"],
+    # PDF.js needs these to issue range requests cross-origin
+    expose_headers=[
+        "Accept-Ranges", "Content-Range", "Content-Length", "ETag", "Last-Modified", "Cache-Control",
+        "Link", "X-Total-Pages",
+        # Resumable uploads (tus)
+        "Location", "Upload-Offset", "Upload-Length", "Upload-Expires",
+        "Tus-Resumable", "Tus-Version", "Tus-Extension", "Tus-Max-Size",
+        # Keyset pagination cursors
+        "X-Next-Cursor", "X-Prev-Cursor"
+    ],
 )
 
 # Error handlers
@@ -75,6 +99,7 @@ app.include_router(users.router)
 app.include_router(book.router)
 app.include_router(reviews.router)
 app.include_router(creator.router)
+app.include_router(uploads.router)
 
 @app.get("/")
 async def root():
@@ -103,7 +128,8 @@ async def health_check():
         "database": "connected" if db_status else "disconnected",
         "mongodb_info": db_info,
         "storage_stats": storage_stats,
-        "gridfs_enabled": True
+        "gridfs_enabled": storage.name == "gridfs",
+        "storage_backend": storage.name
     }
 
 @app.get("/debug")
@@ -118,7 +144,8 @@ async def debug_endpoint():
             "mongodb_connection": "success" if db_connected else "failed",
             "database_info": db_info,
             "storage_stats": storage_stats,
-            "gridfs_status": "enabled",
+            "gridfs_status": "enabled" if storage.name == "gridfs" else "disabled",
+            "storage_backend": storage.name,
             "message": "Check logs for detailed information"
         }
     except Exception as e:
@@ -152,27 +179,111 @@ async def admin_storage_info():
     except Exception as e:
         return {"error": str(e)}
 
+@app.get("/admin/cache")
+async def admin_cache_info():
+    """Admin endpoint with hit/miss/eviction counters of the in-memory and disk caches"""
+    from app.search.suggest import suggest_index
+    from app.storage.disk_cache import blob_cache
+    from app.utils.query_cache import catalog_cache
+    return {
+        "blob_cache": blob_cache.stats(),
+        "query_cache": catalog_cache.stats(),
+        "suggestions": suggest_index.stats()
+    }
+
+@app.get("/admin/indexes")
+async def admin_index_info():
+    """Admin endpoint listing missing, unused and unregistered indexes ($indexStats)"""
+    try:
+        from app.indexes import index_report
+        return await index_report()
+    except Exception as e:
+        return {"error": str(e)}
+
+@app.get("/admin/ingest")
+async def admin_ingest_info():
+    """Admin endpoint with ingestion queue depth and per-stage latency"""
+    try:
+        from app.ingest.jobs import queue_metrics
+        from app.ingest.worker import ingest_workers
+        return {
+            "queue": await queue_metrics(),
+            "workers": ingest_workers.stats()
+        }
+    except Exception as e:
+        return {"error": str(e)}
+
 @app.get("/admin/cleanup")
-async def admin_cleanup():
-    """Admin endpoint to clean up orphaned GridFS files"""
+async def admin_cleanup(
+    dry_run: bool = False,
+    buckets: Optional[str] = None,
+    batch_size: int = Query(500, ge=1, le=10000),
+    pause_seconds: float = Query(0.2, ge=0)
+):
+    """Admin endpoint to queue a cleanup of orphaned blob files.
+
+    Runs in the background; poll /admin/cleanup/{job_id} for the report.
+    """
     try:
-        from app.database import cleanup_orphaned_files
-        result = await cleanup_orphaned_files()
+        from app.storage.cleanup import schedule_cleanup
+        job_id = await schedule_cleanup(
+            buckets=[name for name in buckets.split(",") if name] if buckets else None,
+            dry_run=dry_run,
+            batch_size=batch_size,
+            pause_seconds=pause_seconds
+        )
+        ingest_workers.notify()
         return {
-            "cleanup_result": result,
-            "message": "Cleanup completed successfully"
+            "job_id": str(job_id),
+            "dry_run": dry_run,
+            "message": "Cleanup queued"
+        }
+    except Exception as e:
+        return {"error": str(e)}
+
+@app.get("/admin/cleanup/{job_id}")
+async def admin_cleanup_status(job_id: str):
+    """Admin endpoint with the progress and report of a cleanup job"""
+    try:
+        from bson import ObjectId
+        from app.ingest.jobs import get_job
+        job = await get_job(ObjectId(job_id)) if ObjectId.is_valid(job_id) else None
+        if not job:
+            return JSONResponse(status_code=404, content={"detail": "Cleanup job not found"})
+        return {
+            "job_id": job_id,
+            "status": job["status"],
+            "bucket": job.get("stage"),
+            "finished_buckets": job.get("completed_stages", []),
+            "attempts": job["attempts"],
+            "error": job.get("error"),
+            "report": (job.get("result") or {}).get("report", {}),
+            "created_at": job["created_at"],
+            "finished_at": job.get("finished_at")
         }
     except Exception as e:
         return {"error": str(e)}
 
 # Import database functions
-from app.database import ensure_indexes, close_connection
+from app.database import derivative_collection, ensure_indexes, close_connection
+from app.indexes import ensure_collection_indexes, stop_index_builds
+from app.ingest.resumable import start_sweeper, stop_sweeper
+from app.ingest.worker import ingest_workers
+from app.search.suggest import suggest_index
+from app.utils.process_pool import shutdown_process_pool
 
 # Startup event
 @app.on_event("startup")
 async def startup_event():
     logger.info("🚀 Starting FastAPI application with GridFS support...")
     
+    # Index blobs cached on local disk by a previous run
+    try:
+        from app.storage.disk_cache import blob_cache
+        blob_cache.load()
+    except Exception as e:
+        logger.warning(f"⚠️  Blob cache disabled for this run: {e}")
+    
     # Test database connection
     db_connected = await test_connection()
     
@@ -183,13 +294,33 @@ async def startup_event():
     else:
         logger.info("✅ MongoDB connected successfully")
         
-        # Create necessary indexes
+        # Build missing indexes in the background
         try:
             await ensure_indexes()
-            logger.info("✅ Database indexes created")
+            logger.info("✅ Database index builds started")
         except Exception as e:
             logger.warning(f"⚠️  Index creation failed: {e}")
         
+        # Prepare the blob storage backend
+        try:
+            await storage.ensure_ready()
+            logger.info(f"✅ Blob storage ready ({storage.name})")
+        except Exception as e:
+            logger.warning(f"⚠️  Blob storage not ready: {e}")
+        
+        # Page splits are claimed under a unique index; it must exist before workers split
+        try:
+            await ensure_collection_indexes(derivative_collection)
+        except Exception as e:
+            logger.warning(f"⚠️  Derivative indexes not ready: {e}")
+        
+        # Process uploaded books in the background
+        ingest_workers.start()
+        start_sweeper()
+        
+        # Load typeahead suggestions in the background
+        suggest_index.start()
+        
         # Log database info
         try:
             db_info = await get_database_info()
@@ -210,20 +341,14 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("🛑 Shutting down FastAPI application...")
+    await ingest_workers.stop()
+    await stop_sweeper()
+    await suggest_index.stop()
+    await stop_index_builds()
+    shutdown_process_pool()
+    await storage.close()
     await close_connection()
 
-# Additional middleware for file uploads
-@app.middleware("http")
-async def add_file_upload_headers(request: Request, call_next):
-    response = await call_next(request)
-    
-    # Add headers for file upload support
-    if request.url.path.startswith("/books") and request.method == "POST":
-        response.headers["Accept-Ranges"] = "bytes"
-        response.headers["Access-Control-Expose-Headers"] = "Content-Range, Content-Length"
-    
-    return response
-
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
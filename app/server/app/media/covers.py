@@ -0,0 +1,128 @@
+"""Pre-rendered cover thumbnails in modern image formats.
+
+When a new cover blob is stored, fixed-width variants are rendered in the
+process pool and saved next to the original in the ``covers`` bucket. The
+cover endpoint then serves the smallest variant the client can use.
+"""
+import io
+import logging
+from typing import List, Optional, Tuple
+
+from bson import ObjectId
+
+from app.storage.blobs import list_derivatives, store_derivative, delete_derivatives
+from app.storage.store import storage
+from app.utils.blob_stream import COVER_BUCKET, iter_blob
+from app.utils.process_pool import run_in_process
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVE_KIND = "cover_variant"
+
+# Widths rendered for every cover
+COVER_WIDTHS = (160, 320, 640)
+
+# Output formats in order of preference, with their MIME types
+COVER_FORMATS = {
+    "avif": "image/avif",
+    "webp": "image/webp",
+    "jpeg": "image/jpeg"
+}
+
+def render_cover_variants(data: bytes, widths: Tuple[int, ...], formats: Tuple[str, ...]) -> List[Tuple[int, str, bytes]]:
+    """Resize a cover into each width and format (runs in a worker process).
+
+    Widths larger than the original are skipped so covers are never upscaled.
+    Formats this Pillow build cannot encode are skipped as well.
+    """
+    from PIL import Image, features
+
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+    variants = []
+    for width in widths:
+        if width > image.width:
+            continue
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), Image.LANCZOS)
+
+        for fmt in formats:
+            if fmt in ("avif", "webp") and not features.check(fmt):
+                continue
+            out = resized.convert("RGB") if fmt == "jpeg" else resized
+            buffer = io.BytesIO()
+            if fmt == "jpeg":
+                out.save(buffer, "JPEG", quality=82, optimize=True, progressive=True)
+            elif fmt == "webp":
+                out.save(buffer, "WEBP", quality=80, method=4)
+            else:
+                out.save(buffer, "AVIF", quality=60)
+            variants.append((width, fmt, buffer.getvalue()))
+
+    return variants
+
+async def generate_cover_variants(cover_id: ObjectId, force: bool = False) -> int:
+    """Render and store the variants of one cover; returns how many were stored"""
+    existing = await list_derivatives(cover_id, DERIVATIVE_KIND)
+    if existing and not force:
+        return 0
+    if existing:
+        await delete_derivatives(cover_id, DERIVATIVE_KIND)
+
+    file_doc = await storage.stat(COVER_BUCKET, cover_id)
+    if not file_doc:
+        logger.warning(f"Cover {cover_id} not found, skipping variants")
+        return 0
+
+    # Covers are capped at a few MB, so the original is passed to the worker whole
+    data = b"".join([chunk async for chunk in iter_blob(COVER_BUCKET, file_doc)])
+
+    try:
+        variants = await run_in_process(render_cover_variants, data, COVER_WIDTHS, tuple(COVER_FORMATS))
+    except Exception as e:
+        logger.warning(f"Could not render variants for cover {cover_id}: {e}")
+        return 0
+
+    for width, fmt, body in variants:
+        await store_derivative(
+            COVER_BUCKET,
+            cover_id,
+            DERIVATIVE_KIND,
+            body,
+            filename=f"cover_{cover_id}_{width}.{fmt}",
+            content_type=COVER_FORMATS[fmt],
+            width=width,
+            format=fmt
+        )
+
+    logger.info(f"Stored {len(variants)} variants for cover {cover_id}")
+    return len(variants)
+
+def accepted_cover_formats(accept: Optional[str]) -> List[str]:
+    """Variant formats the client accepts, best first"""
+    accept = (accept or "").lower()
+    formats = [fmt for fmt in ("avif", "webp") if COVER_FORMATS[fmt] in accept]
+    return formats + ["jpeg"]
+
+async def select_cover_variant(cover_id: ObjectId, width: int, accept: Optional[str]) -> Optional[dict]:
+    """Pick the smallest stored variant at least `width` wide in a format the client accepts.
+
+    Falls back to the widest variant when none is wide enough, and to None
+    (serve the original) when the cover has no variants yet.
+    """
+    formats = accepted_cover_formats(accept)
+    variants = [v for v in await list_derivatives(cover_id, DERIVATIVE_KIND) if v["format"] in formats]
+    if not variants:
+        return None
+
+    wide_enough = [v for v in variants if v["width"] >= width]
+    if wide_enough:
+        target_width = min(v["width"] for v in wide_enough)
+    else:
+        target_width = max(v["width"] for v in variants)
+
+    candidates = [v for v in variants if v["width"] == target_width]
+    return min(candidates, key=lambda v: v["length"])
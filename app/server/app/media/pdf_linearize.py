@@ -0,0 +1,99 @@
+"""PDF linearization ("fast web view") for uploaded books.
+
+A linearized PDF starts with the objects needed to render page 1 and a hint
+table, so a range-capable viewer like PDF.js can show the first page after a
+couple of small range requests instead of first fetching the cross-reference
+table at the end of the file. The work runs in the process pool on temporary
+files; the original is kept whenever linearization fails.
+"""
+import logging
+import os
+import shutil
+import tempfile
+from typing import Tuple
+
+from bson import ObjectId
+from fastapi import UploadFile
+
+from app.media.pdf_pages import download_to_tempfile
+from app.storage.blobs import replace_blob
+from app.storage.store import storage
+from app.utils.blob_stream import PDF_BUCKET, stream_upload
+from app.utils.process_pool import run_in_process
+
+logger = logging.getLogger(__name__)
+
+def linearize_pdf(source_path: str, output_path: str) -> bool:
+    """Write a linearized copy of a PDF (runs in a worker process).
+
+    Returns False without writing when the source is already linearized.
+    deterministic_id keeps the output stable so identical uploads still dedupe.
+    """
+    import pikepdf
+
+    with pikepdf.open(source_path) as pdf:
+        if pdf.is_linearized:
+            return False
+        pdf.save(output_path, linearize=True, deterministic_id=True)
+    return True
+
+async def linearize_file(source_path: str, work_dir: str) -> Tuple[str, bool]:
+    """Linearize a PDF on local disk in the process pool.
+
+    Returns (path, linearized): the linearized copy, or the source itself
+    when it already was linearized or when linearization failed.
+    """
+    output_path = os.path.join(work_dir, "linearized.pdf")
+    try:
+        changed = await run_in_process(linearize_pdf, source_path, output_path)
+    except Exception as e:
+        logger.warning(f"Linearization failed for {os.path.basename(source_path)}, keeping original: {e}")
+        return source_path, False
+
+    if not changed:
+        # Already linearized by the creator's tool
+        return source_path, True
+    return output_path, True
+
+async def relinearize_stored_pdf(file_id: ObjectId) -> str:
+    """Linearize a PDF already in the pdfs bucket and point its books at the new file.
+
+    Returns "linearized", "already_linearized", "failed" or "missing".
+    """
+    file_doc = await storage.stat(PDF_BUCKET, file_id)
+    if not file_doc:
+        return "missing"
+
+    work_dir = tempfile.mkdtemp(prefix="san-linearize-")
+    try:
+        source_path = await download_to_tempfile(PDF_BUCKET, file_doc, work_dir)
+        output_path = os.path.join(work_dir, "linearized.pdf")
+
+        try:
+            changed = await run_in_process(linearize_pdf, source_path, output_path)
+        except Exception as e:
+            logger.warning(f"Linearization failed for PDF {file_id}: {e}")
+            await storage.update_metadata(PDF_BUCKET, file_id, {"linearized": False, "linearize_failed": True})
+            return "failed"
+
+        if not changed:
+            await storage.update_metadata(PDF_BUCKET, file_id, {"linearized": True})
+            return "already_linearized"
+
+        metadata = {**(file_doc.get("metadata") or {}), "linearized": True}
+        metadata.pop("sha256", None)
+        output_size = os.path.getsize(output_path)
+        with open(output_path, "rb") as fh:
+            upload = UploadFile(fh, size=output_size, filename=metadata.get("filename"))
+            new_id, length, sha256 = await stream_upload(
+                upload,
+                PDF_BUCKET,
+                filename=file_doc.get("filename", f"pdf_{file_id}"),
+                metadata=metadata,
+                max_size=output_size
+            )
+
+        await replace_blob(PDF_BUCKET, file_id, new_id, sha256, length)
+        return "linearized"
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
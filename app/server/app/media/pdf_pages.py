@@ -0,0 +1,182 @@
+"""Ingest-time splitting of book PDFs into single-page PDFs.
+
+Each page is stored as its own small file in the ``pages`` bucket and
+recorded as a derivative of the source PDF blob, so the reader can fetch
+page N without downloading the whole document.
+
+A PDF shared by several books is split once, by one process at a time: the
+split is claimed with a ``SPLIT_KIND`` document among the derivatives
+(unique per PDF), which records the page count once every page is stored.
+Only then is the split reused; a claim left by a crashed split expires
+after SPLIT_LEASE and the next split starts over.
+"""
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from app.database import book_collection, derivative_collection
+from app.storage.blobs import delete_derivatives, store_derivative
+from app.storage.store import storage
+from app.utils.blob_stream import PDF_BUCKET, PAGE_BUCKET, iter_blob
+from app.utils.process_pool import run_in_process
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVE_KIND = "pdf_page"
+
+# Claim and completion marker of a PDF's split (a derivative without a file)
+SPLIT_KIND = "pdf_page_split"
+
+# A split renews its claim before storing each page; one not renewed for this long was abandoned
+SPLIT_LEASE = timedelta(minutes=10)
+
+# How often a split waits on another process's split of the same PDF checks on it
+SPLIT_WAIT_SECONDS = 2
+
+def split_pdf_pages(source_path: str, output_dir: str) -> List[str]:
+    """Write every page of a PDF to its own file (runs in a worker process).
+
+    Returns the page file paths in page order.
+    """
+    import pikepdf
+
+    paths = []
+    with pikepdf.open(source_path) as pdf:
+        for index, page in enumerate(pdf.pages, start=1):
+            single = pikepdf.new()
+            single.pages.append(page)
+            path = os.path.join(output_dir, f"page_{index:05d}.pdf")
+            single.save(path, compress_streams=True)
+            single.close()
+            paths.append(path)
+    return paths
+
+async def download_to_tempfile(bucket_name: str, file_doc: dict, directory: str) -> str:
+    """Stream a stored file into a temporary file and return its path"""
+    path = os.path.join(directory, f"{file_doc['_id']}.pdf")
+    with open(path, "wb") as fh:
+        async for data in iter_blob(bucket_name, file_doc):
+            fh.write(data)
+    return path
+
+async def set_page_count(pdf_id: ObjectId, page_count: int):
+    """Record the page count on every book that uses this PDF"""
+    await book_collection.update_many({"pdf_id": pdf_id}, {"$set": {"page_count": page_count}})
+
+async def _claim_split(pdf_id: ObjectId) -> Optional[str]:
+    """Claim the split of a PDF; returns the claim token, or None if another split holds it"""
+    token = uuid.uuid4().hex
+    now = datetime.utcnow()
+    claim = {"state": "splitting", "token": token, "claimed_until": now + SPLIT_LEASE}
+    abandoned = await derivative_collection.find_one_and_update(
+        {"source_id": pdf_id, "kind": SPLIT_KIND, "state": "splitting", "claimed_until": {"$lt": now}},
+        {"$set": claim}
+    )
+    if abandoned:
+        return token
+    if await derivative_collection.find_one({"source_id": pdf_id, "kind": SPLIT_KIND}, {"_id": 1}):
+        return None
+    try:
+        await derivative_collection.insert_one({"source_id": pdf_id, "kind": SPLIT_KIND, **claim})
+    except DuplicateKeyError:
+        return None
+    return token
+
+async def _renew_split(pdf_id: ObjectId, token: str) -> bool:
+    """Extend a claim; False once another split has taken it over"""
+    result = await derivative_collection.update_one(
+        {"source_id": pdf_id, "kind": SPLIT_KIND, "token": token},
+        {"$set": {"claimed_until": datetime.utcnow() + SPLIT_LEASE}}
+    )
+    return result.matched_count == 1
+
+async def _release_split(pdf_id: ObjectId, token: str):
+    await derivative_collection.delete_one({"source_id": pdf_id, "kind": SPLIT_KIND, "token": token})
+
+async def _split_claimed(pdf_id: ObjectId, token: str) -> Optional[int]:
+    """Split a claimed PDF; returns the page count, or None if the claim was lost"""
+    # Pages left by an abandoned split
+    await delete_derivatives(pdf_id, DERIVATIVE_KIND)
+
+    file_doc = await storage.stat(PDF_BUCKET, pdf_id)
+    if not file_doc:
+        logger.warning(f"PDF {pdf_id} not found, skipping page split")
+        await _release_split(pdf_id, token)
+        return 0
+
+    work_dir = tempfile.mkdtemp(prefix="san-pages-")
+    try:
+        source_path = await download_to_tempfile(PDF_BUCKET, file_doc, work_dir)
+        try:
+            page_paths = await run_in_process(split_pdf_pages, source_path, work_dir)
+        except Exception as e:
+            logger.warning(f"Could not split PDF {pdf_id} into pages: {e}")
+            await _release_split(pdf_id, token)
+            return 0
+
+        for page, path in enumerate(page_paths, start=1):
+            # A split that took the claim over stores its own pages; stop before adding to them
+            if not await _renew_split(pdf_id, token):
+                return None
+            with open(path, "rb") as fh:
+                data = fh.read()
+            await store_derivative(
+                PAGE_BUCKET,
+                pdf_id,
+                DERIVATIVE_KIND,
+                data,
+                filename=f"page_{pdf_id}_{page}.pdf",
+                content_type="application/pdf",
+                page=page
+            )
+    except BaseException:
+        await _release_split(pdf_id, token)
+        raise
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    finished = await derivative_collection.update_one(
+        {"source_id": pdf_id, "kind": SPLIT_KIND, "token": token},
+        {"$set": {"state": "done", "page_count": len(page_paths), "finished_at": datetime.utcnow()},
+         "$unset": {"token": "", "claimed_until": ""}}
+    )
+    if not finished.matched_count:
+        return None
+    logger.info(f"Split PDF {pdf_id} into {len(page_paths)} pages")
+    return len(page_paths)
+
+async def generate_pdf_pages(pdf_id: ObjectId) -> int:
+    """Split a stored PDF into per-page files; returns the page count.
+    
+    A finished split of the same PDF is reused, and one running in another
+    process is waited for.
+    """
+    while True:
+        marker = await derivative_collection.find_one({"source_id": pdf_id, "kind": SPLIT_KIND})
+        if marker and marker["state"] == "done":
+            page_count = marker["page_count"]
+            break
+        token = await _claim_split(pdf_id)
+        if token is None:
+            await asyncio.sleep(SPLIT_WAIT_SECONDS)
+            continue
+        page_count = await _split_claimed(pdf_id, token)
+        if page_count is not None:
+            break
+        logger.warning(f"Split of PDF {pdf_id} was taken over by another process")
+
+    if page_count:
+        await set_page_count(pdf_id, page_count)
+    return page_count
+
+async def find_page(pdf_id: ObjectId, page: int) -> dict:
+    """Derivative record of one page, or None if the book has not been split"""
+    return await derivative_collection.find_one({"source_id": pdf_id, "kind": DERIVATIVE_KIND, "page": page})
@@ -1,32 +1,46 @@
-import io
+import asyncio
+import re
 import uuid
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any, List, Tuple
+from typing import Optional, Dict, Any, List, Tuple, Union
 
-import gridfs
 from bson import ObjectId
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status, UploadFile, File, Form, Query
 from fastapi.responses import StreamingResponse
-from motor.motor_asyncio import AsyncIOMotorGridFSBucket
 from pydantic import BaseModel
 
 from app.auth.jwt_handler import get_current_user
-from app.database import database, book_collection, user_collection
+from app.catalog import AVAILABLE_CATEGORIES, MAX_UPLOAD_SIZES, validate_cover_filename
+from app.config import FACET_COUNT_LIMIT
+from app.database import database, book_collection, user_collection, derivative_collection
+from app.ingest.jobs import enqueue_job, get_job
+from app.ingest.pipeline import JOB_TYPE as INGEST_JOB_TYPE, drop_staged_files, stage_upload
+from app.ingest.worker import ingest_workers
+from app.media.covers import select_cover_variant
+from app.media.pdf_pages import DERIVATIVE_KIND as PAGE_KIND, find_page
+from app.search.index import remove_from_search_index, search_index, update_search_index
+from app.search.suggest import suggest_index
+from app.storage.blobs import release_blob
+from app.storage.disk_cache import cached_blob_response
+from app.storage.stats import book_counts, read_stats, record_book_change
+from app.storage.store import storage
+from app.utils.blob_stream import (
+    PDF_BUCKET, COVER_BUCKET, PAGE_BUCKET, get_blob_file, blob_streaming_response, iter_blob
+)
+from app.utils.pagination import Page, build_page, fetch_page, page_query
+from app.utils.projections import BOOK_CARD, BOOK_FILES, BOOK_READING, BOOK_RECOMMENDATION, BOOK_SUMMARY, fields
+from app.utils.query_cache import catalog_cache, catalog_tags, invalidate_book
+from app.utils.responses import json_response
 
 # ============ INITIALIZATION ============
 
 router = APIRouter(prefix="/books", tags=["Books"])
 
-# Initialize GridFS buckets
-pdf_bucket = AsyncIOMotorGridFSBucket(database, bucket_name="pdfs")
-cover_bucket = AsyncIOMotorGridFSBucket(database, bucket_name="covers")
+# Fields book listings can be sorted by
+BOOK_SORT_FIELDS = ["created_at", "rating", "title", "author"]
 
-# Available book categories
-AVAILABLE_CATEGORIES = [
-    "ความรู้", "นิยาย", "มังงะ", "ศิลปะ", "วิทยาศาสตร์", 
-    "ประวัติศาสตร์", "ธุรกิจ", "การศึกษา", "เทคโนโลยี", 
-    "สุขภาพ", "การเงิน", "จิตวิทยา", "อื่นๆ"
-]
+# Most ids one /books/batch request may ask for
+MAX_BATCH_IDS = 300
 
 # ============ MODELS ============
 
@@ -44,10 +58,46 @@ class BookResponse(BaseModel):
     file_size: Optional[int] = None
     has_pdf: bool = False
     has_cover: bool = False
+    status: str = "ready"  # "processing" until the ingestion job has finished, or "failed"
+    job_id: Optional[str] = None
+
+class IngestJobResponse(BaseModel):
+    id: str
+    book_id: str
+    status: str
+    stage: Optional[str] = None
+    completed_stages: List[str] = []
+    stage_timings: Dict[str, float] = {}
+    attempts: int
+    max_attempts: int
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
 
 class CategoryResponse(BaseModel):
     categories: List[str]
 
+class FacetedBooksResponse(BaseModel):
+    books: List[BookResponse]
+    total: int  # books of the listing, within the selected category
+    categories: Dict[str, int]  # books of the listing per category, ignoring the selected one
+    counts_estimated: bool = False  # counting stopped after FACET_COUNT_LIMIT matches
+
+class BookBatchRequest(BaseModel):
+    ids: List[str]
+
+class BookBatchResponse(BaseModel):
+    books: List[BookResponse]  # in the requested order
+    missing: List[str]  # requested ids that are invalid or have no book
+
+class SuggestionResponse(BaseModel):
+    id: str
+    title: str
+    author: str
+    rating: float
+    matched: str  # "title" or "author"
+
 class ReadingProgressUpdate(BaseModel):
     book_id: str
     page: Optional[int] = None
@@ -66,68 +116,84 @@ class ReadingSessionResponse(BaseModel):
 
 # ============ HELPER FUNCTIONS ============
 
-async def upload_file_to_gridfs(file: UploadFile, bucket: AsyncIOMotorGridFSBucket, file_type: str) -> Tuple[ObjectId, int]:
-    """Upload file to GridFS and return file ID and size"""
+def book_response_fields(book: dict) -> dict:
+    """Fields of the BookResponse of a book document (read with BOOK_SUMMARY).
+    
+    The one mapping of books to responses; list endpoints encode its dicts
+    directly (app.utils.responses).
+    """
+    file_size = book.get("file_size")
+    return {
+        "id": str(book["_id"]),
+        "title": book["title"],
+        "author": book["author"],
+        "cover_id": str(book["cover_id"]) if book.get("cover_id") else None,
+        "pdf_id": str(book["pdf_id"]) if book.get("pdf_id") else None,
+        "rating": float(book["rating"]),
+        "description": book["description"],
+        "category": book.get("category", "อื่นๆ"),
+        "price": int(book.get("price", 0)),
+        "created_at": book.get("created_at", datetime.utcnow()),
+        "file_size": int(file_size) if file_size is not None else None,
+        "has_pdf": bool(book.get("pdf_id")),
+        "has_cover": bool(book.get("cover_id")),
+        "status": book.get("status", "ready"),
+        "job_id": str(book["ingest_job_id"]) if book.get("ingest_job_id") else None
+    }
+
+def to_book_response(book: dict) -> BookResponse:
+    # Already typed by book_response_fields; FastAPI checks it against response_model
+    return BookResponse.model_construct(**book_response_fields(book))
+
+async def create_book_with_files(book_dict: dict, payload: dict) -> BookResponse:
+    """Insert a book and queue the processing of its staged files"""
+    book_dict["status"] = "processing" if payload else "ready"
+    
+    # Insert book metadata into MongoDB
+    job_id = None
+    counted = False
+    
+    async def discard_book():
+        """Undo the insert of a book whose processing could not be queued"""
+        if job_id:
+            return
+        await drop_staged_files(payload)
+        if not book_dict.get("_id"):
+            return
+        await book_collection.delete_one({"_id": book_dict["_id"]})
+        if counted:
+            await record_book_change(**book_counts(book_dict, sign=-1))
+        await remove_from_search_index([book_dict["_id"]])
+        invalidate_book(book_dict.get("category"))
+        suggest_index.remove(book_dict["_id"])
+    
     try:
-        # Read file content
-        content = await file.read()
-        file_size = len(content)
-        
-        # Validate file size
-        max_size = 100 * 1024 * 1024 if file_type == "pdf" else 5 * 1024 * 1024
-        if file_size > max_size:
-            raise HTTPException(
-                status_code=400,
-                detail=f"File too large. Maximum size for {file_type}: {max_size // (1024*1024)}MB"
-            )
-        
-        # Create metadata
-        metadata = {
-            "filename": file.filename,
-            "content_type": file.content_type,
-            "upload_date": datetime.utcnow(),
-            "file_type": file_type,
-            "original_size": file_size
-        }
-        
-        # Upload to GridFS
-        file_id = await bucket.upload_from_stream(
-            filename=f"{file_type}_{uuid.uuid4()}_{file.filename}",
-            source=io.BytesIO(content),
-            metadata=metadata
-        )
+        result = await book_collection.insert_one(book_dict)
+        if not result.inserted_id:
+            raise HTTPException(status_code=500, detail="Failed to create book")
+        await record_book_change(**book_counts(book_dict))
+        counted = True
+        await update_search_index([book_dict])
+        invalidate_book(book_dict.get("category"))
+        suggest_index.add(book_dict)
+        
+        if payload:
+            job_id = await enqueue_job(INGEST_JOB_TYPE, result.inserted_id, payload)
+            await book_collection.update_one({"_id": result.inserted_id}, {"$set": {"ingest_job_id": job_id}})
+            ingest_workers.notify()
+
+        created_book = await book_collection.find_one({"_id": result.inserted_id}, BOOK_SUMMARY)
+        if not created_book:
+            raise HTTPException(status_code=500, detail="Failed to retrieve created book from database")
         
-        return file_id, file_size
+        return to_book_response(created_book)
         
     except HTTPException:
+        await discard_book()
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to upload {file_type}: {str(e)}")
-
-async def download_file_from_gridfs(file_id: ObjectId, bucket: AsyncIOMotorGridFSBucket) -> Tuple[bytes, str, str]:
-    """Download file from GridFS"""
-    try:
-        # Check if file exists
-        if not await bucket.find({"_id": file_id}).to_list(length=1):
-            raise HTTPException(status_code=404, detail="File not found")
-        
-        # Get file info
-        grid_out = await bucket.open_download_stream(file_id)
-        
-        # Read file content
-        content = await grid_out.read()
-        
-        # Get metadata
-        metadata = grid_out.metadata or {}
-        content_type = metadata.get("content_type", "application/octet-stream")
-        filename = metadata.get("filename", f"file_{file_id}")
-        
-        return content, content_type, filename
-        
-    except HTTPException as http_exc:
-        raise http_exc
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to download file: {str(e)}")
+        await discard_book()
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 async def is_admin(current_user: dict = Depends(get_current_user)) -> dict:
     """Check if current user is an admin"""
@@ -149,9 +215,16 @@ async def validate_book_id(book_id: str) -> ObjectId:
         raise HTTPException(status_code=400, detail="Invalid book ID format")
     return ObjectId(book_id)
 
-async def get_book_by_id(book_id: str) -> dict:
+async def find_books_by_id(book_ids: List[ObjectId], projection: dict) -> Dict[ObjectId, dict]:
+    """Books by id in one query, for lists that reference several books"""
+    return {
+        book["_id"]: book
+        async for book in book_collection.find({"_id": {"$in": list(set(book_ids))}}, projection)
+    }
+
+async def get_book_by_id(book_id: str, projection: Optional[dict] = None) -> dict:
     """Get book by ID or raise 404 if not found"""
-    book = await book_collection.find_one({"_id": await validate_book_id(book_id)})
+    book = await book_collection.find_one({"_id": await validate_book_id(book_id)}, projection)
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
     return book
@@ -163,6 +236,95 @@ async def get_categories(current_user: dict = Depends(get_current_user)):
     """Get all available book categories."""
     return CategoryResponse(categories=AVAILABLE_CATEGORIES)
 
+# ============ SUGGESTION ENDPOINTS ============
+
+@router.get("/suggest", response_model=list[SuggestionResponse])
+async def suggest_books(
+    q: str = Query(..., min_length=1, max_length=100, description="What the user has typed so far"),
+    limit: int = Query(8, ge=1, le=20),
+    current_user: dict = Depends(get_current_user)
+):
+    """Typeahead suggestions: books whose title or author has a word starting with q.
+    
+    Served from memory; until the suggestions are loaded at startup, titles
+    starting with q are looked up in the database instead.
+    """
+    try:
+        if suggest_index.ready:
+            return suggest_index.suggest(q, limit)
+        
+        books = await book_collection.find(
+            {"title": {"$regex": f"^{re.escape(q.strip())}", "$options": "i"}},
+            fields("title", "author", "rating")
+        ).sort("rating", -1).limit(limit).to_list(length=limit)
+        return [
+            SuggestionResponse(
+                id=str(book["_id"]),
+                title=book["title"],
+                author=book["author"],
+                rating=book.get("rating", 0),
+                matched="title"
+            )
+            for book in books
+        ]
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
+
+# ============ BATCH ENDPOINTS ============
+
+async def find_books_batch(ids: List[str]) -> Response:
+    """BookBatchResponse of ids, with cached books served from the catalog cache"""
+    ids = list(dict.fromkeys(book_id.strip() for book_id in ids if book_id.strip()))
+    if len(ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IDS} ids per request")
+    
+    async def load_books(keys: List[tuple]) -> Dict[tuple, Tuple[dict, Tuple[str, ...]]]:
+        books = await find_books_by_id([book_id for _, book_id in keys], BOOK_SUMMARY)
+        return {
+            ("book", book_id): (book_response_fields(book), catalog_tags(book.get("category", "อื่นๆ")))
+            for book_id, book in books.items()
+        }
+    
+    keys = {book_id: ("book", ObjectId(book_id)) for book_id in ids if ObjectId.is_valid(book_id)}
+    found = await catalog_cache.get_many_or_load(keys.values(), load_books)
+    return json_response({
+        "books": [found[keys[book_id]] for book_id in ids if keys.get(book_id) in found],
+        "missing": [book_id for book_id in ids if keys.get(book_id) not in found]
+    })
+
+@router.get("/batch", response_model=BookBatchResponse)
+async def get_books_batch(
+    ids: List[str] = Query(..., description="Book ids, comma separated or repeated"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Books of a list of ids (library, reading history) in one request.
+    
+    Books come back in the order asked for; ids that are invalid or have no
+    book are listed in missing.
+    """
+    try:
+        return await find_books_batch([book_id for value in ids for book_id in value.split(",")])
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
+
+@router.post("/batch", response_model=BookBatchResponse)
+async def post_books_batch(
+    request: BookBatchRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """GET /books/batch with the ids in the body, for lists too long for a URL"""
+    try:
+        return await find_books_batch(request.ids)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
+
 # ============ BOOK CRUD ENDPOINTS ============
 
 @router.post("/", response_model=BookResponse)
@@ -176,7 +338,11 @@ async def upload_book(
     pdf_file: Optional[UploadFile] = File(None),
     current_user: dict = Depends(is_admin)
 ):
-    """Upload/create a new book with cover and PDF support using GridFS."""
+    """Upload/create a new book with cover and PDF support using blob storage.
+
+    The files are staged and the book is returned at once with status
+    "processing"; poll /books/jobs/{job_id} until it becomes "ready".
+    """
     
     # Validate category
     if category not in AVAILABLE_CATEGORIES:
@@ -197,63 +363,39 @@ async def upload_book(
         "uploader": current_user["username"]
     }
     
-    # Handle cover upload
-    if cover_file and cover_file.filename:
-        allowed_extensions = {'jpg', 'jpeg', 'png', 'gif', 'webp'}
-        file_extension = cover_file.filename.split('.')[-1].lower()
-        
-        if file_extension not in allowed_extensions:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Invalid cover file type. Allowed: {', '.join(allowed_extensions)}"
-            )
-        
-        try:
-            cover_id, _ = await upload_file_to_gridfs(cover_file, cover_bucket, "cover")
-            book_dict["cover_id"] = cover_id
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Failed to upload cover: {str(e)}")
+    has_cover = bool(cover_file and cover_file.filename)
+    has_pdf = bool(pdf_file and pdf_file.filename)
     
-    # Handle PDF upload
-    if pdf_file and pdf_file.filename:
-        if not pdf_file.filename.lower().endswith('.pdf'):
-            raise HTTPException(status_code=400, detail="Only PDF files are allowed")
-        
-        try:
-            pdf_id, file_size = await upload_file_to_gridfs(pdf_file, pdf_bucket, "pdf")
-            book_dict["pdf_id"] = pdf_id
-            book_dict["file_size"] = file_size
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Failed to upload PDF: {str(e)}")
+    # Validate file types before anything is stored
+    if has_cover:
+        validate_cover_filename(cover_file.filename)
     
-    # Insert book metadata into MongoDB
+    if has_pdf and not pdf_file.filename.lower().endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+    
+    # Stage both uploads concurrently; storing, linearizing, splitting and
+    # thumbnails run in the ingestion workers
+    payload = {}
     try:
-        result = await book_collection.insert_one(book_dict)
-        if not result.inserted_id:
-            raise HTTPException(status_code=500, detail="Failed to create book")
-
-        created_book = await book_collection.find_one({"_id": result.inserted_id})
-        if not created_book:
-            raise HTTPException(status_code=500, detail="Failed to retrieve created book from database")
-        
-        return BookResponse(
-            id=str(created_book["_id"]),
-            title=created_book["title"],
-            author=created_book["author"],
-            cover_id=str(created_book["cover_id"]) if created_book.get("cover_id") else None,
-            pdf_id=str(created_book["pdf_id"]) if created_book.get("pdf_id") else None,
-            rating=created_book["rating"],
-            description=created_book["description"],
-            category=created_book.get("category", "อื่นๆ"),
-            price=created_book.get("price", 0),
-            created_at=created_book["created_at"],
-            file_size=created_book.get("file_size"),
-            has_pdf=bool(created_book.get("pdf_id")),
-            has_cover=bool(created_book.get("cover_id"))
+        staged = await asyncio.gather(
+            stage_upload(cover_file, "cover", MAX_UPLOAD_SIZES["cover"]) if has_cover else asyncio.sleep(0),
+            stage_upload(pdf_file, "pdf", MAX_UPLOAD_SIZES["pdf"]) if has_pdf else asyncio.sleep(0),
+            return_exceptions=True
         )
-        
+        for key, entry in zip(("cover", "pdf"), staged):
+            if isinstance(entry, dict):
+                payload[key] = entry
+        for entry in staged:
+            if isinstance(entry, BaseException):
+                raise entry
+    except HTTPException:
+        await drop_staged_files(payload)
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+        await drop_staged_files(payload)
+        raise HTTPException(status_code=500, detail=f"Failed to upload files: {str(e)}")
+    
+    return await create_book_with_files(book_dict, payload)
 
 @router.get("/{book_id}", response_model=BookResponse)
 async def get_book_detail(
@@ -262,40 +404,126 @@ async def get_book_detail(
 ):
     """Get details of a specific book by ID."""
     try:
-        book = await get_book_by_id(book_id)
-        
-        return BookResponse(
-            id=str(book["_id"]),
-            title=book["title"],
-            author=book["author"],
-            cover_id=str(book["cover_id"]) if book.get("cover_id") else None,
-            pdf_id=str(book["pdf_id"]) if book.get("pdf_id") else None,
-            rating=book["rating"],
-            description=book["description"],
-            category=book.get("category", "อื่นๆ"),
-            price=book.get("price", 0),
-            created_at=book.get("created_at", datetime.utcnow()),
-            file_size=book.get("file_size"),
-            has_pdf=bool(book.get("pdf_id")),
-            has_cover=bool(book.get("cover_id"))
-        )
+        book = await get_book_by_id(book_id, BOOK_SUMMARY)
+        
+        return to_book_response(book)
         
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
 
-@router.get("/", response_model=list[BookResponse])
+async def find_books_page(
+    query_filter: dict,
+    search: Optional[str],
+    skip: int,
+    limit: int,
+    sort_by: str,
+    sort_order: int,
+    after: Optional[str] = None,
+    before: Optional[str] = None
+) -> Page:
+    """Page of books matching a filter, with an unindexed $regex search.
+    
+    sort_by must be one of BOOK_SORT_FIELDS and sort_order 1 or -1.
+    """
+    if search:
+        query_filter.update(regex_search_filter(search))
+    
+    return await fetch_page(book_collection, query_filter, sort_by, sort_order, limit, after, before, skip, BOOK_SUMMARY)
+
+def faceted_body(books: List[dict], counts: Dict[str, int], estimated: bool, category: Optional[str]) -> dict:
+    """FacetedBooksResponse of a page of book_response_fields dicts"""
+    return {
+        "books": books,
+        "total": counts.get(category, 0) if category else sum(counts.values()),
+        "categories": counts,
+        "counts_estimated": estimated
+    }
+
+def regex_search_filter(search: str) -> dict:
+    return {"$or": [
+        {"title": {"$regex": search, "$options": "i"}},
+        {"author": {"$regex": search, "$options": "i"}},
+        {"description": {"$regex": search, "$options": "i"}}
+    ]}
+
+async def find_books_faceted(
+    category: Optional[str],
+    search: str,
+    skip: int,
+    limit: int,
+    sort_by: str,
+    sort_order: int,
+    after: Optional[str] = None,
+    before: Optional[str] = None
+) -> Tuple[Page, Dict[str, int], bool]:
+    """Page of a $regex search and its matches per category, in one $facet aggregation.
+    
+    With FACET_COUNT_LIMIT set, only the first matches in sort order are
+    read and counted. A page that may reach past them is read separately.
+    """
+    page_filter = {"category": category} if category else {}
+    query = page_query(page_filter, sort_by, sort_order, limit, after, before, skip)
+    page_stages = [{"$match": query.filter}, {"$sort": dict(query.sort)}]
+    if query.skip:
+        page_stages.append({"$skip": query.skip})
+    page_stages.append({"$limit": query.fetch})
+    
+    pipeline = [{"$match": regex_search_filter(search)}]
+    if FACET_COUNT_LIMIT:
+        pipeline += [{"$sort": {sort_by: sort_order, "_id": sort_order}}, {"$limit": FACET_COUNT_LIMIT + 1}]
+    pipeline += [
+        {"$project": BOOK_SUMMARY},
+        {"$facet": {
+            "page": page_stages,
+            "categories": [{"$group": {"_id": "$category", "count": {"$sum": 1}}}]
+        }}
+    ]
+    result = (await book_collection.aggregate(pipeline, allowDiskUse=True).to_list(length=1))[0]
+    
+    counts = {}
+    for group in result["categories"]:
+        name = group["_id"] or "อื่นๆ"
+        counts[name] = counts.get(name, 0) + group["count"]
+    estimated = bool(FACET_COUNT_LIMIT) and sum(counts.values()) > FACET_COUNT_LIMIT
+    
+    if estimated and (before or len(result["page"]) < query.fetch):
+        page = await find_books_page(dict(page_filter), search, skip, limit, sort_by, sort_order, after, before)
+    else:
+        page = build_page(result["page"], query)
+    return page, counts, estimated
+
+@router.get("/", response_model=Union[list[BookResponse], FacetedBooksResponse])
 async def get_all_books(
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
     category: Optional[str] = Query(None, description="Filter by category"),
-    search: Optional[str] = Query(None, description="Search in title or author"),
+    search: Optional[str] = Query(None, description="Search in title, author or description"),
     sort_by: str = Query("created_at", description="Sort by: created_at, rating, title"),
     sort_order: int = Query(-1, description="Sort order: 1 (asc) or -1 (desc)"),
+    after: Optional[str] = Query(None, description="Cursor from X-Next-Cursor: the page after it"),
+    before: Optional[str] = Query(None, description="Cursor from X-Prev-Cursor: the page before it"),
+    facets: bool = Query(False, description="Also return the total and the number of books per category"),
     current_user: dict = Depends(get_current_user)
 ):
-    """Get all books with pagination, filtering, and search."""
+    """Get all books with pagination, filtering, and search.
+    
+    Pages are fetched by cursor (after/before) or, for older clients, by
+    skip; the cursors of the neighbouring pages come back in the
+    X-Next-Cursor and X-Prev-Cursor headers.
+    
+    Search results come from the n-gram search index, best match first
+    (sort_by is ignored, and pages go by skip only); the slower $regex scan
+    is only used for one-letter queries or while the index has not been built.
+    
+    With facets=true the page comes back as a FacetedBooksResponse with the
+    total and per-category counts. Without a search they are read from the
+    book counters; a search counts its matches, up to FACET_COUNT_LIMIT.
+    
+    The body is encoded from book_response_fields without going through
+    response_model, which only documents it.
+    """
     try:
         # Build query filter
         query_filter = {}
@@ -305,41 +533,56 @@ async def get_all_books(
                 raise HTTPException(status_code=400, detail="Invalid category")
             query_filter["category"] = category
         
-        if search:
-            query_filter["$or"] = [
-                {"title": {"$regex": search, "$options": "i"}},
-                {"author": {"$regex": search, "$options": "i"}},
-                {"description": {"$regex": search, "$options": "i"}}
-            ]
-        
-        valid_sort_fields = ["created_at", "rating", "title", "author"]
-        if sort_by not in valid_sort_fields:
+        if sort_by not in BOOK_SORT_FIELDS:
             sort_by = "created_at"
         
         if sort_order not in [1, -1]:
             sort_order = -1
         
-        cursor = book_collection.find(query_filter).skip(skip).limit(limit).sort(sort_by, sort_order)
-        books = await cursor.to_list(length=limit)
-        
-        return [
-            BookResponse(
-                id=str(book["_id"]),
-                title=book["title"],
-                author=book["author"],
-                cover_id=str(book["cover_id"]) if book.get("cover_id") else None,
-                pdf_id=str(book["pdf_id"]) if book.get("pdf_id") else None,
-                rating=book["rating"],
-                description=book["description"],
-                category=book.get("category", "อื่นๆ"),
-                price=book.get("price", 0),
-                created_at=book.get("created_at", datetime.utcnow()),
-                file_size=book.get("file_size"),
-                has_pdf=bool(book.get("pdf_id")),
-                has_cover=bool(book.get("cover_id"))
+        category_filter = query_filter.get("category")
+        books = None
+        counts, estimated = None, False
+        if search and await search_index.is_ready():
+            if facets:
+                found = await search_index.search_with_facets(search, category_filter, skip, limit, FACET_COUNT_LIMIT)
+                ranked_ids, counts, estimated = found if found is not None else (None, None, False)
+            else:
+                ranked_ids = await search_index.search(search, category_filter, skip, limit)
+            if ranked_ids is not None:
+                if after or before:
+                    raise HTTPException(status_code=400, detail="Search results are paged with skip")
+                found = {book["_id"]: book async for book in book_collection.find({"_id": {"$in": ranked_ids}}, BOOK_SUMMARY)}
+                books = [found[book_id] for book_id in ranked_ids if book_id in found]
+        
+        if books is not None:
+            books = [book_response_fields(book) for book in books]
+            return json_response(faceted_body(books, counts, estimated, category_filter) if facets else books)
+        
+        async def load_page() -> Page:
+            page = await find_books_page(query_filter, search, skip, limit, sort_by, sort_order, after, before)
+            page.items = [book_response_fields(book) for book in page.items]
+            return page
+        
+        if search and facets:
+            page, counts, estimated = await find_books_faceted(
+                category_filter, search, skip, limit, sort_by, sort_order, after, before
             )
-            for book in books
-        ]
+            page.items = [book_response_fields(book) for book in page.items]
+        elif search:
+            page = await load_page()
+        else:
+            # Plain listings repeat a lot; cache them per normalized query
+            page = await catalog_cache.get_or_load(
+                ("books", category_filter, sort_by, sort_order, skip, limit, after, before),
+                catalog_tags(category_filter),
+                load_page
+            )
+            if facets:
+                # Maintained counters: a point lookup however large the catalog
+                counts = (await read_stats(storage, []))["books"]["categories"]
+        response = json_response(faceted_body(page.items, counts, estimated, category_filter) if facets else page.items)
+        page.set_headers(response)
+        return response
         
     except HTTPException:
         raise
@@ -351,22 +594,29 @@ async def delete_book(
     book_id: str,
     current_user: dict = Depends(is_admin)
 ):
-    """Delete a book and its associated files from GridFS."""
+    """Delete a book and its associated files from blob storage."""
     try:
-        book = await get_book_by_id(book_id)
+        # Delete book metadata first: an ingest stage attaching a file
+        # afterwards finds no book and releases that file itself
+        deleted = await book_collection.find_one_and_delete(
+            {"_id": await validate_book_id(book_id)},
+            {**BOOK_FILES, "category": 1}
+        )
         
-        # Delete associated files from GridFS
-        if book.get("cover_id"):
-            await cover_bucket.delete(ObjectId(book["cover_id"]))
+        if deleted is None:
+            raise HTTPException(status_code=404, detail="Book not found")
         
-        if book.get("pdf_id"):
-            await pdf_bucket.delete(ObjectId(book["pdf_id"]))
+        # Release the files the deleted document referenced; chunks are dropped with the last reference
+        if deleted.get("cover_id"):
+            await release_blob(COVER_BUCKET, ObjectId(deleted["cover_id"]))
         
-        # Delete book metadata
-        result = await book_collection.delete_one({"_id": ObjectId(book_id)})
+        if deleted.get("pdf_id"):
+            await release_blob(PDF_BUCKET, ObjectId(deleted["pdf_id"]))
         
-        if result.deleted_count == 0:
-            raise HTTPException(status_code=404, detail="Book not found")
+        await record_book_change(**book_counts(deleted, sign=-1))
+        await remove_from_search_index([deleted["_id"]])
+        invalidate_book(deleted.get("category"))
+        suggest_index.remove(deleted["_id"])
         
         return {"message": "Book and associated files deleted successfully"}
         
@@ -375,29 +625,76 @@ async def delete_book(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
 
+# ============ INGESTION JOB ENDPOINTS ============
+
+@router.get("/jobs/{job_id}", response_model=IngestJobResponse)
+async def get_ingest_job(
+    job_id: str,
+    current_user: dict = Depends(get_current_user)
+):
+    """Poll the processing status of an uploaded book."""
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=400, detail="Invalid job ID format")
+    
+    try:
+        job = await get_job(ObjectId(job_id))
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        
+        return IngestJobResponse(
+            id=str(job["_id"]),
+            book_id=str(job["book_id"]),
+            status=job["status"],
+            stage=job.get("stage"),
+            completed_stages=job.get("completed_stages", []),
+            stage_timings=job.get("stage_timings", {}),
+            attempts=job.get("attempts", 0),
+            max_attempts=job.get("max_attempts", 0),
+            error=job.get("error"),
+            created_at=job["created_at"],
+            started_at=job.get("started_at"),
+            finished_at=job.get("finished_at")
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
+
 # ============ FILE ACCESS ENDPOINTS ============
 
 @router.get("/{book_id}/cover")
 async def get_book_cover(
     book_id: str,
+    request: Request,
+    w: Optional[int] = Query(None, ge=1, le=4096, description="Desired display width in pixels"),
     current_user: dict = Depends(get_current_user)
 ):
-    """Get book cover image from GridFS."""
+    """Get book cover image from blob storage (supports Range requests).
+
+    With ?w= the smallest pre-rendered variant at least that wide is served,
+    in the best format allowed by the Accept header.
+    """
     try:
-        book = await get_book_by_id(book_id)
+        book = await get_book_by_id(book_id, {"cover_id": 1})
         
         cover_id = book.get("cover_id")
         if not cover_id:
             raise HTTPException(status_code=404, detail="Cover not available for this book")
         
-        # Download cover from GridFS
-        content, content_type, filename = await download_file_from_gridfs(ObjectId(cover_id), cover_bucket)
+        # Use a thumbnail when the client asked for a width
+        if w is not None:
+            variant = await select_cover_variant(ObjectId(cover_id), w, request.headers.get("accept"))
+            if variant:
+                file_doc = await get_blob_file(COVER_BUCKET, variant["_id"])
+                response = blob_streaming_response(request, COVER_BUCKET, file_doc, media_type=variant["content_type"])
+                response.headers["Vary"] = "Accept"
+                return response
         
-        return StreamingResponse(
-            io.BytesIO(content),
-            media_type=content_type,
-            headers={"Content-Disposition": f"inline; filename={filename}"}
-        )
+        # Stream original cover from storage
+        file_doc = await get_blob_file(COVER_BUCKET, ObjectId(cover_id))
+        
+        return blob_streaming_response(request, COVER_BUCKET, file_doc)
         
     except HTTPException:
         raise
@@ -407,11 +704,12 @@ async def get_book_cover(
 @router.get("/{book_id}/read")
 async def read_book(
     book_id: str,
+    request: Request,
     current_user: dict = Depends(get_current_user)
 ):
-    """Stream PDF for reading from GridFS."""
+    """Stream PDF for reading from blob storage (supports Range requests for PDF.js)."""
     try:
-        book = await get_book_by_id(book_id)
+        book = await get_book_by_id(book_id, {"pdf_id": 1})
         
         pdf_id = book.get("pdf_id")
         if not pdf_id:
@@ -422,17 +720,10 @@ async def read_book(
         # - Check subscription status
         # - Implement reading limits, etc.
         
-        # Download PDF from GridFS
-        content, content_type, filename = await download_file_from_gridfs(ObjectId(pdf_id), pdf_bucket)
+        # Stream PDF from storage piece by piece
+        file_doc = await get_blob_file(PDF_BUCKET, ObjectId(pdf_id))
         
-        return StreamingResponse(
-            io.BytesIO(content),
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": f"inline; filename={filename}",
-                "Content-Type": "application/pdf"
-            }
-        )
+        return cached_blob_response(request, PDF_BUCKET, file_doc, media_type="application/pdf")
         
     except HTTPException:
         raise
@@ -442,11 +733,12 @@ async def read_book(
 @router.get("/{book_id}/download")
 async def download_book(
     book_id: str,
+    request: Request,
     current_user: dict = Depends(get_current_user)
 ):
-    """Download PDF file from GridFS."""
+    """Download PDF file from blob storage."""
     try:
-        book = await get_book_by_id(book_id)
+        book = await get_book_by_id(book_id, {"pdf_id": 1})
         
         pdf_id = book.get("pdf_id")
         if not pdf_id:
@@ -454,16 +746,108 @@ async def download_book(
         
         # Add download permission checks here
         
-        # Download PDF from GridFS
-        content, content_type, filename = await download_file_from_gridfs(ObjectId(pdf_id), pdf_bucket)
+        # Stream PDF from storage piece by piece
+        file_doc = await get_blob_file(PDF_BUCKET, ObjectId(pdf_id))
+        
+        return cached_blob_response(
+            request, PDF_BUCKET, file_doc, media_type="application/pdf", disposition="attachment"
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
+
+@router.get("/{book_id}/pages/{page}")
+async def read_book_page(
+    book_id: str,
+    page: int,
+    request: Request,
+    prefetch: int = Query(3, ge=0, le=20, description="Number of following pages to advertise for prefetch"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get a single page of a book as a one-page PDF."""
+    try:
+        book = await get_book_by_id(book_id, {"pdf_id": 1, "page_count": 1})
+        
+        pdf_id = book.get("pdf_id")
+        if not pdf_id:
+            raise HTTPException(status_code=404, detail="PDF not available for this book")
+        
+        page_doc = await find_page(ObjectId(pdf_id), page)
+        if not page_doc:
+            if not book.get("page_count"):
+                raise HTTPException(status_code=404, detail="Pages are still being prepared for this book")
+            raise HTTPException(status_code=404, detail="Page not found")
+        
+        file_doc = await get_blob_file(PAGE_BUCKET, page_doc["_id"])
+        response = cached_blob_response(request, PAGE_BUCKET, file_doc, media_type="application/pdf")
+        
+        # Let the reader start fetching the next pages right away
+        last_page = min(page + prefetch, book.get("page_count", 0))
+        if last_page > page:
+            response.headers["Link"] = ", ".join(
+                f"</books/{book_id}/pages/{n}>; rel=prefetch" for n in range(page + 1, last_page + 1)
+            )
+        response.headers["X-Total-Pages"] = str(book.get("page_count", 0))
+        return response
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
+
+@router.get("/{book_id}/pages")
+async def read_book_pages(
+    book_id: str,
+    start: int = Query(1, ge=1, description="First page to return"),
+    count: int = Query(5, ge=1, le=20, description="Number of pages to return"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get a batch of consecutive pages in one multipart/mixed response (for prefetching)."""
+    try:
+        book = await get_book_by_id(book_id, {"pdf_id": 1, "page_count": 1})
+        
+        pdf_id = book.get("pdf_id")
+        if not pdf_id:
+            raise HTTPException(status_code=404, detail="PDF not available for this book")
+        
+        page_docs = await derivative_collection.find(
+            {"source_id": ObjectId(pdf_id), "kind": PAGE_KIND, "page": {"$gte": start, "$lt": start + count}},
+            {"_id": 1, "page": 1}
+        ).sort("page", 1).to_list(length=count)
+        if not page_docs:
+            raise HTTPException(status_code=404, detail="Pages not found")
+        
+        file_docs = {
+            f["_id"]: f
+            for f in await storage.find_files(
+                PAGE_BUCKET,
+                {"_id": {"$in": [p["_id"] for p in page_docs]}}
+            ).to_list(length=count)
+        }
+        boundary = uuid.uuid4().hex
+        
+        async def iter_parts():
+            for page_doc in page_docs:
+                file_doc = file_docs.get(page_doc["_id"])
+                if not file_doc:
+                    continue
+                yield (
+                    f"--{boundary}\r\n"
+                    f"Content-Type: application/pdf\r\n"
+                    f"Content-Length: {file_doc['length']}\r\n"
+                    f"X-Page: {page_doc['page']}\r\n\r\n"
+                ).encode()
+                async for data in iter_blob(PAGE_BUCKET, file_doc):
+                    yield data
+                yield b"\r\n"
+            yield f"--{boundary}--\r\n".encode()
         
         return StreamingResponse(
-            io.BytesIO(content),
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": f"attachment; filename={filename}",
-                "Content-Type": "application/pdf"
-            }
+            iter_parts(),
+            media_type=f"multipart/mixed; boundary={boundary}",
+            headers={"X-Total-Pages": str(book.get("page_count", 0))}
         )
         
     except HTTPException:
@@ -523,8 +907,11 @@ async def update_reading_progress(
 
 @router.get("/reading/in-progress", response_model=list[ReadingSessionResponse])
 async def get_reading_in_progress(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
+    after: Optional[str] = Query(None, description="Cursor from X-Next-Cursor"),
+    before: Optional[str] = Query(None, description="Cursor from X-Prev-Cursor"),
     current_user: dict = Depends(get_current_user)
 ):
     """Get books currently being read"""
@@ -532,23 +919,25 @@ async def get_reading_in_progress(
         reading_collection = await get_reading_collection()
         user_id = ObjectId(current_user["user_id"])
         
-        cursor = reading_collection.find({
-            "user_id": user_id,
-            "status": {"$in": ["reading", "paused"]}
-        }).skip(skip).limit(limit).sort("last_read", -1)
-        
-        sessions = await cursor.to_list(length=limit)
+        page = await fetch_page(
+            reading_collection,
+            {"user_id": user_id, "status": {"$in": ["reading", "paused"]}},
+            "last_read", -1, limit, after, before, skip
+        )
+        page.set_headers(response)
+        sessions = page.items
+        books = await find_books_by_id([session["book_id"] for session in sessions], BOOK_READING)
         
         # Fetch book titles
         result = []
         for session in sessions:
-            book = await book_collection.find_one({"_id": session["book_id"]})
+            book = books.get(session["book_id"])
             if book:
                 result.append(ReadingSessionResponse(
                     book_id=str(session["book_id"]),
                     book_title=book["title"],
                     current_page=session.get("current_page", 0),
-                    total_pages=session.get("total_pages", 0),
+                    total_pages=session.get("total_pages") or book.get("page_count", 0),
                     progress_percentage=session.get("progress_percentage", 0),
                     status=session.get("status", "reading"),
                     last_read=session.get("last_read", datetime.utcnow()),
@@ -557,13 +946,18 @@ async def get_reading_in_progress(
         
         return result
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/reading/completed", response_model=list[ReadingSessionResponse])
 async def get_completed_books(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
+    after: Optional[str] = Query(None, description="Cursor from X-Next-Cursor"),
+    before: Optional[str] = Query(None, description="Cursor from X-Prev-Cursor"),
     current_user: dict = Depends(get_current_user)
 ):
     """Get completed books"""
@@ -571,22 +965,24 @@ async def get_completed_books(
         reading_collection = await get_reading_collection()
         user_id = ObjectId(current_user["user_id"])
         
-        cursor = reading_collection.find({
-            "user_id": user_id,
-            "status": "completed"
-        }).skip(skip).limit(limit).sort("last_read", -1)
-        
-        sessions = await cursor.to_list(length=limit)
+        page = await fetch_page(
+            reading_collection,
+            {"user_id": user_id, "status": "completed"},
+            "last_read", -1, limit, after, before, skip
+        )
+        page.set_headers(response)
+        sessions = page.items
+        books = await find_books_by_id([session["book_id"] for session in sessions], BOOK_READING)
         
         result = []
         for session in sessions:
-            book = await book_collection.find_one({"_id": session["book_id"]})
+            book = books.get(session["book_id"])
             if book:
                 result.append(ReadingSessionResponse(
                     book_id=str(session["book_id"]),
                     book_title=book["title"],
                     current_page=session.get("current_page", 0),
-                    total_pages=session.get("total_pages", 0),
+                    total_pages=session.get("total_pages") or book.get("page_count", 0),
                     progress_percentage=session.get("progress_percentage", 100),
                     status="completed",
                     last_read=session.get("last_read", datetime.utcnow()),
@@ -595,6 +991,8 @@ async def get_completed_books(
         
         return result
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -644,16 +1042,17 @@ async def get_personalized_recommendations(
         # Get user's reading history
         user_readings = await reading_collection.find({
             "user_id": user_id
-        }).to_list(length=None)
+        }, {"book_id": 1}).to_list(length=None)
         
         if not user_readings:
             # No history: return random popular books
-            books = await book_collection.find({}).sort("rating", -1).limit(limit).to_list(length=limit)
+            books = await book_collection.find({}, BOOK_RECOMMENDATION).sort("rating", -1).limit(limit).to_list(length=limit)
         else:
             # Get categories from read books
             read_book_ids = [r["book_id"] for r in user_readings]
             read_books = await book_collection.find(
-                {"_id": {"$in": read_book_ids}}
+                {"_id": {"$in": read_book_ids}},
+                fields("category")
             ).to_list(length=None)
             
             # Extract categories
@@ -663,17 +1062,17 @@ async def get_personalized_recommendations(
             books = await book_collection.find({
                 "_id": {"$nin": read_book_ids},
                 "category": {"$in": categories}
-            }).sort("rating", -1).limit(limit).to_list(length=limit)
+            }, BOOK_RECOMMENDATION).sort("rating", -1).limit(limit).to_list(length=limit)
             
             # If not enough, fill with popular books
             if len(books) < limit:
                 remaining = limit - len(books)
                 additional = await book_collection.find({
                     "_id": {"$nin": read_book_ids}
-                }).sort("rating", -1).limit(remaining).to_list(length=remaining)
+                }, BOOK_RECOMMENDATION).sort("rating", -1).limit(remaining).to_list(length=remaining)
                 books.extend(additional)
         
-        return [
+        return json_response([
             {
                 "id": str(b["_id"]),
                 "title": b["title"],
@@ -687,7 +1086,7 @@ async def get_personalized_recommendations(
                 "has_pdf": "pdf_id" in b
             }
             for b in books[:limit]
-        ]
+        ])
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -703,21 +1102,29 @@ async def get_category_recommendations(
         if category not in AVAILABLE_CATEGORIES:
             raise HTTPException(status_code=400, detail="Invalid category")
         
-        books = await book_collection.find(
-            {"category": category}
-        ).sort("rating", -1).limit(limit).to_list(length=limit)
+        async def load_recommendations() -> List[dict]:
+            books = await book_collection.find(
+                {"category": category},
+                BOOK_CARD
+            ).sort("rating", -1).limit(limit).to_list(length=limit)
+            
+            return [
+                {
+                    "id": str(b["_id"]),
+                    "title": b["title"],
+                    "author": b["author"],
+                    "rating": b.get("rating", 0),
+                    "category": b.get("category", "อื่นๆ"),
+                    "price": b.get("price", 0)
+                }
+                for b in books
+            ]
         
-        return [
-            {
-                "id": str(b["_id"]),
-                "title": b["title"],
-                "author": b["author"],
-                "rating": b.get("rating", 0),
-                "category": b.get("category", "อื่นๆ"),
-                "price": b.get("price", 0)
-            }
-            for b in books
-        ]
+        return json_response(await catalog_cache.get_or_load(
+            ("recommend_category", category, limit),
+            catalog_tags(category),
+            load_recommendations
+        ))
         
     except HTTPException:
         raise
@@ -728,42 +1135,20 @@ async def get_category_recommendations(
 
 @router.get("/stats/storage")
 async def get_storage_stats(current_user: dict = Depends(is_admin)):
-    """Get storage statistics for GridFS."""
+    """Get storage statistics for blob storage."""
     try:
-        # Get book count and total file sizes
-        pipeline = [
-            {"$match": {"file_size": {"$exists": True}}},
-            {"$group": {
-                "_id": None,
-                "total_books": {"$sum": 1},
-                "total_pdf_size": {"$sum": "$file_size"},
-                "avg_pdf_size": {"$avg": "$file_size"}
-            }}
-        ]
-        
-        result = await book_collection.aggregate(pipeline).to_list(length=None)
+        # Counters are maintained on every change, so this does not scan the catalog
+        stats = await read_stats(storage, [PDF_BUCKET, COVER_BUCKET])
+        books_with_pdf = stats["books"]["books_with_pdf"]
+        total_pdf_size = stats["books"]["pdf_bytes"]
         
-        # Get GridFS bucket stats
-        pdf_files_count = await pdf_bucket.find().to_list(length=None)
-        cover_files_count = await cover_bucket.find().to_list(length=None)
-        
-        if result:
-            stats = result[0]
-            return {
-                "total_books": stats["total_books"],
-                "total_pdf_size_mb": round(stats["total_pdf_size"] / (1024*1024), 2),
-                "average_pdf_size_mb": round(stats["avg_pdf_size"] / (1024*1024), 2),
-                "pdf_files_in_gridfs": len(pdf_files_count),
-                "cover_files_in_gridfs": len(cover_files_count)
-            }
-        else:
-            return {
-                "total_books": 0,
-                "total_pdf_size_mb": 0,
-                "average_pdf_size_mb": 0,
-                "pdf_files_in_gridfs": len(pdf_files_count),
-                "cover_files_in_gridfs": len(cover_files_count)
-            }
+        return {
+            "total_books": books_with_pdf,
+            "total_pdf_size_mb": round(total_pdf_size / (1024*1024), 2),
+            "average_pdf_size_mb": round(total_pdf_size / books_with_pdf / (1024*1024), 2) if books_with_pdf else 0,
+            "pdf_files_in_gridfs": stats["buckets"][PDF_BUCKET]["files"],
+            "cover_files_in_gridfs": stats["buckets"][COVER_BUCKET]["files"]
+        }
             
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
@@ -787,15 +1172,15 @@ async def get_reading_stats(current_user: dict = Depends(get_current_user)):
         
         # Calculate reading streak (consecutive days)
         last_30_days = datetime.utcnow() - timedelta(days=30)
-        recent_reads = await reading_collection.find({
+        recent_reads = await reading_collection.count_documents({
             "user_id": user_id,
             "last_read": {"$gte": last_30_days}
-        }).to_list(length=None)
+        })
         
         return {
             "total_completed": total_read,
             "currently_reading": in_progress,
-            "recent_activity_30_days": len(recent_reads),
+            "recent_activity_30_days": recent_reads,
             "user_id": str(user_id)
         }
         
@@ -1,7 +1,9 @@
 from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from app.database import user_collection, book_collection
 from app.auth.jwt_handler import get_current_user
+from app.utils.pagination import fetch_page
+from app.utils.projections import BOOK_ID, CREATOR_BOOK, fields
 from pydantic import BaseModel
 from typing import List, Dict, Optional
 from bson import ObjectId
@@ -37,7 +39,8 @@ async def get_creator_stats(current_user: dict = Depends(get_current_user)):
         
         # Get all books by this creator
         creator_books = await book_collection.find(
-            {"author": username}
+            {"author": username},
+            fields("likes")
         ).to_list(length=None)
         
         book_ids = [str(book["_id"]) for book in creator_books]
@@ -60,6 +63,8 @@ async def get_creator_stats(current_user: dict = Depends(get_current_user)):
         
         # Count total sales (purchases of this creator's books)
         sales_pipeline = [
+            {"$match": {"library.book_id": {"$in": book_ids}}},
+            {"$project": {"library.book_id": 1, "library.price_paid": 1}},
             {"$unwind": "$library"},
             {"$match": {"library.book_id": {"$in": book_ids}}},
             {"$group": {
@@ -99,7 +104,8 @@ async def get_sales_history(
         
         # Get all books by this creator
         creator_books = await book_collection.find(
-            {"author": username}
+            {"author": username},
+            BOOK_ID
         ).to_list(length=None)
         
         book_ids = [str(book["_id"]) for book in creator_books]
@@ -110,6 +116,8 @@ async def get_sales_history(
         
         # Aggregate sales by month
         pipeline = [
+            {"$match": {"library.book_id": {"$in": book_ids}}},
+            {"$project": {"library.book_id": 1, "library.purchase_date": 1}},
             {"$unwind": "$library"},
             {"$match": {
                 "library.book_id": {"$in": book_ids},
@@ -156,18 +164,23 @@ async def get_sales_history(
 
 @router.get("/books", response_model=List[CreatorBook])
 async def get_creator_books(
+    response: Response,
     current_user: dict = Depends(get_current_user),
     skip: int = Query(0, ge=0),
-    limit: int = Query(20, ge=1, le=100)
+    limit: int = Query(20, ge=1, le=100),
+    after: Optional[str] = Query(None, description="Cursor from X-Next-Cursor"),
+    before: Optional[str] = Query(None, description="Cursor from X-Prev-Cursor")
 ):
-    """Get all books created by the current user"""
+    """Get all books created by the current user, newest first"""
     try:
         username = current_user["username"]
         
         # Get creator's books
-        books = await book_collection.find(
-            {"author": username}
-        ).skip(skip).limit(limit).sort("created_at", -1).to_list(length=limit)
+        page = await fetch_page(
+            book_collection, {"author": username}, "created_at", -1, limit, after, before, skip, CREATOR_BOOK
+        )
+        page.set_headers(response)
+        books = page.items
         
         result = []
         for book in books:
@@ -193,6 +206,8 @@ async def get_creator_books(
         
         return result
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get creator books: {str(e)}")
 
@@ -266,15 +281,18 @@ async def get_user_profile(
     following_count = len(user.get("following", []))
 
     # --- นับจำนวนหนังสือถ้ามี ---
-    books = await book_collection.find({"author": username}).to_list(None)
+    books = await book_collection.find({"author": username}, BOOK_ID).to_list(None)
     total_books = len(books)
     
     # --- นับยอดขายถ้ามี (ถ้าเป็น creator เท่านั้น) ---
     total_sales = 0
     if books:
+        book_ids = [str(book["_id"]) for book in books]
         pipeline = [
+            {"$match": {"library.book_id": {"$in": book_ids}}},
+            {"$project": {"library.book_id": 1, "library.price_paid": 1}},
             {"$unwind": "$library"},
-            {"$match": {"library.book_id": {"$in": [str(book["_id"]) for book in books]}}},
+            {"$match": {"library.book_id": {"$in": book_ids}}},
             {"$group": {"_id": None, "total_revenue": {"$sum": "$library.price_paid"}}}
         ]
         result = await user_collection.aggregate(pipeline).to_list(length=None)
@@ -7,6 +7,8 @@ from pydantic import BaseModel, Field
 
 from app.auth.jwt_handler import get_current_user
 from app.database import book_collection, user_collection
+from app.search.suggest import suggest_index
+from app.utils.query_cache import invalidate_book
 
 # Initialize router
 router = APIRouter(prefix="/books", tags=["Reviews"])
@@ -69,7 +71,7 @@ async def check_book_ownership(book_id: str, username: str) -> bool:
 
 async def is_book_free(book_id: str) -> bool:
     """Check if book is free"""
-    book = await book_collection.find_one({"_id": ObjectId(book_id)})
+    book = await book_collection.find_one({"_id": ObjectId(book_id)}, {"price": 1})
     if not book:
         return False
     return book.get("price", 0) == 0
@@ -84,21 +86,25 @@ async def find_review_in_book(book: dict, review_id: str) -> Tuple[Optional[dict
 
 async def update_book_rating(book_id: str) -> None:
     """Recalculate and update the average rating for a book"""
-    book = await book_collection.find_one({"_id": ObjectId(book_id)})
+    book = await book_collection.find_one({"_id": ObjectId(book_id)}, {"reviews.rating": 1, "category": 1})
     reviews = book.get("reviews", [])
     
     if reviews:
-        avg_rating = sum(r["rating"] for r in reviews) / len(reviews)
+        avg_rating = round(sum(r["rating"] for r in reviews) / len(reviews), 1)
         await book_collection.update_one(
             {"_id": ObjectId(book_id)},
-            {"$set": {"rating": round(avg_rating, 1)}}
+            {"$set": {"rating": avg_rating}}
         )
     else:
         # No reviews left, set default rating
+        avg_rating = 0
         await book_collection.update_one(
             {"_id": ObjectId(book_id)},
             {"$set": {"rating": 0}}
         )
+    # Listings sorted by rating may now order differently
+    invalidate_book(book.get("category"))
+    suggest_index.update_rating(book["_id"], avg_rating, len(reviews))
 
 def format_review_response(review: dict, current_username: str) -> ReviewResponse:
     """Format a review document into a ReviewResponse model"""
@@ -188,6 +194,53 @@ async def create_review(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+@router.get("/user/reviews", response_model=UserReviewsResponse)
+async def get_user_reviews(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get all reviews written by the current user"""
+    try:
+        # Find all books with reviews from this user
+        # Only this user's reviews are read out of each book
+        books_with_reviews = await book_collection.find(
+            {"reviews.user_id": current_user["username"]},
+            {
+                "title": 1,
+                "author": 1,
+                "reviews": {"$filter": {
+                    "input": "$reviews",
+                    "cond": {"$eq": ["$$this.user_id", current_user["username"]]}
+                }}
+            }
+        ).to_list(length=None)
+        
+        user_reviews = []
+        for book in books_with_reviews:
+            for review in book.get("reviews", []):
+                if review.get("user_id") == current_user["username"]:
+                    user_reviews.append({
+                        "book_id": str(book["_id"]),
+                        "book_title": book.get("title", ""),
+                        "book_author": book.get("author", ""),
+                        "review": format_review_response(review, current_user["username"])
+                    })
+        
+        # Sort by created_at (newest first)
+        user_reviews.sort(key=lambda x: x["review"].created_at, reverse=True)
+        
+        # Apply pagination
+        paginated_reviews = user_reviews[skip:skip + limit]
+        
+        return UserReviewsResponse(
+            total_reviews=len(user_reviews),
+            reviews=paginated_reviews
+        )
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
 @router.get("/{book_id}/reviews", response_model=BookReviewsResponse)
 async def get_book_reviews(
     book_id: str,
@@ -338,41 +391,3 @@ async def delete_review(
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
-
-@router.get("/user/reviews", response_model=UserReviewsResponse)
-async def get_user_reviews(
-    skip: int = Query(0, ge=0),
-    limit: int = Query(20, ge=1, le=100),
-    current_user: dict = Depends(get_current_user)
-):
-    """Get all reviews written by the current user"""
-    try:
-        # Find all books with reviews from this user
-        books_with_reviews = await book_collection.find(
-            {"reviews.user_id": current_user["username"]}
-        ).to_list(length=None)
-        
-        user_reviews = []
-        for book in books_with_reviews:
-            for review in book.get("reviews", []):
-                if review.get("user_id") == current_user["username"]:
-                    user_reviews.append({
-                        "book_id": str(book["_id"]),
-                        "book_title": book.get("title", ""),
-                        "book_author": book.get("author", ""),
-                        "review": format_review_response(review, current_user["username"])
-                    })
-        
-        # Sort by created_at (newest first)
-        user_reviews.sort(key=lambda x: x["review"].created_at, reverse=True)
-        
-        # Apply pagination
-        paginated_reviews = user_reviews[skip:skip + limit]
-        
-        return UserReviewsResponse(
-            total_reviews=len(user_reviews),
-            reviews=paginated_reviews
-        )
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,233 @@
+import base64
+import logging
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Dict, Optional
+
+from fastapi import APIRouter, Depends, File, Form, Header, HTTPException, Request, Response, UploadFile
+from starlette.requests import ClientDisconnect
+
+from app.catalog import AVAILABLE_CATEGORIES, MAX_UPLOAD_SIZES, validate_cover_filename
+from app.ingest.pipeline import stage_upload
+from app.ingest.resumable import (
+    append_chunk, claim_for_finalize, create_session, delete_session,
+    get_session, release_claim, staged_entry
+)
+from app.routers.book import BookResponse, create_book_with_files, is_admin
+
+logger = logging.getLogger(__name__)
+
+# ============ INITIALIZATION ============
+
+router = APIRouter(prefix="/uploads", tags=["Uploads"])
+
+TUS_VERSION = "1.0.0"
+TUS_EXTENSIONS = "creation,termination,expiration"
+
+# ============ HELPER FUNCTIONS ============
+
+def tus_headers(**extra) -> Dict[str, str]:
+    headers = {"Tus-Resumable": TUS_VERSION}
+    headers.update({name.replace("_", "-").title(): str(value) for name, value in extra.items()})
+    return headers
+
+def check_tus_version(tus_resumable: Optional[str]):
+    if tus_resumable is not None and tus_resumable != TUS_VERSION:
+        raise HTTPException(
+            status_code=412,
+            detail=f"Unsupported Tus-Resumable version, expected {TUS_VERSION}",
+            headers={"Tus-Version": TUS_VERSION}
+        )
+
+def parse_upload_metadata(header: Optional[str]) -> Dict[str, str]:
+    """Decode an Upload-Metadata header: comma-separated "key base64value" pairs"""
+    metadata = {}
+    for pair in (header or "").split(","):
+        pair = pair.strip()
+        if not pair:
+            continue
+        key, _, value = pair.partition(" ")
+        try:
+            metadata[key] = base64.b64decode(value).decode("utf-8") if value else ""
+        except (ValueError, UnicodeDecodeError):
+            raise HTTPException(status_code=400, detail=f"Invalid Upload-Metadata value for '{key}'")
+    return metadata
+
+def upload_expires(session: dict) -> str:
+    return format_datetime(session["expires_at"].replace(microsecond=0, tzinfo=timezone.utc), usegmt=True)
+
+async def request_body(request: Request):
+    """Yield the request body, ending quietly if the client goes away"""
+    try:
+        async for data in request.stream():
+            if data:
+                yield data
+    except ClientDisconnect:
+        logger.info("Client disconnected during upload chunk, keeping received bytes")
+
+# ============ RESUMABLE UPLOAD ENDPOINTS ============
+
+@router.options("/")
+async def upload_options():
+    """Advertise the supported tus version, extensions and maximum size."""
+    return Response(status_code=204, headers={
+        **tus_headers(),
+        "Tus-Version": TUS_VERSION,
+        "Tus-Extension": TUS_EXTENSIONS,
+        "Tus-Max-Size": str(MAX_UPLOAD_SIZES["pdf"])
+    })
+
+@router.post("/", status_code=201)
+async def create_upload(
+    upload_length: int = Header(..., ge=1),
+    upload_metadata: Optional[str] = Header(None),
+    tus_resumable: Optional[str] = Header(None),
+    current_user: dict = Depends(is_admin)
+):
+    """Start a resumable PDF upload.
+
+    Send Upload-Length and Upload-Metadata with at least a base64 "filename".
+    The Location header is the URL to PATCH chunks to.
+    """
+    check_tus_version(tus_resumable)
+    if upload_length > MAX_UPLOAD_SIZES["pdf"]:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File too large. Maximum size: {MAX_UPLOAD_SIZES['pdf'] // (1024 * 1024)}MB"
+        )
+
+    metadata = parse_upload_metadata(upload_metadata)
+    filename = metadata.get("filename", "")
+    if not filename.lower().endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+
+    try:
+        session = await create_session(
+            current_user["username"],
+            "pdf",
+            filename,
+            metadata.get("filetype") or "application/pdf",
+            upload_length
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to create upload: {str(e)}")
+
+    return Response(status_code=201, headers=tus_headers(
+        location=f"/uploads/{session['_id']}",
+        upload_offset=0,
+        upload_expires=upload_expires(session)
+    ))
+
+@router.head("/{upload_id}")
+async def get_upload_offset(
+    upload_id: str,
+    current_user: dict = Depends(is_admin)
+):
+    """Report how many bytes the server holds, so the client knows where to resume."""
+    session = await get_session(upload_id, current_user["username"])
+    return Response(status_code=200, headers={
+        **tus_headers(
+            upload_offset=session["offset"],
+            upload_length=session["length"],
+            upload_expires=upload_expires(session)
+        ),
+        "Cache-Control": "no-store"
+    })
+
+@router.patch("/{upload_id}")
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(..., ge=0),
+    content_type: Optional[str] = Header(None),
+    tus_resumable: Optional[str] = Header(None),
+    current_user: dict = Depends(is_admin)
+):
+    """Append a chunk at Upload-Offset (Content-Type: application/offset+octet-stream)."""
+    check_tus_version(tus_resumable)
+    if (content_type or "").split(";")[0].strip() != "application/offset+octet-stream":
+        raise HTTPException(status_code=415, detail="Content-Type must be application/offset+octet-stream")
+
+    session = await get_session(upload_id, current_user["username"])
+    try:
+        session = await append_chunk(session, upload_offset, request_body(request))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to store chunk: {str(e)}")
+
+    return Response(status_code=204, headers=tus_headers(
+        upload_offset=session["offset"],
+        upload_expires=upload_expires(session)
+    ))
+
+@router.delete("/{upload_id}", status_code=204)
+async def terminate_upload(
+    upload_id: str,
+    tus_resumable: Optional[str] = Header(None),
+    current_user: dict = Depends(is_admin)
+):
+    """Abandon an upload and delete the bytes received so far."""
+    check_tus_version(tus_resumable)
+    session = await get_session(upload_id, current_user["username"])
+    await delete_session(session)
+    return Response(status_code=204, headers=tus_headers())
+
+@router.post("/{upload_id}/finalize", response_model=BookResponse)
+async def finalize_upload(
+    upload_id: str,
+    title: str = Form(...),
+    rating: float = Form(...),
+    description: str = Form(...),
+    category: str = Form("อื่นๆ"),
+    price: int = Form(0),
+    cover_file: Optional[UploadFile] = File(None),
+    current_user: dict = Depends(is_admin)
+):
+    """Create the book for a completed upload, exactly like POST /books/.
+
+    The book is returned at once with status "processing".
+    """
+    if category not in AVAILABLE_CATEGORIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid category. Available categories: {', '.join(AVAILABLE_CATEGORIES)}"
+        )
+    has_cover = bool(cover_file and cover_file.filename)
+    if has_cover:
+        validate_cover_filename(cover_file.filename)
+
+    session = await claim_for_finalize(await get_session(upload_id, current_user["username"]))
+
+    payload = {"pdf": staged_entry(session)}
+    try:
+        if has_cover:
+            payload["cover"] = await stage_upload(cover_file, "cover", MAX_UPLOAD_SIZES["cover"])
+    except HTTPException:
+        await release_claim(session)
+        raise
+    except Exception as e:
+        await release_claim(session)
+        raise HTTPException(status_code=500, detail=f"Failed to upload cover: {str(e)}")
+
+    book_dict = {
+        "title": title,
+        "author": current_user["username"],
+        "rating": rating,
+        "description": description,
+        "category": category,
+        "price": price,
+        "created_at": datetime.utcnow(),
+        "uploader": current_user["username"]
+    }
+
+    try:
+        book = await create_book_with_files(book_dict, payload)
+    except HTTPException:
+        # create_book_with_files dropped the staged files, including the parts
+        await delete_session(session, keep_parts=True)
+        raise
+
+    # The ingestion job owns the parts now
+    await delete_session(session, keep_parts=True)
+    return book
@@ -86,12 +86,12 @@ async def get_user_by_username(username: str) -> Dict:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
-async def get_book_by_id(book_id: str) -> Dict:
+async def get_book_by_id(book_id: str, projection: Optional[Dict] = None) -> Dict:
     """Get book document from database"""
     if not ObjectId.is_valid(book_id):
         raise HTTPException(status_code=400, detail="Invalid book ID format")
     
-    book = await book_collection.find_one({"_id": ObjectId(book_id)})
+    book = await book_collection.find_one({"_id": ObjectId(book_id)}, projection)
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
     return book
@@ -427,7 +427,7 @@ async def purchase_book(
 ):
     """Purchase a book with user points"""
     # Get book details
-    book = await get_book_by_id(book_purchase.book_id)
+    book = await get_book_by_id(book_purchase.book_id, {"title": 1, "author": 1, "price": 1, "pdf_id": 1, "cover_id": 1})
     
     # Get current user
     user = await get_user_by_username(current_user["username"])
@@ -498,7 +498,7 @@ async def check_book_ownership(
 ):
     """Check if user owns a specific book"""
     # Validate book ID
-    book = await get_book_by_id(book_id)
+    book = await get_book_by_id(book_id, {"_id": 1})
     
     # Get user
     user = await get_user_by_username(current_user["username"])
@@ -563,7 +563,7 @@ async def remove_book_from_library(
 ):
     """Remove a book from user's library"""
     # Validate book ID
-    await get_book_by_id(book_id)
+    await get_book_by_id(book_id, {"_id": 1})
     
     # Remove book from user's library
     result = await user_collection.update_one(
@@ -619,7 +619,7 @@ async def log_reading_activity(
     Otherwise → add new record.
     """
     # Get book info
-    book = await get_book_by_id(activity.book_id)
+    book = await get_book_by_id(activity.book_id, {"title": 1, "category": 1})
     
     # Prepare reading record
     reading_entry = {
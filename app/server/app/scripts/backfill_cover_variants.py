@@ -0,0 +1,72 @@
+"""Render thumbnail variants for covers uploaded before variants existed.
+
+Usage:
+    python -m app.scripts.backfill_cover_variants [--limit N] [--concurrency N] [--force]
+"""
+import argparse
+import asyncio
+import logging
+
+from app.database import close_connection
+from app.media.covers import generate_cover_variants
+from app.storage.store import storage
+from app.utils.blob_stream import COVER_BUCKET
+from app.utils.process_pool import shutdown_process_pool
+
+logger = logging.getLogger(__name__)
+
+async def backfill(limit: int, concurrency: int, force: bool) -> dict:
+    """Generate variants for every original cover in the covers bucket"""
+    semaphore = asyncio.Semaphore(concurrency)
+    processed = 0
+    rendered = 0
+    failed = 0
+
+    async def process(cover_id):
+        nonlocal processed, rendered, failed
+        async with semaphore:
+            try:
+                rendered += await generate_cover_variants(cover_id, force=force)
+            except Exception as e:
+                failed += 1
+                logger.error(f"Cover {cover_id} failed: {e}")
+            processed += 1
+            if processed % 100 == 0:
+                logger.info(f"Processed {processed} covers, {rendered} variants stored")
+
+    cursor = storage.find_files(
+        COVER_BUCKET,
+        {"metadata.derivative_of": {"$exists": False}},
+        {"_id": 1}
+    ).sort("_id", 1)
+    if limit:
+        cursor = cursor.limit(limit)
+
+    tasks = set()
+    async for file_doc in cursor:
+        tasks.add(asyncio.create_task(process(file_doc["_id"])))
+        if len(tasks) >= concurrency * 4:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    if tasks:
+        await asyncio.wait(tasks)
+
+    return {"covers_processed": processed, "variants_stored": rendered, "failed": failed}
+
+async def main():
+    parser = argparse.ArgumentParser(description="Backfill cover thumbnail variants")
+    parser.add_argument("--limit", type=int, default=0, help="Stop after N covers (0 = all)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Covers rendered at once")
+    parser.add_argument("--force", action="store_true", help="Re-render covers that already have variants")
+    args = parser.parse_args()
+
+    try:
+        result = await backfill(args.limit, args.concurrency, args.force)
+        logger.info(f"✓ Backfill completed: {result}")
+    finally:
+        shutdown_process_pool()
+        await storage.close()
+        await close_connection()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(main())
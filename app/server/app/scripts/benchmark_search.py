@@ -0,0 +1,170 @@
+"""Compare the n-gram search index with the $regex search on a synthetic catalog.
+
+Generates books with Thai titles (words written without spaces, as in real
+titles) and mixed Thai/English authors and descriptions in a scratch
+database, builds a search index over them, then runs the same queries
+through the $regex filter GET /books used to apply and through the index.
+The scratch database is dropped afterwards unless --keep is given.
+
+Usage:
+    python -m app.scripts.benchmark_search [--books N] [--queries N] [--batch-size N] [--keep]
+"""
+import argparse
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from bson import ObjectId
+
+from app.catalog import AVAILABLE_CATEGORIES
+from app.database import client, close_connection, database
+from app.scripts.benchmark_storage import _latency_summary
+from app.search.index import SearchIndex
+
+logger = logging.getLogger(__name__)
+
+THAI_WORDS = [
+    "ความรัก", "ทะเล", "ภูเขา", "เมือง", "บ้าน", "แม่น้ำ", "ดวงดาว", "ความฝัน", "สงคราม", "ประวัติศาสตร์",
+    "การเดินทาง", "ครอบครัว", "เพื่อน", "โรงเรียน", "ความลับ", "ปริศนา", "ฤดูฝน", "ดอกไม้", "หัวใจ", "แสงจันทร์",
+    "นักสืบ", "เจ้าหญิง", "มังกร", "เวทมนตร์", "อาหาร", "ธุรกิจ", "การลงทุน", "จิตวิทยา", "สุขภาพ", "วิทยาศาสตร์"
+]
+ENGLISH_WORDS = [
+    "python", "guide", "history", "ocean", "mystery", "dragon", "business", "investing", "health", "science",
+    "love", "journey", "secret", "garden", "kingdom", "winter", "machine", "learning", "design", "music"
+]
+AUTHORS = ["สมชาย ใจดี", "วิภา รักเรียน", "John Smith", "Anong K.", "ประเสริฐ ศรีสุข", "Mary Lee"]
+
+def synthetic_book(rng: random.Random, created_at: datetime) -> dict:
+    title = "".join(rng.sample(THAI_WORDS, rng.randint(2, 4)))
+    if rng.random() < 0.3:
+        title += " " + " ".join(rng.sample(ENGLISH_WORDS, rng.randint(1, 2))).title()
+    description = " ".join(
+        "".join(rng.sample(THAI_WORDS, rng.randint(1, 3))) if rng.random() < 0.7 else rng.choice(ENGLISH_WORDS)
+        for _ in range(rng.randint(10, 40))
+    )
+    return {
+        "_id": ObjectId(),
+        "title": title,
+        "author": rng.choice(AUTHORS),
+        "description": description,
+        "category": rng.choice(AVAILABLE_CATEGORIES),
+        "rating": round(rng.uniform(0, 5), 1),
+        "price": rng.randint(0, 500),
+        "created_at": created_at,
+        "status": "ready"
+    }
+
+def synthetic_queries(rng: random.Random, count: int) -> List[str]:
+    """Whole words, word fragments and two-word phrases, Thai and English"""
+    queries = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.4:
+            queries.append(rng.choice(THAI_WORDS))
+        elif kind < 0.6:
+            word = rng.choice(THAI_WORDS)
+            start = rng.randrange(0, max(1, len(word) - 3))
+            queries.append(word[start:start + 3])
+        elif kind < 0.8:
+            queries.append(rng.choice(THAI_WORDS) + rng.choice(THAI_WORDS))
+        else:
+            queries.append(rng.choice(ENGLISH_WORDS))
+    return queries
+
+def regex_filter(search: str) -> dict:
+    return {"$or": [
+        {"title": {"$regex": search, "$options": "i"}},
+        {"author": {"$regex": search, "$options": "i"}},
+        {"description": {"$regex": search, "$options": "i"}}
+    ]}
+
+async def run_benchmark(books: int, queries: int, batch_size: int, keep: bool) -> dict:
+    scratch = client[f"{database.name}_search_benchmark"]
+    books_collection = scratch.get_collection("books")
+    index = SearchIndex(
+        scratch.get_collection("search_postings"),
+        scratch.get_collection("search_docs"),
+        scratch.get_collection("search_terms")
+    )
+    rng = random.Random(42)
+    try:
+        await scratch.drop_collection("books")
+        await index.clear()
+        await index.ensure_indexes()
+        await books_collection.create_index([("created_at", -1)])
+
+        logger.info(f"Generating {books} books...")
+        now = datetime.utcnow()
+        index_seconds = 0.0
+        for start in range(0, books, batch_size):
+            batch = [synthetic_book(rng, now - timedelta(minutes=n)) for n in range(start, min(books, start + batch_size))]
+            await books_collection.insert_many(batch)
+            started = time.perf_counter()
+            await index.index_books(batch)
+            index_seconds += time.perf_counter() - started
+            if (start // batch_size) % 20 == 0:
+                logger.info(f"Inserted and indexed {start + len(batch)} books")
+        await index.mark_built()
+
+        sample = synthetic_queries(rng, queries)
+        regex_latencies, index_latencies = [], []
+        regex_hits, index_hits = 0, 0
+        for query in sample:
+            started = time.perf_counter()
+            found = await books_collection.find(regex_filter(query)).sort("created_at", -1).limit(10).to_list(length=10)
+            regex_latencies.append(time.perf_counter() - started)
+            regex_hits += len(found)
+
+            started = time.perf_counter()
+            ids = await index.search(query, limit=10) or []
+            found = await books_collection.find({"_id": {"$in": ids}}).to_list(length=None)
+            index_latencies.append(time.perf_counter() - started)
+            index_hits += len(found)
+
+        return {
+            "books": books,
+            "queries": len(sample),
+            "index_build_seconds": round(index_seconds, 1),
+            "index": await index.stats(),
+            "results": [
+                {"method": "regex", "hits_per_query": round(regex_hits / len(sample), 1), **_latency_summary(regex_latencies)},
+                {"method": "ngram index", "hits_per_query": round(index_hits / len(sample), 1), **_latency_summary(index_latencies)}
+            ]
+        }
+    finally:
+        if not keep:
+            await client.drop_database(scratch.name)
+
+def _print_table(results: List[dict]):
+    columns = ["method", "hits_per_query", "p50_ms", "p95_ms", "p99_ms", "mean_ms"]
+    rows = [columns] + [[str(r[name]) for name in columns] for r in results]
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    for row in rows:
+        print("  ".join(cell.rjust(width) for cell, width in zip(row, widths)))
+    print("(latencies in ms, first page of 10 results)")
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark the search index against $regex search")
+    parser.add_argument("--books", type=int, default=100000, help="Synthetic books generated")
+    parser.add_argument("--queries", type=int, default=200, help="Queries run through each method")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Books inserted and indexed per round")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch database afterwards")
+    args = parser.parse_args()
+
+    try:
+        result = await run_benchmark(args.books, args.queries, args.batch_size, args.keep)
+    finally:
+        await close_connection()
+
+    logger.info(
+        f"Indexed {result['books']} books in {result['index_build_seconds']}s "
+        f"({result['index']['average_length']} weighted terms per book)"
+    )
+    _print_table(result["results"])
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(main())
@@ -0,0 +1,179 @@
+"""Compare throughput and latency of the blob storage backends.
+
+Writes synthetic files to a scratch bucket of each backend, then measures
+upload and full-read throughput, time to first byte, random range-read
+latency (what PDF.js does while paging) and stat latency. Everything written
+is deleted afterwards. For S3, a local MinIO works as a stand-in::
+
+    docker run -p 9000:9000 minio/minio server /data
+    S3_ENDPOINT_URL=http://localhost:9000 S3_ACCESS_KEY_ID=minioadmin \\
+        S3_SECRET_ACCESS_KEY=minioadmin python -m app.scripts.benchmark_storage --backends gridfs,local,s3
+
+Usage:
+    python -m app.scripts.benchmark_storage [--backends gridfs,local,s3] [--files N]
+        [--size-mb N] [--range-kb N] [--range-reads N] [--concurrency N]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import time
+from typing import List
+
+from app.database import close_connection
+from app.storage.backends.base import BlobStorage
+from app.storage.store import STORAGE_BACKENDS, create_storage
+from app.utils.blob_stream import UPLOAD_PIECE_SIZE
+
+logger = logging.getLogger(__name__)
+
+BENCH_BUCKET = "benchmark"
+
+def _percentile(samples: List[float], percent: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def _latency_summary(samples: List[float]) -> dict:
+    """p50/p95/p99 in milliseconds"""
+    return {
+        "p50_ms": round(_percentile(samples, 50) * 1000, 2),
+        "p95_ms": round(_percentile(samples, 95) * 1000, 2),
+        "p99_ms": round(_percentile(samples, 99) * 1000, 2),
+        "mean_ms": round(statistics.mean(samples) * 1000, 2)
+    }
+
+async def _gather_limited(concurrency: int, coroutines) -> list:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(coro):
+        async with semaphore:
+            return await coro
+
+    return await asyncio.gather(*(run(c) for c in coroutines))
+
+async def benchmark_backend(
+    storage: BlobStorage,
+    files: int,
+    size: int,
+    range_size: int,
+    range_reads: int,
+    concurrency: int
+) -> dict:
+    """Run every measurement against one backend and clean up after it"""
+    await storage.ensure_ready()
+    payload = os.urandom(size)
+    file_docs = []
+
+    async def put():
+        async def pieces():
+            for offset in range(0, size, UPLOAD_PIECE_SIZE):
+                yield payload[offset:offset + UPLOAD_PIECE_SIZE]
+
+        file_doc = await storage.put_stream(BENCH_BUCKET, pieces(), "benchmark.bin", {"benchmark": True})
+        file_docs.append(file_doc)
+
+    async def read_all(file_doc) -> float:
+        started = time.perf_counter()
+        first_byte = None
+        async for _ in storage.get_range(BENCH_BUCKET, file_doc):
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+        return first_byte or 0.0
+
+    async def read_range(file_doc) -> float:
+        start = random.randrange(0, max(1, size - range_size))
+        started = time.perf_counter()
+        async for _ in storage.get_range(BENCH_BUCKET, file_doc, start, start + range_size - 1):
+            pass
+        return time.perf_counter() - started
+
+    async def stat(file_doc) -> float:
+        started = time.perf_counter()
+        await storage.stat(BENCH_BUCKET, file_doc["_id"])
+        return time.perf_counter() - started
+
+    total_mb = files * size / (1024 * 1024)
+    try:
+        started = time.perf_counter()
+        await _gather_limited(concurrency, [put() for _ in range(files)])
+        upload_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        first_bytes = await _gather_limited(concurrency, [read_all(doc) for doc in file_docs])
+        read_seconds = time.perf_counter() - started
+
+        range_latencies = await _gather_limited(
+            concurrency, [read_range(random.choice(file_docs)) for _ in range(range_reads)]
+        )
+        stat_latencies = await _gather_limited(concurrency, [stat(doc) for doc in file_docs])
+    finally:
+        for file_doc in file_docs:
+            await storage.delete(BENCH_BUCKET, file_doc["_id"])
+
+    return {
+        "backend": storage.name,
+        "upload_mb_per_s": round(total_mb / upload_seconds, 2),
+        "read_mb_per_s": round(total_mb / read_seconds, 2),
+        "first_byte": _latency_summary(first_bytes),
+        "range_read": _latency_summary(range_latencies),
+        "stat": _latency_summary(stat_latencies)
+    }
+
+def _print_table(results: List[dict]):
+    columns = [
+        ("backend", lambda r: r["backend"]),
+        ("upload MB/s", lambda r: r["upload_mb_per_s"]),
+        ("read MB/s", lambda r: r["read_mb_per_s"]),
+        ("TTFB p50", lambda r: r["first_byte"]["p50_ms"]),
+        ("TTFB p95", lambda r: r["first_byte"]["p95_ms"]),
+        ("range p50", lambda r: r["range_read"]["p50_ms"]),
+        ("range p95", lambda r: r["range_read"]["p95_ms"]),
+        ("range p99", lambda r: r["range_read"]["p99_ms"]),
+        ("stat p50", lambda r: r["stat"]["p50_ms"]),
+        ("stat p95", lambda r: r["stat"]["p95_ms"])
+    ]
+    rows = [[str(name) for name, _ in columns]] + [[str(get(r)) for _, get in columns] for r in results]
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    for row in rows:
+        print("  ".join(cell.rjust(width) for cell, width in zip(row, widths)))
+    print("(latencies in ms)")
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark the blob storage backends")
+    parser.add_argument("--backends", default="gridfs,local", help=f"Comma-separated, any of {','.join(STORAGE_BACKENDS)}")
+    parser.add_argument("--files", type=int, default=10, help="Files written per backend")
+    parser.add_argument("--size-mb", type=float, default=20, help="Size of each file in MB")
+    parser.add_argument("--range-kb", type=int, default=64, help="Size of each range read in KB")
+    parser.add_argument("--range-reads", type=int, default=200, help="Number of random range reads")
+    parser.add_argument("--concurrency", type=int, default=4, help="Operations in flight at once")
+    args = parser.parse_args()
+
+    results = []
+    try:
+        for name in [b.strip() for b in args.backends.split(",") if b.strip()]:
+            storage = create_storage(name)
+            try:
+                logger.info(f"Benchmarking {name}...")
+                results.append(await benchmark_backend(
+                    storage,
+                    files=args.files,
+                    size=int(args.size_mb * 1024 * 1024),
+                    range_size=args.range_kb * 1024,
+                    range_reads=args.range_reads,
+                    concurrency=args.concurrency
+                ))
+            except Exception as e:
+                logger.error(f"Benchmark of {name} failed: {e}")
+            finally:
+                await storage.close()
+    finally:
+        await close_connection()
+
+    _print_table(results)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(main())
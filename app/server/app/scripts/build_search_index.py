@@ -0,0 +1,74 @@
+"""Build the n-gram search index over the existing catalog.
+
+New and deleted books keep the index up to date; run this once to index
+the books that existed before it, and with --rebuild now and then to drop
+the postings of deleted books (searches see a partial index while a
+rebuild runs). Until a build has completed, GET /books falls back to the
+$regex search.
+
+Usage:
+    python -m app.scripts.build_search_index [--batch-size N] [--rebuild]
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from app.database import book_collection, close_connection
+from app.search.index import search_index
+
+logger = logging.getLogger(__name__)
+
+INDEXED_FIELDS = {"title": 1, "author": 1, "description": 1, "category": 1}
+
+async def build(batch_size: int, rebuild: bool) -> dict:
+    """Index every book not yet in the index, in _id order"""
+    await search_index.ensure_indexes()
+    if rebuild:
+        await search_index.clear()
+
+    indexed = 0
+    skipped = 0
+    started = time.perf_counter()
+
+    async def index_batch(books):
+        nonlocal indexed, skipped
+        known = set()
+        if not rebuild:
+            known = {
+                doc["book_id"]
+                async for doc in search_index.docs.find({"book_id": {"$in": [book["_id"] for book in books]}}, {"book_id": 1})
+            }
+        new_books = [book for book in books if book["_id"] not in known]
+        await search_index.index_books(new_books)
+        indexed += len(new_books)
+        skipped += len(known)
+        logger.info(f"Indexed {indexed} books ({indexed / (time.perf_counter() - started):.0f}/s), {skipped} already indexed")
+
+    batch = []
+    async for book in book_collection.find({}, INDEXED_FIELDS).sort("_id", 1).batch_size(batch_size):
+        batch.append(book)
+        if len(batch) >= batch_size:
+            await index_batch(batch)
+            batch = []
+    if batch:
+        await index_batch(batch)
+
+    await search_index.mark_built()
+    return {"indexed": indexed, "skipped": skipped, "seconds": round(time.perf_counter() - started, 1), **await search_index.stats()}
+
+async def main():
+    parser = argparse.ArgumentParser(description="Build the catalog search index")
+    parser.add_argument("--batch-size", type=int, default=500, help="Books indexed per round")
+    parser.add_argument("--rebuild", action="store_true", help="Empty the index and index every book again")
+    args = parser.parse_args()
+
+    try:
+        result = await build(args.batch_size, args.rebuild)
+        logger.info(f"✓ Search index built: {result}")
+    finally:
+        await close_connection()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(main())
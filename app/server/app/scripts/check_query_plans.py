@@ -0,0 +1,409 @@
+"""Check that the queries behind the API endpoints use indexes.
+
+Starts a throwaway ``mongod`` on a temporary data directory, seeds it with
+a synthetic catalog, users, libraries, reviews and reading sessions,
+creates the registered indexes (app.indexes), then calls each endpoint in
+``ENDPOINTS`` in process. Every command the endpoints send is recorded
+through pymongo command monitoring and run again with ``explain``. A query
+fails the check when its winning plan has a COLLSCAN or an in-memory SORT
+stage, when its pipeline keeps a ``$sort`` stage that was not pushed down
+into the query, or when it examines more than --max-examined-per-result
+documents per document returned. A list query reading whole ``books``
+documents (see app.utils.projections) fails as well. The exit status is 1
+if any query (or endpoint) failed, so the check can gate a CI job.
+
+Endpoints that only stream stored files are not called. A server that is
+already running can be used with --mongo-uri; its fastapi_jwt_db database
+must be empty and is dropped afterwards.
+
+Usage:
+    python -m app.scripts.check_query_plans [--mongod PATH] [--mongo-uri URI]
+        [--books N] [--readers N] [--max-examined-per-result N] [--verbose]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, List, Optional, Tuple
+from urllib.parse import urlencode
+
+from bson import json_util
+from pymongo import MongoClient, monitoring
+
+from app.utils.projections import unprojected_query
+
+logger = logging.getLogger(__name__)
+
+READER = "plan_reader"
+CREATOR = "plan_creator"
+ADMIN = "plan_admin"
+
+# (method, path, query parameters or JSON body, user). Paths and values are
+# formatted with the ids of the seeded data.
+ENDPOINTS: List[Tuple[str, str, dict, str]] = [
+    ("GET", "/books/", {"limit": 20}, READER),
+    ("GET", "/books/", {"after": "{next_cursor}"}, READER),
+    ("GET", "/books/", {"skip": 40}, READER),
+    ("GET", "/books/", {"sort_by": "rating"}, READER),
+    ("GET", "/books/", {"sort_by": "title", "sort_order": 1}, READER),
+    ("GET", "/books/", {"category": "{category}", "sort_by": "author", "sort_order": 1}, READER),
+    ("GET", "/books/", {"facets": "true"}, READER),
+    ("GET", "/books/", {"search": "ความรัก", "facets": "true"}, READER),
+    ("GET", "/books/suggest", {"q": "ความ"}, READER),
+    ("GET", "/books/{book_id}", {}, READER),
+    ("GET", "/books/batch", {"ids": "{book_id}"}, READER),
+    ("GET", "/books/{book_id}/reviews", {}, READER),
+    ("GET", "/books/user/reviews", {}, READER),
+    ("PATCH", "/books/reading/progress", {"book_id": "{book_id}", "page": 3}, READER),
+    ("GET", "/books/reading/in-progress", {}, READER),
+    ("GET", "/books/reading/completed", {}, READER),
+    ("GET", "/books/recommend/personalized", {}, READER),
+    ("GET", "/books/recommend/category/{category}", {}, READER),
+    ("GET", "/books/stats/reading", {}, READER),
+    ("GET", "/books/stats/storage", {}, ADMIN),
+    ("GET", "/users/me", {}, READER),
+    ("GET", "/users/me/library", {}, READER),
+    ("GET", "/users/me/library/check/{book_id}", {}, READER),
+    ("GET", "/users/me/stats", {}, READER),
+    ("POST", "/users/me/reading", {"book_id": "{book_id}"}, READER),
+    ("GET", "/users/me/reading/history", {}, READER),
+    ("GET", "/users/me/profile", {}, READER),
+    ("GET", "/users/profile/{creator}", {}, READER),
+    ("GET", "/creator/stats", {}, CREATOR),
+    ("GET", "/creator/sales/history", {}, CREATOR),
+    ("GET", "/creator/books", {}, CREATOR),
+    ("GET", "/creator/profile/{creator}", {}, READER),
+]
+
+# Commands explain accepts; inserts have no plan
+EXPLAINABLE = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+
+# Collections list queries must read with a projection
+PROJECTED_COLLECTIONS = {"books"}
+
+# Fields the driver adds to a command that explain rejects in the inner command
+DRIVER_FIELDS = {
+    "lsid", "$db", "$clusterTime", "$readPreference", "txnNumber", "autocommit", "startTransaction",
+    "apiVersion", "apiStrict", "apiDeprecationErrors", "readConcern", "writeConcern"
+}
+
+class CommandRecorder(monitoring.CommandListener):
+    """Keep the explainable commands, and the unprojected list queries, sent while an endpoint is called"""
+
+    def __init__(self):
+        self.endpoint: Optional[str] = None
+        self.commands: List[Tuple[str, str, dict]] = []
+        self.unprojected: List[Tuple[str, str, str, Any]] = []
+
+    def started(self, event):
+        if self.endpoint is None or event.command_name not in EXPLAINABLE:
+            return
+        command = {key: value for key, value in event.command.items() if key not in DRIVER_FIELDS}
+        self.commands.append((self.endpoint, event.command_name, command))
+        unprojected = unprojected_query(event.command_name, command)
+        if unprojected and unprojected[0] in PROJECTED_COLLECTIONS:
+            self.unprojected.append((self.endpoint, event.command_name, *unprojected))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+# ============ PLAN ANALYSIS ============
+
+def _collect(node, stages: List[str], stats: List[dict], in_plan: bool = False, in_pipeline: bool = False):
+    """Stage names of the winning plans and pipelines, and the executionStats blocks of an explain.
+    
+    Aggregation stages that were not pushed down into the query are the
+    entries of the explain's ``stages`` list, named by their "$" key.
+    """
+    if isinstance(node, list):
+        for item in node:
+            _collect(item, stages, stats, in_plan, in_pipeline)
+        return
+    if not isinstance(node, dict):
+        return
+    if in_plan and isinstance(node.get("stage"), str):
+        stages.append(node["stage"])
+    if in_pipeline:
+        stages.extend(key for key in node if key.startswith("$"))
+    for key, value in node.items():
+        if key in ("rejectedPlans", "allPlansExecution", "executionStages"):
+            continue
+        if key == "executionStats" and isinstance(value, dict):
+            stats.append(value)
+        _collect(value, stages, stats, in_plan or key == "winningPlan", key == "stages" and isinstance(value, list))
+
+def plan_problems(explain: dict, max_examined_per_result: int) -> Tuple[List[str], List[str], int, int]:
+    """Problems of one explained command, with its stages and examined/returned counts"""
+    stages: List[str] = []
+    stats: List[dict] = []
+    _collect(explain, stages, stats)
+    examined = sum(s.get("totalDocsExamined", 0) for s in stats)
+    returned = sum(s.get("nReturned", 0) for s in stats)
+
+    problems = []
+    if "COLLSCAN" in stages:
+        problems.append("collection scan")
+    if "SORT" in stages:
+        problems.append("in-memory sort")
+    if "$sort" in stages:
+        problems.append("in-memory $sort stage")
+    if examined > max_examined_per_result * max(returned, 1):
+        problems.append(f"examined {examined} documents for {returned} results")
+    return problems, stages, examined, returned
+
+# ============ THROWAWAY SERVER ============
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_mongod(mongod: str) -> Tuple[subprocess.Popen, str, str]:
+    """Start mongod on a temporary data directory; returns the process, URI and directory"""
+    dbpath = tempfile.mkdtemp(prefix="san-query-plans-")
+    port = _free_port()
+    process = subprocess.Popen(
+        [mongod, "--dbpath", dbpath, "--port", str(port), "--bind_ip", "127.0.0.1", "--quiet"],
+        stdout=subprocess.DEVNULL
+    )
+    uri = f"mongodb://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            MongoClient(uri, serverSelectionTimeoutMS=1000).admin.command("ping")
+            return process, uri, dbpath
+        except Exception:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                shutil.rmtree(dbpath, ignore_errors=True)
+                raise RuntimeError(f"mongod did not start (exit code {process.poll()})")
+            time.sleep(0.5)
+
+def stop_mongod(process: subprocess.Popen, dbpath: str):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+    shutil.rmtree(dbpath, ignore_errors=True)
+
+# ============ SEED DATA ============
+
+async def seed(books: int, readers: int) -> dict:
+    """Insert the synthetic data and build every index; returns the ids ENDPOINTS use"""
+    from bson import ObjectId
+
+    from app.database import book_collection, database, user_collection
+    from app.indexes import INDEXES, ensure_collection_indexes
+    from app.routers.book import get_reading_collection
+    from app.scripts.benchmark_search import synthetic_book
+    from app.scripts.build_search_index import build
+    from app.search.suggest import suggest_index
+    from app.storage.stats import reconcile_stats
+    from app.storage.store import storage
+
+    rng = random.Random(7)
+    now = datetime.utcnow()
+    catalog = [synthetic_book(rng, now - timedelta(minutes=n)) for n in range(books)]
+    for number, book in enumerate(catalog):
+        if number % 10 == 0:
+            book["author"] = CREATOR
+        book["reviews"] = []
+
+    usernames = [READER, CREATOR, ADMIN] + [f"plan_user_{n}" for n in range(readers)]
+    users, sessions = [], []
+    for username in usernames:
+        owned = rng.sample(catalog, 5)
+        for book in owned[:2]:
+            book["reviews"].append({
+                "review_id": str(ObjectId()),
+                "user_id": username,
+                "username": username,
+                "rating": rng.randint(1, 5),
+                "review_text": "synthetic review",
+                "created_at": now,
+                "updated_at": now
+            })
+        user = {
+            "_id": ObjectId(),
+            "username": username,
+            "email": f"{username}@example.com",
+            "hashed_password": "",
+            "role": {CREATOR: "creator", ADMIN: "admin"}.get(username, "reader"),
+            "points": 0,
+            "library": [
+                {
+                    "book_id": str(book["_id"]),
+                    "title": book["title"],
+                    "author": book["author"],
+                    "price_paid": book["price"],
+                    "purchase_date": now - timedelta(days=rng.randint(0, 150)),
+                    "has_pdf": False,
+                    "has_cover": False
+                }
+                for book in owned
+            ],
+            "following": [CREATOR] if rng.random() < 0.5 else [],
+            "reading_history": [
+                {"book_id": str(book["_id"]), "title": book["title"], "category": book["category"],
+                 "last_read": now, "read_count": 1}
+                for book in owned[:3]
+            ],
+            "created_at": now
+        }
+        users.append(user)
+        sessions.extend(
+            {
+                "user_id": user["_id"],
+                "book_id": book["_id"],
+                "status": rng.choice(["reading", "completed"]),
+                "current_page": rng.randint(1, 200),
+                "started_at": now - timedelta(days=40),
+                "last_read": now - timedelta(days=rng.randint(0, 60))
+            }
+            for book in owned
+        )
+    for book in catalog:
+        book["rating"] = round(sum(r["rating"] for r in book["reviews"]) / len(book["reviews"]), 1) if book["reviews"] else 0
+        book["review_count"] = len(book["reviews"])
+
+    await book_collection.insert_many(catalog)
+    await user_collection.insert_many(users)
+    await (await get_reading_collection()).insert_many(sessions)
+
+    for collection_name in dict.fromkeys(spec.collection for spec in INDEXES):
+        await ensure_collection_indexes(database.get_collection(collection_name))
+    await reconcile_stats(storage, [])
+    await build(1000, rebuild=False)
+    await suggest_index.load()
+
+    reader = users[0]
+    book_id = reader["library"][0]["book_id"]
+    return {
+        "book_id": book_id,
+        "category": next(book["category"] for book in catalog if str(book["_id"]) == book_id),
+        "creator": CREATOR
+    }
+
+# ============ CHECK ============
+
+def _format(value, context: dict):
+    return value.format(**context) if isinstance(value, str) else value
+
+async def check(recorder: CommandRecorder, context: dict, max_examined_per_result: int, verbose: bool) -> int:
+    """Call every endpoint, explain its commands and print the report; returns the failures"""
+    import httpx
+
+    from app.auth.jwt_handler import create_access_token
+    from app.database import database
+    from app.main import app
+
+    failures = 0
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://query-plans") as http:
+        for method, path, values, username in ENDPOINTS:
+            values = {key: _format(value, context) for key, value in values.items()}
+            label = f"{method} {path}" + (f"?{urlencode(values)}" if method == "GET" and values else "")
+            headers = {"Authorization": f"Bearer {create_access_token({'sub': username})}"}
+            url = path.format(**context)
+
+            recorder.endpoint = label
+            try:
+                if method == "GET":
+                    response = await http.get(url, params=values, headers=headers)
+                else:
+                    response = await http.request(method, url, json=values, headers=headers)
+            finally:
+                recorder.endpoint = None
+            context.setdefault("next_cursor", response.headers.get("X-Next-Cursor", ""))
+            if response.status_code >= 400:
+                failures += 1
+                print(f"FAIL  {label}: HTTP {response.status_code} {response.text[:200]}")
+
+    for label, command_name, collection, query in recorder.unprojected:
+        failures += 1
+        print(f"FAIL  {label}: {command_name} {collection} reads whole documents - {json_util.dumps(query)[:200]}")
+
+    for label, command_name, command in recorder.commands:
+        collection = command.get(command_name)
+        explain = await database.command({"explain": command, "verbosity": "executionStats"})
+        problems, stages, examined, returned = plan_problems(explain, max_examined_per_result)
+        if problems:
+            failures += 1
+        if problems or verbose:
+            status = "FAIL" if problems else "ok"
+            print(
+                f"{status:<5} {label}: {command_name} {collection} "
+                f"[{' > '.join(dict.fromkeys(stages))}] examined {examined}, returned {returned}"
+                + (f" - {', '.join(problems)}" if problems else "")
+            )
+
+    print(f"{len(recorder.commands)} queries of {len(ENDPOINTS)} endpoint calls checked, {failures} failed")
+    return failures
+
+async def run(args) -> int:
+    recorder = CommandRecorder()
+    # Registered before app.database creates its client, so the client reports to it
+    monitoring.register(recorder)
+
+    from app.database import client, close_connection, database
+
+    try:
+        if await database.list_collection_names():
+            raise RuntimeError(f"Database {database.name} is not empty; use a throwaway server")
+        logger.info(f"Seeding {args.books} books and {args.readers} users...")
+        context = await seed(args.books, args.readers)
+        failures = await check(recorder, context, args.max_examined_per_result, args.verbose)
+        return 1 if failures else 0
+    finally:
+        await client.drop_database(database.name)
+        await close_connection()
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Fail when an endpoint query scans a collection, sorts in memory or reads unprojected books"
+    )
+    parser.add_argument("--mongod", default="mongod", help="mongod binary to start a throwaway server with")
+    parser.add_argument("--mongo-uri", help="Use this (empty, throwaway) server instead of starting mongod")
+    parser.add_argument("--books", type=int, default=5000, help="Synthetic books seeded")
+    parser.add_argument("--readers", type=int, default=200, help="Synthetic users seeded")
+    parser.add_argument("--max-examined-per-result", type=int, default=10, help="Documents a query may examine per result")
+    parser.add_argument("--verbose", action="store_true", help="Also print the queries that passed")
+    args = parser.parse_args()
+
+    process = None
+    if args.mongo_uri:
+        uri = args.mongo_uri
+    else:
+        process, uri, dbpath = start_mongod(args.mongod)
+
+    # Read by app.config when the application modules are first imported
+    os.environ["MONGO_URI"] = uri
+    os.environ["MONGO_TLS"] = "false"
+    os.environ["QUERY_CACHE_TTL_SECONDS"] = "0"
+    # Unprojected queries fail the check (CommandRecorder) instead of being logged
+    os.environ["WARN_UNPROJECTED_QUERIES"] = "false"
+    os.environ.setdefault("SECRET_KEY", "query-plan-check")
+    os.environ.setdefault("ALGORITHM", "HS256")
+    os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "60")
+
+    try:
+        return await run(args)
+    finally:
+        if process is not None:
+            stop_mongod(process, dbpath)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    sys.exit(asyncio.run(main()))
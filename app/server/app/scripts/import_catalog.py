@@ -0,0 +1,308 @@
+"""Import a publisher catalog from a manifest and a directory of files.
+
+The manifest is CSV (with a header row) or NDJSON, one book per row::
+
+    title,author,rating,description,category,price,pdf,cover
+    "เรื่องสั้น",Publisher,4.5,"...",นิยาย,120,books/001.pdf,covers/001.jpg
+
+``pdf`` and ``cover`` are paths relative to --files-dir and may be empty; an
+optional ``id`` column names the row in the checkpoint (the pdf path, or the
+row number, is used otherwise). Each row goes through the same steps as an
+upload (cover variants, linearization, page split), `--concurrency` rows at
+a time, and the books are inserted with ``insert_many`` in batches.
+
+Rows whose books were inserted are appended to the checkpoint file, so a
+run that stopped can be started again and skips them. Failed rows are
+logged with their error and written to the failures file to be fixed and
+re-run.
+
+Usage:
+    python -m app.scripts.import_catalog MANIFEST --files-dir DIR \\
+        [--uploader NAME] [--concurrency N] [--batch-size N] \\
+        [--checkpoint PATH] [--failures PATH] [--limit N]
+"""
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import mimetypes
+import os
+import shutil
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Iterator, List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+from pymongo.errors import BulkWriteError
+
+from app.catalog import AVAILABLE_CATEGORIES, MAX_UPLOAD_SIZES, validate_cover_filename
+from app.config import PDF_LINEARIZE_ON_UPLOAD
+from app.database import book_collection, close_connection
+from app.ingest.pipeline import store_local_file
+from app.media.covers import generate_cover_variants
+from app.media.pdf_linearize import linearize_file
+from app.media.pdf_pages import generate_pdf_pages
+from app.search.index import update_search_index
+from app.storage.blobs import release_blob
+from app.storage.stats import book_counts, record_book_change
+from app.storage.store import storage
+from app.utils.blob_stream import COVER_BUCKET, PDF_BUCKET
+from app.utils.process_pool import shutdown_process_pool
+
+logger = logging.getLogger(__name__)
+
+def read_manifest(path: str) -> Iterator[Tuple[int, dict]]:
+    """Yield (row number, row) from a CSV or NDJSON manifest"""
+    with open(path, encoding="utf-8-sig", newline="") as fh:
+        if path.lower().endswith((".ndjson", ".jsonl", ".json")):
+            for number, line in enumerate(fh, start=1):
+                if line.strip():
+                    yield number, json.loads(line)
+        else:
+            for number, row in enumerate(csv.DictReader(fh), start=2):
+                yield number, row
+
+def row_key(number: int, row: dict) -> str:
+    return str(row.get("id") or row.get("pdf") or f"row-{number}")
+
+def load_checkpoint(path: str) -> Set[str]:
+    """Keys of rows imported by earlier runs"""
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as fh:
+        return {json.loads(line)["key"] for line in fh if line.strip()}
+
+def resolve_file(files_dir: str, relative: Optional[str], file_type: str) -> Optional[str]:
+    """Absolute path of a manifest file, checked against the upload limits"""
+    if not relative:
+        return None
+    path = os.path.join(files_dir, relative)
+    if not os.path.isfile(path):
+        raise ValueError(f"{file_type} file not found: {relative}")
+    if os.path.getsize(path) > MAX_UPLOAD_SIZES[file_type]:
+        raise ValueError(f"{file_type} file too large: {relative}")
+    return path
+
+def book_from_row(row: dict, uploader: str) -> dict:
+    """Validate the metadata of a row into a book document"""
+    title = (row.get("title") or "").strip()
+    if not title:
+        raise ValueError("title is required")
+    category = row.get("category") or "อื่นๆ"
+    if category not in AVAILABLE_CATEGORIES:
+        raise ValueError(f"invalid category '{category}'")
+    return {
+        "title": title,
+        "author": row.get("author") or uploader,
+        "rating": float(row.get("rating") or 0),
+        "description": row.get("description") or "",
+        "category": category,
+        "price": int(row.get("price") or 0),
+        "created_at": datetime.utcnow(),
+        "uploader": uploader,
+        "status": "ready"
+    }
+
+def file_entry(path: str, default_type: str) -> dict:
+    filename = os.path.basename(path)
+    return {"filename": filename, "content_type": mimetypes.guess_type(filename)[0] or default_type}
+
+async def import_row(row: dict, files_dir: str, uploader: str) -> Tuple[dict, int]:
+    """Store the files of one row; returns its book document and bytes read"""
+    book = book_from_row(row, uploader)
+    cover_path = resolve_file(files_dir, row.get("cover"), "cover")
+    pdf_path = resolve_file(files_dir, row.get("pdf"), "pdf")
+    if cover_path:
+        validate_cover_filename(cover_path)
+    if pdf_path and not pdf_path.lower().endswith(".pdf"):
+        raise ValueError("Only PDF files are allowed")
+
+    bytes_read = 0
+    stored: List[Tuple[str, object]] = []
+    work_dir = tempfile.mkdtemp(prefix="san-import-")
+    try:
+        if cover_path:
+            cover_id, _ = await store_local_file(file_entry(cover_path, "image/jpeg"), COVER_BUCKET, "cover", cover_path)
+            stored.append((COVER_BUCKET, cover_id))
+            bytes_read += os.path.getsize(cover_path)
+            await generate_cover_variants(cover_id)
+            book["cover_id"] = cover_id
+
+        if pdf_path:
+            path, metadata = pdf_path, {}
+            if PDF_LINEARIZE_ON_UPLOAD:
+                path, metadata["linearized"] = await linearize_file(pdf_path, work_dir)
+            pdf_id, file_size = await store_local_file(file_entry(pdf_path, "application/pdf"), PDF_BUCKET, "pdf", path, metadata)
+            stored.append((PDF_BUCKET, pdf_id))
+            bytes_read += os.path.getsize(pdf_path)
+            book["pdf_id"] = pdf_id
+            book["file_size"] = file_size
+            book["page_count"] = await generate_pdf_pages(pdf_id)
+    except Exception:
+        for bucket_name, file_id in stored:
+            await release_blob(bucket_name, file_id)
+        raise
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return book, bytes_read
+
+async def release_book_files(book: dict):
+    if book.get("cover_id"):
+        await release_blob(COVER_BUCKET, book["cover_id"])
+    if book.get("pdf_id"):
+        await release_blob(PDF_BUCKET, book["pdf_id"])
+
+async def import_catalog(
+    manifest: str,
+    files_dir: str,
+    uploader: str,
+    concurrency: int,
+    batch_size: int,
+    checkpoint_path: str,
+    failures_path: str,
+    limit: int
+) -> dict:
+    """Import every row not in the checkpoint, `concurrency` rows at a time"""
+    done_keys = load_checkpoint(checkpoint_path)
+    semaphore = asyncio.Semaphore(concurrency)
+    flush_lock = asyncio.Lock()
+    results = Counter()
+    pending: List[Tuple[str, int, dict]] = []
+    total_bytes = 0
+    started = time.perf_counter()
+
+    checkpoint = open(checkpoint_path, "a", encoding="utf-8")
+    failures = open(failures_path, "a", encoding="utf-8")
+
+    def record_failure(key: str, number: int, error: str):
+        results["failed"] += 1
+        logger.error(f"Row {number} ({key}) failed: {error}")
+        failures.write(json.dumps({"key": key, "row": number, "error": error}, ensure_ascii=False) + "\n")
+        failures.flush()
+
+    def log_progress():
+        elapsed = time.perf_counter() - started
+        logger.info(
+            f"{sum(results.values())} rows {dict(results)}, "
+            f"{total_bytes / (1024 * 1024) / elapsed:.1f} MB/s"
+        )
+
+    async def flush():
+        """Insert the pending books and checkpoint them"""
+        async with flush_lock:
+            if not pending:
+                return
+            batch = pending[:]
+            pending.clear()
+
+            failed = {}
+            inserted = Counter()
+            categories = Counter()
+            indexed = []
+            try:
+                await book_collection.insert_many([book for _, _, book in batch], ordered=False)
+            except BulkWriteError as e:
+                failed = {error["index"]: error.get("errmsg", "insert failed") for error in e.details["writeErrors"]}
+
+            for index, (key, number, book) in enumerate(batch):
+                if index in failed:
+                    await release_book_files(book)
+                    record_failure(key, number, failed[index])
+                    continue
+                checkpoint.write(json.dumps({"key": key, "book_id": str(book["_id"])}, ensure_ascii=False) + "\n")
+                results["imported"] += 1
+                indexed.append(book)
+                counts = book_counts(book)
+                categories.update(counts.pop("categories"))
+                inserted.update(counts)
+            await record_book_change(**inserted, categories=categories)
+            await update_search_index(indexed)
+            checkpoint.flush()
+            os.fsync(checkpoint.fileno())
+
+    async def process(number: int, key: str, row: dict):
+        nonlocal total_bytes
+        async with semaphore:
+            try:
+                book, bytes_read = await import_row(row, files_dir, uploader)
+            except HTTPException as e:
+                record_failure(key, number, str(e.detail))
+                return
+            except Exception as e:
+                record_failure(key, number, f"{type(e).__name__}: {e}")
+                return
+
+            total_bytes += bytes_read
+            pending.append((key, number, book))
+            if len(pending) >= batch_size:
+                await flush()
+                log_progress()
+
+    tasks = set()
+    queued = 0
+    try:
+        for number, row in read_manifest(manifest):
+            key = row_key(number, row)
+            if key in done_keys:
+                results["skipped"] += 1
+                continue
+            if limit and queued >= limit:
+                break
+            done_keys.add(key)
+            queued += 1
+            tasks.add(asyncio.create_task(process(number, key, row)))
+            if len(tasks) >= concurrency * 4:
+                _, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        if tasks:
+            await asyncio.wait(tasks)
+    finally:
+        # Books whose files are stored are inserted even if the run is interrupted
+        await flush()
+        checkpoint.close()
+        failures.close()
+
+    elapsed = time.perf_counter() - started
+    return {
+        **dict(results),
+        "imported_mb": round(total_bytes / (1024 * 1024), 2),
+        "mb_per_second": round(total_bytes / (1024 * 1024) / elapsed, 2) if elapsed else 0.0,
+        "seconds": round(elapsed, 1)
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description="Import books from a CSV or NDJSON manifest")
+    parser.add_argument("manifest", help="CSV (with header) or NDJSON manifest")
+    parser.add_argument("--files-dir", default=None, help="Directory the pdf/cover paths are relative to (default: manifest directory)")
+    parser.add_argument("--uploader", default="admin", help="Username recorded as uploader (and author when the row has none)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Rows processed at once")
+    parser.add_argument("--batch-size", type=int, default=50, help="Books per insert_many")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file (default: MANIFEST.checkpoint)")
+    parser.add_argument("--failures", default=None, help="Failed rows are appended here (default: MANIFEST.failures)")
+    parser.add_argument("--limit", type=int, default=0, help="Stop after N new rows (0 = all)")
+    args = parser.parse_args()
+
+    try:
+        await storage.ensure_ready()
+        result = await import_catalog(
+            args.manifest,
+            args.files_dir or os.path.dirname(os.path.abspath(args.manifest)),
+            args.uploader,
+            args.concurrency,
+            args.batch_size,
+            args.checkpoint or f"{args.manifest}.checkpoint",
+            args.failures or f"{args.manifest}.failures",
+            args.limit
+        )
+        logger.info(f"✓ Import completed: {result}")
+    finally:
+        shutdown_process_pool()
+        await storage.close()
+        await close_connection()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(main())
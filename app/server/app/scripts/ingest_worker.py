@@ -0,0 +1,45 @@
+"""Run ingestion workers in their own process.
+
+Useful to process uploads on dedicated machines; set INGEST_WORKERS=0 on the
+API servers so they only enqueue jobs.
+
+Usage:
+    python -m app.scripts.ingest_worker [--workers N]
+"""
+import argparse
+import asyncio
+import logging
+
+from app.config import INGEST_POLL_SECONDS
+from app.database import close_connection, derivative_collection
+from app.indexes import ensure_collection_indexes
+from app.ingest.worker import IngestWorkerPool
+from app.storage.store import storage
+from app.utils.process_pool import shutdown_process_pool
+
+logger = logging.getLogger(__name__)
+
+async def main():
+    parser = argparse.ArgumentParser(description="Process uploaded books from the ingestion queue")
+    parser.add_argument("--workers", type=int, default=4, help="Jobs processed at once")
+    args = parser.parse_args()
+
+    pool = IngestWorkerPool(args.workers, INGEST_POLL_SECONDS)
+    try:
+        await storage.ensure_ready()
+        # Page splits are claimed under a unique index; it must exist before workers split
+        await ensure_collection_indexes(derivative_collection)
+        pool.start()
+        await asyncio.Event().wait()
+    finally:
+        await pool.stop()
+        shutdown_process_pool()
+        await storage.close()
+        await close_connection()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logger.info("✓ Ingestion worker stopped")
@@ -0,0 +1,71 @@
+"""Linearize PDFs that were stored before linearization ran at ingest.
+
+Processes the pdfs bucket in batches of files whose metadata has no
+``linearized`` flag yet, so an interrupted run simply continues where it
+stopped when started again.
+
+Usage:
+    python -m app.scripts.linearize_catalog [--batch-size N] [--concurrency N] [--limit N]
+"""
+import argparse
+import asyncio
+import logging
+from collections import Counter
+
+from app.database import close_connection
+from app.media.pdf_linearize import relinearize_stored_pdf
+from app.storage.store import storage
+from app.utils.blob_stream import PDF_BUCKET
+from app.utils.process_pool import shutdown_process_pool
+
+logger = logging.getLogger(__name__)
+
+async def linearize_catalog(batch_size: int, concurrency: int, limit: int) -> dict:
+    """Re-process every unflagged PDF, `concurrency` files at a time"""
+    semaphore = asyncio.Semaphore(concurrency)
+    results = Counter()
+    skipped = set()
+
+    async def process(file_id):
+        async with semaphore:
+            try:
+                outcome = await relinearize_stored_pdf(file_id)
+            except Exception as e:
+                logger.error(f"PDF {file_id} failed: {e}")
+                outcome = "error"
+                skipped.add(file_id)
+            results[outcome] += 1
+
+    while not limit or sum(results.values()) < limit:
+        size = min(batch_size, limit - sum(results.values())) if limit else batch_size
+        batch = await storage.find_files(
+            PDF_BUCKET,
+            {"metadata.linearized": {"$exists": False}, "_id": {"$nin": list(skipped)}},
+            {"_id": 1}
+        ).sort("_id", 1).limit(size).to_list(length=size)
+        if not batch:
+            break
+
+        await asyncio.gather(*(process(doc["_id"]) for doc in batch))
+        logger.info(f"Processed {sum(results.values())} PDFs: {dict(results)}")
+
+    return dict(results)
+
+async def main():
+    parser = argparse.ArgumentParser(description="Linearize stored PDFs for fast web view")
+    parser.add_argument("--batch-size", type=int, default=20, help="PDFs fetched per batch")
+    parser.add_argument("--concurrency", type=int, default=2, help="PDFs processed at once")
+    parser.add_argument("--limit", type=int, default=0, help="Stop after N PDFs (0 = all)")
+    args = parser.parse_args()
+
+    try:
+        result = await linearize_catalog(args.batch_size, args.concurrency, args.limit)
+        logger.info(f"✓ Linearization completed: {result}")
+    finally:
+        shutdown_process_pool()
+        await storage.close()
+        await close_connection()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(main())
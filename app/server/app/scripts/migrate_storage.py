@@ -0,0 +1,150 @@
+"""Copy stored blobs from one storage backend to another.
+
+Files keep their ids, names, metadata and upload dates, so books, the blob
+registry, derivatives and the disk cache stay valid; once a run reports no
+failures, switch STORAGE_BACKEND to the target and restart. Files already
+present in the target with the same length are skipped, so an interrupted
+run can simply be started again. Each copy is checked against the SHA-256
+digest recorded at upload when there is one.
+
+Usage:
+    python -m app.scripts.migrate_storage --source gridfs --target s3 \\
+        [--buckets pdfs,covers,pages] [--concurrency N] [--limit N] [--delete-source]
+"""
+import argparse
+import asyncio
+import hashlib
+import logging
+import time
+from collections import Counter
+
+from app.database import close_connection
+from app.storage.backends.base import BlobStorage
+from app.storage.store import STORAGE_BACKENDS, create_storage
+from app.utils.blob_stream import PDF_BUCKET, COVER_BUCKET, PAGE_BUCKET
+
+logger = logging.getLogger(__name__)
+
+async def copy_file(source: BlobStorage, target: BlobStorage, bucket_name: str, file_doc: dict, delete_source: bool) -> str:
+    """Copy one file; returns "copied" or "skipped" and raises on a mismatch"""
+    existing = await target.stat(bucket_name, file_doc["_id"])
+    if existing and existing["length"] == file_doc["length"]:
+        if delete_source:
+            await source.delete(bucket_name, file_doc["_id"])
+        return "skipped"
+
+    digest = hashlib.sha256()
+
+    async def pieces():
+        async for data in source.get_range(bucket_name, file_doc):
+            digest.update(data)
+            yield data
+
+    copied = await target.put_stream(
+        bucket_name,
+        pieces(),
+        file_doc.get("filename") or str(file_doc["_id"]),
+        metadata=file_doc.get("metadata") or {},
+        file_id=file_doc["_id"],
+        upload_date=file_doc.get("uploadDate")
+    )
+
+    expected = (file_doc.get("metadata") or {}).get("sha256")
+    if copied["length"] != file_doc["length"] or (expected and digest.hexdigest() != expected):
+        await target.delete(bucket_name, file_doc["_id"])
+        raise IOError(f"Copy of {bucket_name}/{file_doc['_id']} does not match the source")
+
+    if delete_source:
+        await source.delete(bucket_name, file_doc["_id"])
+    return "copied"
+
+async def migrate_bucket(
+    source: BlobStorage,
+    target: BlobStorage,
+    bucket_name: str,
+    concurrency: int,
+    limit: int,
+    delete_source: bool
+) -> dict:
+    """Copy every file of one bucket, `concurrency` files at a time"""
+    semaphore = asyncio.Semaphore(concurrency)
+    results = Counter()
+    copied_bytes = 0
+    started = time.perf_counter()
+
+    async def process(file_doc):
+        nonlocal copied_bytes
+        async with semaphore:
+            try:
+                outcome = await copy_file(source, target, bucket_name, file_doc, delete_source)
+            except Exception as e:
+                logger.error(f"{bucket_name}/{file_doc['_id']} failed: {e}")
+                outcome = "failed"
+            results[outcome] += 1
+            if outcome == "copied":
+                copied_bytes += file_doc["length"]
+            done = sum(results.values())
+            if done % 100 == 0:
+                elapsed = time.perf_counter() - started
+                logger.info(
+                    f"{bucket_name}: {done} files {dict(results)}, "
+                    f"{copied_bytes / (1024 * 1024) / elapsed:.1f} MB/s"
+                )
+
+    cursor = source.find_files(bucket_name).sort("_id", 1)
+    if limit:
+        cursor = cursor.limit(limit)
+
+    tasks = set()
+    async for file_doc in cursor:
+        tasks.add(asyncio.create_task(process(file_doc)))
+        if len(tasks) >= concurrency * 4:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    if tasks:
+        await asyncio.wait(tasks)
+
+    elapsed = time.perf_counter() - started
+    return {
+        **dict(results),
+        "copied_mb": round(copied_bytes / (1024 * 1024), 2),
+        "mb_per_second": round(copied_bytes / (1024 * 1024) / elapsed, 2) if elapsed else 0.0
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description="Copy stored blobs between storage backends")
+    parser.add_argument("--source", required=True, choices=STORAGE_BACKENDS, help="Backend to copy from")
+    parser.add_argument("--target", required=True, choices=STORAGE_BACKENDS, help="Backend to copy to")
+    parser.add_argument(
+        "--buckets",
+        default=",".join([PDF_BUCKET, COVER_BUCKET, PAGE_BUCKET]),
+        help="Comma-separated buckets to copy"
+    )
+    parser.add_argument("--concurrency", type=int, default=4, help="Files copied at once")
+    parser.add_argument("--limit", type=int, default=0, help="Stop after N files per bucket (0 = all)")
+    parser.add_argument("--delete-source", action="store_true", help="Delete each file from the source once copied")
+    args = parser.parse_args()
+
+    if args.source == args.target:
+        parser.error("--source and --target must differ")
+
+    source = create_storage(args.source)
+    target = create_storage(args.target)
+    failed = 0
+    try:
+        await target.ensure_ready()
+        for bucket_name in [b.strip() for b in args.buckets.split(",") if b.strip()]:
+            result = await migrate_bucket(source, target, bucket_name, args.concurrency, args.limit, args.delete_source)
+            failed += result.get("failed", 0)
+            logger.info(f"✓ {bucket_name} migrated from {args.source} to {args.target}: {result}")
+    finally:
+        await source.close()
+        await target.close()
+        await close_connection()
+
+    if failed:
+        logger.warning(f"⚠️  {failed} files failed; run again before switching STORAGE_BACKEND")
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(main())
@@ -0,0 +1,40 @@
+"""Recompute the storage statistics counters from scratch.
+
+The counters read by /health, /admin/storage and /books/stats/storage are
+updated on every upload and delete; run this now and then (e.g. nightly) to
+correct any drift. It scans the file documents and the books, so avoid
+running it at peak hours on a large catalog.
+
+Usage:
+    python -m app.scripts.reconcile_stats [--buckets pdfs,covers,pages,staging]
+"""
+import argparse
+import asyncio
+import logging
+
+from app.database import close_connection
+from app.storage.stats import reconcile_stats
+from app.storage.store import storage
+from app.utils.blob_stream import PDF_BUCKET, COVER_BUCKET, PAGE_BUCKET, STAGING_BUCKET
+
+logger = logging.getLogger(__name__)
+
+async def main():
+    parser = argparse.ArgumentParser(description="Recompute the storage statistics counters")
+    parser.add_argument(
+        "--buckets",
+        default=",".join([PDF_BUCKET, COVER_BUCKET, PAGE_BUCKET, STAGING_BUCKET]),
+        help="Comma-separated buckets to recount"
+    )
+    args = parser.parse_args()
+
+    try:
+        result = await reconcile_stats(storage, [name for name in args.buckets.split(",") if name])
+        logger.info(f"✓ Storage stats reconciled: {result}")
+    finally:
+        await storage.close()
+        await close_connection()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(main())
@@ -0,0 +1,341 @@
+"""Character n-gram inverted index over the book catalog, ranked with BM25.
+
+Thai is written without spaces between words, so neither ``$regex`` (which
+cannot use an index when unanchored) nor a MongoDB text index (which splits
+on spaces) can search it efficiently. Text is instead cut into runs of
+letters and digits, and every run into overlapping character bigrams; a
+query matches the books that contain all of its bigrams, which is close to
+the substring match the regex search did.
+
+Each indexed book gets a dense document number. Postings are grouped in
+blocks of ``BLOCK_SIZE`` document numbers per term, stored as parallel
+arrays so a term's blocks decode quickly::
+
+    search_postings: {"term": "นิ", "block": 12, "docs": [12290, ...],
+                      "tfs": [4.0, ...], "lens": [310.0, ...]}
+    search_docs:     {"_id": 12290, "book_id": ObjectId, "category": "นิยาย",
+                      "length": 310.0, "terms": ["นิ", "ิย", ...]}
+    search_terms:    {"_id": "นิ", "df": 5120}
+
+Term frequencies are weighted by field (``FIELD_WEIGHTS``), BM25F-style.
+Deleting a book removes its ``search_docs`` entry and lowers the document
+frequencies; its postings stay behind as tombstones that queries skip, and
+``app.scripts.build_search_index --rebuild`` compacts them away.
+"""
+import logging
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ReturnDocument, UpdateOne
+
+from app.database import search_doc_collection, search_posting_collection, search_term_collection
+from app.indexes import ensure_collection_indexes
+
+logger = logging.getLogger(__name__)
+
+NGRAM_SIZE = 2
+
+# Weight of a term occurrence in each indexed field
+FIELD_WEIGHTS = {"title": 3.0, "author": 2.0, "description": 1.0}
+
+# Longer field values are indexed up to this many characters
+MAX_FIELD_CHARS = 10000
+
+# Document numbers per postings block
+BLOCK_SIZE = 1024
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Ranked documents checked against search_docs per round trip
+VERIFY_BATCH_SIZE = 200
+
+# Matched documents counted by category per round trip
+FACET_BATCH_SIZE = 5000
+
+# Holds the corpus totals in the terms collection; never a valid n-gram
+CORPUS_ID = "__corpus__"
+
+# Runs of letters and digits; Thai vowel and tone marks are not \w
+SEGMENT_PATTERN = re.compile(r"(?:[^\W_]|[\u0e00-\u0e7f])+")
+
+def normalize(text: str) -> str:
+    return unicodedata.normalize("NFKC", text).casefold()
+
+def ngrams(text: str) -> List[str]:
+    """Overlapping character n-grams of every letter/digit run.
+
+    Runs shorter than NGRAM_SIZE carry no n-gram and are ignored.
+    """
+    grams = []
+    for segment in SEGMENT_PATTERN.findall(normalize(text)):
+        grams.extend(segment[i:i + NGRAM_SIZE] for i in range(len(segment) - NGRAM_SIZE + 1))
+    return grams
+
+def analyze(book: dict) -> Tuple[Dict[str, float], float]:
+    """Weighted term frequencies and weighted length of a book"""
+    frequencies = Counter()
+    for field, weight in FIELD_WEIGHTS.items():
+        for gram in ngrams(str(book.get(field) or "")[:MAX_FIELD_CHARS]):
+            frequencies[gram] += weight
+    return dict(frequencies), float(sum(frequencies.values()))
+
+class SearchIndex:
+    """Inverted index kept in three collections (see module docstring)"""
+
+    def __init__(
+        self,
+        posting_collection: AsyncIOMotorCollection,
+        doc_collection: AsyncIOMotorCollection,
+        term_collection: AsyncIOMotorCollection
+    ):
+        self.postings = posting_collection
+        self.docs = doc_collection
+        self.terms = term_collection
+        self._ready = False
+
+    async def ensure_indexes(self):
+        await ensure_collection_indexes(self.postings)
+        await ensure_collection_indexes(self.docs)
+
+    async def is_ready(self) -> bool:
+        """True once the catalog was indexed; until then callers fall back to $regex"""
+        if not self._ready:
+            corpus = await self.terms.find_one({"_id": CORPUS_ID}, {"built_at": 1})
+            self._ready = bool(corpus and corpus.get("built_at"))
+        return self._ready
+
+    async def mark_built(self):
+        await self.terms.update_one(
+            {"_id": CORPUS_ID},
+            {"$set": {"built_at": datetime.utcnow()}},
+            upsert=True
+        )
+        self._ready = True
+
+    # ============ UPDATES ============
+
+    async def index_books(self, books: List[dict]):
+        """Add books to the index, replacing any earlier entries for them"""
+        if not books:
+            return
+        await self.remove_books([book["_id"] for book in books])
+
+        analyzed = [(book, *analyze(book)) for book in books]
+        corpus = await self.terms.find_one_and_update(
+            {"_id": CORPUS_ID},
+            {"$inc": {
+                "next_doc": len(books),
+                "docs": len(books),
+                "length": sum(length for _, _, length in analyzed)
+            }},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        first_doc = corpus["next_doc"] - len(books)
+
+        blocks = defaultdict(lambda: {"docs": [], "tfs": [], "lens": []})
+        document_frequencies = Counter()
+        docs = []
+        for doc_number, (book, frequencies, length) in enumerate(analyzed, start=first_doc):
+            docs.append({
+                "_id": doc_number,
+                "book_id": book["_id"],
+                "category": book.get("category"),
+                "length": length,
+                "terms": list(frequencies)
+            })
+            for term, tf in frequencies.items():
+                block = blocks[(term, doc_number // BLOCK_SIZE)]
+                block["docs"].append(doc_number)
+                block["tfs"].append(tf)
+                block["lens"].append(length)
+                document_frequencies[term] += 1
+
+        if blocks:
+            await self.postings.bulk_write([
+                UpdateOne(
+                    {"term": term, "block": block_number},
+                    {"$push": {
+                        "docs": {"$each": block["docs"]},
+                        "tfs": {"$each": block["tfs"]},
+                        "lens": {"$each": block["lens"]}
+                    }},
+                    upsert=True
+                )
+                for (term, block_number), block in blocks.items()
+            ], ordered=False)
+            await self.terms.bulk_write([
+                UpdateOne({"_id": term}, {"$inc": {"df": count}}, upsert=True)
+                for term, count in document_frequencies.items()
+            ], ordered=False)
+        # Documents last: a book only becomes searchable once its postings exist
+        await self.docs.insert_many(docs)
+
+    async def index_book(self, book: dict):
+        await self.index_books([book])
+
+    async def remove_books(self, book_ids: List[ObjectId]):
+        """Drop books from the index; their postings become tombstones"""
+        removed = await self.docs.find({"book_id": {"$in": book_ids}}, {"terms": 1, "length": 1}).to_list(length=None)
+        if not removed:
+            return
+        await self.docs.delete_many({"_id": {"$in": [doc["_id"] for doc in removed]}})
+
+        document_frequencies = Counter()
+        for doc in removed:
+            document_frequencies.update(doc["terms"])
+        if document_frequencies:
+            await self.terms.bulk_write([
+                UpdateOne({"_id": term}, {"$inc": {"df": -count}})
+                for term, count in document_frequencies.items()
+            ], ordered=False)
+        await self.terms.update_one(
+            {"_id": CORPUS_ID},
+            {"$inc": {"docs": -len(removed), "length": -sum(doc["length"] for doc in removed)}}
+        )
+
+    async def remove_book(self, book_id: ObjectId):
+        await self.remove_books([book_id])
+
+    async def clear(self):
+        """Empty the index (before a rebuild)"""
+        await self.postings.delete_many({})
+        await self.docs.delete_many({})
+        await self.terms.delete_many({})
+        self._ready = False
+
+    # ============ QUERIES ============
+
+    async def search(
+        self,
+        query: str,
+        category: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 10
+    ) -> Optional[List[ObjectId]]:
+        """Ids of the best matching books, best first.
+
+        Returns None when the query has no n-gram to look up (a single
+        character), so the caller can fall back to another search.
+        """
+        ranked = await self._rank(query)
+        if ranked is None:
+            return None
+        return await self._resolve(ranked, category, skip + limit, skip)
+
+    async def search_with_facets(
+        self,
+        query: str,
+        category: Optional[str] = None,
+        skip: int = 0,
+        limit: int = 10,
+        count_limit: int = 0
+    ) -> Optional[Tuple[List[ObjectId], Dict[str, int], bool]]:
+        """Like search, plus the number of matching books per category.
+
+        With count_limit set only the best count_limit matches are counted;
+        the last element tells whether the counts stopped there.
+        """
+        ranked = await self._rank(query)
+        if ranked is None:
+            return None
+        book_ids = await self._resolve(ranked, category, skip + limit, skip)
+        estimated = bool(count_limit) and len(ranked) > count_limit
+        counted = ranked[:count_limit] if estimated else ranked
+
+        counts = Counter()
+        for start in range(0, len(counted), FACET_BATCH_SIZE):
+            async for group in self.docs.aggregate([
+                {"$match": {"_id": {"$in": counted[start:start + FACET_BATCH_SIZE]}}},
+                {"$group": {"_id": "$category", "count": {"$sum": 1}}}
+            ]):
+                counts[group["_id"] or "อื่นๆ"] += group["count"]
+        return book_ids, dict(counts), estimated
+
+    async def _rank(self, query: str) -> Optional[List[int]]:
+        """Document numbers matching every n-gram of the query, best first"""
+        query_terms = Counter(ngrams(query))
+        if not query_terms:
+            return None
+
+        stats = {
+            doc["_id"]: doc
+            for doc in await self.terms.find({"_id": {"$in": list(query_terms) + [CORPUS_ID]}}).to_list(length=None)
+        }
+        corpus = stats.get(CORPUS_ID) or {}
+        total_docs = corpus.get("docs", 0)
+        if total_docs <= 0 or any(stats.get(term, {}).get("df", 0) <= 0 for term in query_terms):
+            return []
+        average_length = corpus["length"] / total_docs
+
+        def weight(term: str, tf: float, length: float) -> float:
+            df = stats[term]["df"]
+            idf = math.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+            return query_terms[term] * idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        # Rarest term first: its postings bound the candidates, the other
+        # terms only need the blocks those candidates live in
+        scores: Optional[Dict[int, float]] = None
+        for term in sorted(query_terms, key=lambda t: stats[t]["df"]):
+            block_filter = {"term": term}
+            if scores is not None:
+                block_filter["block"] = {"$in": sorted({doc // BLOCK_SIZE for doc in scores})}
+
+            matched = {}
+            async for block in self.postings.find(block_filter, {"docs": 1, "tfs": 1, "lens": 1}):
+                for doc, tf, length in zip(block["docs"], block["tfs"], block["lens"]):
+                    if scores is None or doc in scores:
+                        matched[doc] = (scores or {}).get(doc, 0.0) + weight(term, tf, length)
+            scores = matched
+            if not scores:
+                return []
+
+        return sorted(scores, key=lambda doc: (-scores[doc], -doc))
+
+    async def _resolve(self, ranked: List[int], category: Optional[str], wanted: int, skip: int) -> List[ObjectId]:
+        """Map ranked document numbers to live books, applying the category filter"""
+        book_ids = []
+        for start in range(0, len(ranked), VERIFY_BATCH_SIZE):
+            batch = ranked[start:start + VERIFY_BATCH_SIZE]
+            doc_filter = {"_id": {"$in": batch}}
+            if category:
+                doc_filter["category"] = category
+            live = {doc["_id"]: doc["book_id"] async for doc in self.docs.find(doc_filter, {"book_id": 1})}
+            book_ids.extend(live[doc] for doc in batch if doc in live)
+            if len(book_ids) >= wanted:
+                break
+        return book_ids[skip:wanted]
+
+    async def stats(self) -> dict:
+        corpus = await self.terms.find_one({"_id": CORPUS_ID}) or {}
+        return {
+            "documents": corpus.get("docs", 0),
+            "average_length": round(corpus["length"] / corpus["docs"], 1) if corpus.get("docs") else 0.0,
+            "built_at": corpus.get("built_at"),
+            "ready": bool(corpus.get("built_at"))
+        }
+
+search_index = SearchIndex(search_posting_collection, search_doc_collection, search_term_collection)
+
+async def update_search_index(books: Iterable[dict]):
+    """Index new books without failing the write that created them"""
+    try:
+        await search_index.index_books(list(books))
+    except Exception as e:
+        # A rebuild picks the books up again
+        logger.warning(f"Could not update the search index: {e}")
+
+async def remove_from_search_index(book_ids: Iterable[ObjectId]):
+    try:
+        await search_index.remove_books(list(book_ids))
+    except Exception as e:
+        logger.warning(f"Could not update the search index: {e}")
@@ -0,0 +1,303 @@
+"""In-memory typeahead over book titles and author names.
+
+Every title and author is normalized like the search index (NFKC,
+casefold, collapsed spaces) and registered under one key per word start,
+each key running to the end of the text, so "harry pot" and "pot" both
+reach "Harry Potter". Thai titles written without spaces are matched from
+their start. Keys live in one sorted list of ``(key, field, book_id)``;
+a prefix is a ``bisect`` range and suggestions are the best ranked books
+in it (rating, then number of reviews).
+
+Prefixes matching more than SCAN_LIMIT keys (one or two letters) keep
+their ranked result: new and better rated books are merged into it, and
+it is only ranked again when one of its books is deleted or rated lower. The list is loaded
+once at startup and then kept current by the book writes of this process.
+Writes of other processes (other workers, the ingest worker, the import
+script) arrive late: books they insert are picked up every
+SUGGEST_REFRESH_SECONDS, and books they delete or rate differently every
+SUGGEST_RECONCILE_SECONDS, when the ids and ratings of the catalog are
+compared with the list. Until then a book deleted elsewhere can still be
+suggested. No request touches MongoDB once loaded.
+"""
+import asyncio
+import heapq
+import logging
+import sys
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from app.config import SUGGEST_RECONCILE_SECONDS, SUGGEST_REFRESH_SECONDS
+from app.database import book_collection
+from app.search.index import SEGMENT_PATTERN, normalize
+
+logger = logging.getLogger(__name__)
+
+SUGGEST_FIELDS = ("title", "author")
+
+# Keys are cut to this many characters; longer queries are matched on it
+MAX_KEY_CHARS = 40
+
+# Ranges with more keys than this are ranked once and the result kept
+SCAN_LIMIT = 500
+
+# Suggestions kept per broad prefix, and how many broad prefixes are kept
+MAX_SUGGESTIONS = 20
+BROAD_PREFIX_CACHE_SIZE = 512
+
+# Books inserted slightly out of _id order by other processes are still seen
+REFRESH_OVERLAP = timedelta(minutes=2)
+
+SUMMARY_STAGE = {"$project": {
+    "title": 1,
+    "author": 1,
+    "rating": 1,
+    "review_count": {"$size": {"$ifNull": ["$reviews", []]}}
+}}
+
+# What reconcile compares: ids and ranking only
+RATING_STAGE = {"$project": {
+    "rating": 1,
+    "review_count": {"$size": {"$ifNull": ["$reviews", []]}}
+}}
+
+def normalize_prefix(text: str) -> str:
+    return " ".join(normalize(text).split())[:MAX_KEY_CHARS]
+
+def text_keys(text: Optional[str]) -> List[str]:
+    """One key per word start, each running to the end of the text"""
+    normalized = " ".join(normalize(text or "").split())
+    keys = {normalized[m.start():][:MAX_KEY_CHARS] for m in SEGMENT_PATTERN.finditer(normalized)}
+    return sorted(keys)
+
+class SuggestIndex:
+    """Sorted prefix keys of the catalog (see module docstring)"""
+
+    def __init__(self, collection: AsyncIOMotorCollection, refresh_seconds: float, reconcile_seconds: float):
+        self.collection = collection
+        self.refresh_seconds = refresh_seconds
+        self.reconcile_seconds = reconcile_seconds
+        self._keys: List[Tuple[str, str, ObjectId]] = []
+        self._books: Dict[ObjectId, dict] = {}
+        self._broad: "OrderedDict[str, List[Tuple[ObjectId, str]]]" = OrderedDict()
+        self._task: Optional[asyncio.Task] = None
+        self._removed_while_loading = set()
+        self.ready = False
+        self.loaded_at_id: Optional[ObjectId] = None
+
+    # ============ UPDATES ============
+
+    def _entry_keys(self, entry: dict) -> List[Tuple[str, str, ObjectId]]:
+        return [(key, field, entry["_id"]) for field in SUGGEST_FIELDS for key in text_keys(entry.get(field))]
+
+    def _score(self, book_id: ObjectId) -> Tuple[float, int]:
+        entry = self._books[book_id]
+        return entry["rating"], entry["review_count"]
+
+    def _merge_broad(self, entry: dict, keys: List[Tuple[str, str, ObjectId]]):
+        """Slot a new or better ranked book into the kept results it belongs to"""
+        book_id = entry["_id"]
+        for prefix, ranked in self._broad.items():
+            fields = {field for key, field, _ in keys if key.startswith(prefix)}
+            if not fields:
+                continue
+            ranked = [item for item in ranked if item[0] != book_id]
+            ranked.append((book_id, "title" if "title" in fields else "author"))
+            ranked.sort(key=lambda item: self._score(item[0]), reverse=True)
+            self._broad[prefix] = ranked[:MAX_SUGGESTIONS]
+
+    def _drop_broad(self, book_id: ObjectId):
+        """Forget kept results a book leaves a gap in; they are ranked again when asked"""
+        for prefix in [p for p, ranked in self._broad.items() if any(item[0] == book_id for item in ranked)]:
+            del self._broad[prefix]
+
+    def add(self, book: dict, review_count: int = 0):
+        """Register a new book, or re-register a changed one"""
+        self._removed_while_loading.discard(book["_id"])
+        self._discard(book["_id"])
+        entry = {
+            "_id": book["_id"],
+            "title": book.get("title") or "",
+            "author": book.get("author") or "",
+            "rating": float(book.get("rating") or 0),
+            "review_count": book.get("review_count", review_count)
+        }
+        self._books[entry["_id"]] = entry
+        keys = self._entry_keys(entry)
+        for key in keys:
+            insort(self._keys, key)
+        self._merge_broad(entry, keys)
+
+    def remove(self, book_id: ObjectId):
+        if not self.ready:
+            self._removed_while_loading.add(book_id)
+        self._discard(book_id)
+
+    def _discard(self, book_id: ObjectId):
+        entry = self._books.pop(book_id, None)
+        if entry is None:
+            return
+        keys = self._entry_keys(entry)
+        for key in keys:
+            position = bisect_left(self._keys, key)
+            if position < len(self._keys) and self._keys[position] == key:
+                del self._keys[position]
+        self._drop_broad(book_id)
+
+    def update_rating(self, book_id: ObjectId, rating: float, review_count: int):
+        entry = self._books.get(book_id)
+        if entry is None:
+            return
+        lower = (float(rating or 0), review_count) < self._score(book_id)
+        entry["rating"] = float(rating or 0)
+        entry["review_count"] = review_count
+        if lower:
+            self._drop_broad(book_id)
+        else:
+            self._merge_broad(entry, self._entry_keys(entry))
+
+    # ============ QUERIES ============
+
+    def _rank(self, lo: int, hi: int, limit: int) -> List[Tuple[ObjectId, str]]:
+        """Best books among keys[lo:hi], with the field each matched on"""
+        matched: Dict[ObjectId, str] = {}
+        for _, field, book_id in self._keys[lo:hi]:
+            # A title match wins over an author match of the same book
+            if matched.get(book_id) != "title":
+                matched[book_id] = field
+        best = heapq.nlargest(limit, matched, key=self._score)
+        return [(book_id, matched[book_id]) for book_id in best]
+
+    def suggest(self, query: str, limit: int = 8) -> List[dict]:
+        prefix = normalize_prefix(query)
+        if not prefix:
+            return []
+        lo = bisect_left(self._keys, (prefix,))
+        hi = bisect_left(self._keys, (prefix + "\U0010ffff",), lo)
+
+        if hi - lo <= SCAN_LIMIT:
+            ranked = self._rank(lo, hi, limit)
+        else:
+            ranked = self._broad.get(prefix)
+            if ranked is None:
+                ranked = self._rank(lo, hi, MAX_SUGGESTIONS)
+                self._broad[prefix] = ranked
+                if len(self._broad) > BROAD_PREFIX_CACHE_SIZE:
+                    self._broad.popitem(last=False)
+            else:
+                self._broad.move_to_end(prefix)
+
+        suggestions = []
+        for book_id, field in ranked[:limit]:
+            entry = self._books[book_id]
+            suggestions.append({
+                "id": str(book_id),
+                "title": entry["title"],
+                "author": entry["author"],
+                "rating": entry["rating"],
+                "matched": field
+            })
+        return suggestions
+
+    # ============ LOADING ============
+
+    async def load(self):
+        """Read every book and build the key list in one sort"""
+        books: Dict[ObjectId, dict] = {}
+        self._removed_while_loading.clear()
+        async for book in self.collection.aggregate([{"$sort": {"_id": 1}}, SUMMARY_STAGE]):
+            books[book["_id"]] = {
+                "_id": book["_id"],
+                "title": book.get("title") or "",
+                "author": book.get("author") or "",
+                "rating": float(book.get("rating") or 0),
+                "review_count": book.get("review_count", 0)
+            }
+        # Books added or deleted by this process while the catalog was read
+        for book_id, entry in self._books.items():
+            books.setdefault(book_id, entry)
+        for book_id in self._removed_while_loading:
+            books.pop(book_id, None)
+        self._removed_while_loading.clear()
+        keys = sorted(key for entry in books.values() for key in self._entry_keys(entry))
+        self._books, self._keys = books, keys
+        self._broad.clear()
+        self.loaded_at_id = max(books) if books else None
+        self.ready = True
+        logger.info(f"✓ Suggestions loaded: {len(books)} books, {len(keys)} keys")
+
+    async def refresh(self):
+        """Add books inserted since the last look, e.g. by another process"""
+        match = {}
+        if self.loaded_at_id is not None:
+            match = {"_id": {"$gt": ObjectId.from_datetime(self.loaded_at_id.generation_time - REFRESH_OVERLAP)}}
+        async for book in self.collection.aggregate([{"$match": match}, {"$sort": {"_id": 1}}, SUMMARY_STAGE]):
+            if book["_id"] not in self._books:
+                self.add(book)
+            if self.loaded_at_id is None or book["_id"] > self.loaded_at_id:
+                self.loaded_at_id = book["_id"]
+
+    async def reconcile(self):
+        """Drop books deleted by other processes and take their rating changes"""
+        known = set(self._books)
+        seen = set()
+        async for book in self.collection.aggregate([RATING_STAGE]):
+            seen.add(book["_id"])
+            entry = self._books.get(book["_id"])
+            if entry is not None and (float(book.get("rating") or 0), book["review_count"]) != self._score(book["_id"]):
+                self.update_rating(book["_id"], book.get("rating"), book["review_count"])
+        # Only books known before the read started: later ones may not have been read
+        deleted = [book_id for book_id in known - seen if book_id in self._books]
+        for book_id in deleted:
+            self.remove(book_id)
+        if deleted:
+            logger.info(f"Suggestions: dropped {len(deleted)} books deleted elsewhere")
+
+    async def _run(self):
+        while not self.ready:
+            try:
+                await self.load()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Could not load suggestions, retrying: {e}")
+                await asyncio.sleep(max(self.refresh_seconds, 5))
+        reconciled_at = time.monotonic()
+        while self.refresh_seconds > 0:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                await self.refresh()
+                if self.reconcile_seconds > 0 and time.monotonic() - reconciled_at >= self.reconcile_seconds:
+                    reconciled_at = time.monotonic()
+                    await self.reconcile()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Suggestion refresh failed: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict:
+        key_bytes = sum(sys.getsizeof(item) + sys.getsizeof(item[0]) for item in self._keys)
+        return {
+            "ready": self.ready,
+            "books": len(self._books),
+            "keys": len(self._keys),
+            "broad_prefixes_cached": len(self._broad),
+            "approximate_mb": round((key_bytes + sys.getsizeof(self._keys)) / (1024 * 1024), 2)
+        }
+
+suggest_index = SuggestIndex(book_collection, SUGGEST_REFRESH_SECONDS, SUGGEST_RECONCILE_SECONDS)
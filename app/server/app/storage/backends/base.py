@@ -0,0 +1,188 @@
+"""Interface shared by the blob storage backends.
+
+Every backend describes a stored file with a document shaped like a GridFS
+files document, so the HTTP helpers, the blob registry and the cache never
+need to know where the bytes live::
+
+    {"_id": ObjectId, "filename": "...", "length": 123,
+     "uploadDate": datetime, "metadata": {...}}
+
+The descriptors are kept in MongoDB by every backend: GridFS uses its own
+``<bucket>.files`` collections, the others one collection each with a
+``bucket`` field. Only the bytes live elsewhere.
+
+Storing and deleting go through this class so the per-bucket counters of
+``app.storage.stats`` follow every change whatever the backend.
+"""
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import AsyncIterable, AsyncIterator, List, Optional
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from app.storage.stats import record_file_change
+
+class BlobStorage(ABC):
+    """Bucketed storage of immutable files"""
+
+    name = "base"
+
+    @abstractmethod
+    def _files(self, bucket_name: str) -> AsyncIOMotorCollection:
+        """Collection holding the file documents of a bucket"""
+
+    def _scope(self, bucket_name: str, query: Optional[dict] = None) -> dict:
+        """Restrict a files query to one bucket"""
+        return dict(query or {})
+
+    async def put_stream(
+        self,
+        bucket_name: str,
+        pieces: AsyncIterable[bytes],
+        filename: str,
+        metadata: dict,
+        file_id: Optional[ObjectId] = None,
+        upload_date: Optional[datetime] = None
+    ) -> dict:
+        """Store the bytes yielded by `pieces` and return the file document.
+
+        `metadata` is read only after `pieces` is exhausted, so the producer
+        can add values it computes while streaming (the digest, the size).
+        `file_id` and `upload_date` are given when copying between backends.
+        """
+        replaced = await self.stat(bucket_name, file_id) if file_id is not None else None
+        file_doc = await self._put_stream(bucket_name, pieces, filename, metadata, file_id, upload_date)
+        await record_file_change(
+            self.name,
+            bucket_name,
+            files=0 if replaced else 1,
+            length=file_doc["length"] - (replaced["length"] if replaced else 0)
+        )
+        return file_doc
+
+    @abstractmethod
+    async def _put_stream(
+        self,
+        bucket_name: str,
+        pieces: AsyncIterable[bytes],
+        filename: str,
+        metadata: dict,
+        file_id: Optional[ObjectId],
+        upload_date: Optional[datetime]
+    ) -> dict:
+        """Write the file and its document (see put_stream)"""
+
+    @abstractmethod
+    def get_range(
+        self,
+        bucket_name: str,
+        file_doc: dict,
+        start: int = 0,
+        end: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        """Yield bytes start..end (inclusive, default to the end) of a file"""
+
+    async def delete(self, bucket_name: str, file_id: ObjectId) -> bool:
+        """Delete a file; returns False if it did not exist"""
+        file_doc = await self.stat(bucket_name, file_id)
+        deleted = await self._delete(bucket_name, file_id)
+        if deleted and file_doc:
+            await record_file_change(self.name, bucket_name, files=-1, length=-file_doc["length"])
+        return deleted
+
+    @abstractmethod
+    async def _delete(self, bucket_name: str, file_id: ObjectId) -> bool:
+        """Remove the bytes and the document of a file"""
+
+    async def delete_many(self, bucket_name: str, file_ids: List[ObjectId]) -> int:
+        """Delete several files in one go; returns how many existed"""
+        if not file_ids:
+            return 0
+        file_docs = await self.find_files(bucket_name, {"_id": {"$in": file_ids}}, {"length": 1}).to_list(length=None)
+        if not file_docs:
+            return 0
+        await self._delete_many(bucket_name, [doc["_id"] for doc in file_docs])
+        await record_file_change(
+            self.name,
+            bucket_name,
+            files=-len(file_docs),
+            length=-sum(doc["length"] for doc in file_docs)
+        )
+        return len(file_docs)
+
+    async def _delete_many(self, bucket_name: str, file_ids: List[ObjectId]):
+        """Remove existing files; backends override this with a batched delete"""
+        for file_id in file_ids:
+            await self._delete(bucket_name, file_id)
+
+    async def stat(self, bucket_name: str, file_id: ObjectId) -> Optional[dict]:
+        """File document of a stored file, or None"""
+        return await self._files(bucket_name).find_one(self._scope(bucket_name, {"_id": file_id}))
+
+    def find_files(self, bucket_name: str, query: Optional[dict] = None, projection: Optional[dict] = None):
+        """Cursor over the file documents of a bucket"""
+        return self._files(bucket_name).find(self._scope(bucket_name, query), projection)
+
+    async def count_files(self, bucket_name: str, query: Optional[dict] = None) -> int:
+        return await self._files(bucket_name).count_documents(self._scope(bucket_name, query))
+
+    async def usage(self, bucket_name: str) -> dict:
+        """Number of files and total bytes in a bucket, computed from scratch.
+
+        Scans the file documents; only used to reconcile the stats counters.
+        """
+        result = await self._files(bucket_name).aggregate([
+            {"$match": self._scope(bucket_name)},
+            {"$group": {"_id": None, "files": {"$sum": 1}, "bytes": {"$sum": "$length"}}}
+        ]).to_list(length=1)
+        if not result:
+            return {"files": 0, "bytes": 0}
+        return {"files": result[0]["files"], "bytes": result[0]["bytes"]}
+
+    async def update_metadata(self, bucket_name: str, file_id: ObjectId, values: dict):
+        """Set metadata fields of a stored file (the bytes never change)"""
+        await self._files(bucket_name).update_one(
+            self._scope(bucket_name, {"_id": file_id}),
+            {"$set": {f"metadata.{key}": value for key, value in values.items()}}
+        )
+
+    def local_path(self, bucket_name: str, file_id: ObjectId) -> Optional[str]:
+        """Path of the file on local disk when the backend keeps one there"""
+        return None
+
+    async def ensure_ready(self):
+        """Create whatever the backend needs before the first request"""
+
+    async def close(self):
+        """Release clients held by the backend"""
+
+class IndexedStorage(BlobStorage):
+    """Backend that keeps the file documents of all its buckets in one collection"""
+
+    def __init__(self, files_collection: AsyncIOMotorCollection):
+        self.files_collection = files_collection
+
+    def _files(self, bucket_name: str) -> AsyncIOMotorCollection:
+        return self.files_collection
+
+    def _scope(self, bucket_name: str, query: Optional[dict] = None) -> dict:
+        return {"bucket": bucket_name, **(query or {})}
+
+    def _file_doc(
+        self,
+        bucket_name: str,
+        file_id: ObjectId,
+        filename: str,
+        length: int,
+        metadata: dict,
+        upload_date: Optional[datetime]
+    ) -> dict:
+        return {
+            "_id": file_id,
+            "bucket": bucket_name,
+            "filename": filename,
+            "length": length,
+            "uploadDate": (upload_date or datetime.utcnow()).replace(microsecond=0),
+            "metadata": metadata
+        }
@@ -0,0 +1,121 @@
+"""Blob storage in MongoDB GridFS buckets (the original layout)"""
+import logging
+from datetime import datetime
+from typing import AsyncIterable, AsyncIterator, Dict, List, Optional
+
+from bson import ObjectId
+from gridfs.errors import NoFile
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase, AsyncIOMotorGridFSBucket
+
+from app.storage.backends.base import BlobStorage
+
+logger = logging.getLogger(__name__)
+
+# GridFS chunk size for new files, the driver default
+CHUNK_SIZE = 255 * 1024
+
+# Number of chunk documents fetched per round trip. With the default 255 KB
+# chunk size this keeps roughly 1 MB of file data in memory per request.
+CHUNK_BATCH_SIZE = 4
+
+class GridFSStorage(BlobStorage):
+    """One GridFS bucket per logical bucket, read chunk by chunk"""
+
+    name = "gridfs"
+
+    def __init__(self, database: AsyncIOMotorDatabase):
+        self.database = database
+        self._buckets: Dict[str, AsyncIOMotorGridFSBucket] = {}
+
+    def bucket(self, bucket_name: str) -> AsyncIOMotorGridFSBucket:
+        if bucket_name not in self._buckets:
+            self._buckets[bucket_name] = AsyncIOMotorGridFSBucket(self.database, bucket_name=bucket_name)
+        return self._buckets[bucket_name]
+
+    def _files(self, bucket_name: str) -> AsyncIOMotorCollection:
+        return self.database[f"{bucket_name}.files"]
+
+    async def _put_stream(
+        self,
+        bucket_name: str,
+        pieces: AsyncIterable[bytes],
+        filename: str,
+        metadata: dict,
+        file_id: Optional[ObjectId] = None,
+        upload_date: Optional[datetime] = None
+    ) -> dict:
+        grid_in = self.bucket(bucket_name).open_upload_stream_with_id(
+            file_id or ObjectId(), filename, chunk_size_bytes=CHUNK_SIZE, metadata=metadata
+        )
+        try:
+            async for piece in pieces:
+                await grid_in.write(piece)
+            await grid_in.set("metadata", metadata)
+            await grid_in.close()
+        except BaseException:
+            # Drop the chunks written so far
+            await grid_in.abort()
+            raise
+
+        if upload_date:
+            await self._files(bucket_name).update_one({"_id": grid_in._id}, {"$set": {"uploadDate": upload_date}})
+        return await self.stat(bucket_name, grid_in._id)
+
+    async def _iter_chunks(
+        self,
+        bucket_name: str,
+        file_doc: dict,
+        first_chunk: int,
+        last_chunk: int
+    ) -> AsyncIterator[bytes]:
+        """Yield chunk documents first_chunk..last_chunk in order, a few at a time"""
+        cursor = self.database[f"{bucket_name}.chunks"].find(
+            {"files_id": file_doc["_id"], "n": {"$gte": first_chunk, "$lte": last_chunk}},
+            {"_id": 0, "n": 1, "data": 1}
+        ).sort("n", 1).batch_size(CHUNK_BATCH_SIZE)
+
+        expected = first_chunk
+        async for chunk in cursor:
+            if chunk["n"] != expected:
+                logger.error(f"GridFS file {file_doc['_id']} is missing chunk {expected}")
+                raise IOError(f"Missing chunk {expected} for file {file_doc['_id']}")
+            yield bytes(chunk["data"])
+            expected += 1
+        if expected <= last_chunk:
+            raise IOError(f"Missing chunk {expected} for file {file_doc['_id']}")
+
+    async def get_range(
+        self,
+        bucket_name: str,
+        file_doc: dict,
+        start: int = 0,
+        end: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        """Fetch only the chunks that cover the range"""
+        if end is None:
+            end = file_doc["length"] - 1
+        if end < start:
+            return
+
+        chunk_size = file_doc["chunkSize"]
+        first_chunk = start // chunk_size
+        last_chunk = end // chunk_size
+
+        n = first_chunk
+        async for data in self._iter_chunks(bucket_name, file_doc, first_chunk, last_chunk):
+            lo = start - n * chunk_size if n == first_chunk else 0
+            hi = end - n * chunk_size + 1 if n == last_chunk else len(data)
+            yield data[lo:hi]
+            n += 1
+
+    async def _delete(self, bucket_name: str, file_id: ObjectId) -> bool:
+        try:
+            await self.bucket(bucket_name).delete(file_id)
+        except NoFile:
+            return False
+        return True
+
+    async def _delete_many(self, bucket_name: str, file_ids: List[ObjectId]):
+        # Files first, like GridFSBucket.delete, so no reader finds a file without chunks
+        await self._files(bucket_name).delete_many({"_id": {"$in": file_ids}})
+        await self.database[f"{bucket_name}.chunks"].delete_many({"files_id": {"$in": file_ids}})
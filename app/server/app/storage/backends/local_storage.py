@@ -0,0 +1,115 @@
+"""Blob storage as plain files on a local or network-mounted filesystem"""
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime
+from typing import AsyncIterable, AsyncIterator, List, Optional
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from app.storage.backends.base import IndexedStorage
+
+logger = logging.getLogger(__name__)
+
+# Bytes read per thread hop when streaming a file
+READ_SIZE = 256 * 1024
+
+class LocalStorage(IndexedStorage):
+    """Files at <root>/<bucket>/<file id>, described in ``local_blob_files``"""
+
+    name = "local"
+
+    def __init__(self, root: str, files_collection: AsyncIOMotorCollection):
+        super().__init__(files_collection)
+        self.root = root
+
+    def _path(self, bucket_name: str, file_id: ObjectId) -> str:
+        return os.path.join(self.root, bucket_name, str(file_id))
+
+    def local_path(self, bucket_name: str, file_id: ObjectId) -> Optional[str]:
+        return self._path(bucket_name, file_id)
+
+    async def ensure_ready(self):
+        os.makedirs(self.root, exist_ok=True)
+
+    async def _put_stream(
+        self,
+        bucket_name: str,
+        pieces: AsyncIterable[bytes],
+        filename: str,
+        metadata: dict,
+        file_id: Optional[ObjectId] = None,
+        upload_date: Optional[datetime] = None
+    ) -> dict:
+        file_id = file_id or ObjectId()
+        path = self._path(bucket_name, file_id)
+        tmp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        length = 0
+        try:
+            with open(tmp_path, "wb") as fh:
+                async for piece in pieces:
+                    await asyncio.to_thread(fh.write, piece)
+                    length += len(piece)
+                await asyncio.to_thread(os.fsync, fh.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        file_doc = self._file_doc(bucket_name, file_id, filename, length, metadata, upload_date)
+        try:
+            await self.files_collection.replace_one({"_id": file_id}, file_doc, upsert=True)
+        except BaseException:
+            os.remove(path)
+            raise
+        return file_doc
+
+    async def get_range(
+        self,
+        bucket_name: str,
+        file_doc: dict,
+        start: int = 0,
+        end: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        if end is None:
+            end = file_doc["length"] - 1
+        remaining = end - start + 1
+        if remaining <= 0:
+            return
+
+        fh = await asyncio.to_thread(open, self._path(bucket_name, file_doc["_id"]), "rb")
+        try:
+            await asyncio.to_thread(fh.seek, start)
+            while remaining > 0:
+                data = await asyncio.to_thread(fh.read, min(READ_SIZE, remaining))
+                if not data:
+                    raise IOError(f"File {file_doc['_id']} is shorter than its recorded length")
+                remaining -= len(data)
+                yield data
+        finally:
+            fh.close()
+
+    async def _delete(self, bucket_name: str, file_id: ObjectId) -> bool:
+        result = await self.files_collection.delete_one(self._scope(bucket_name, {"_id": file_id}))
+        try:
+            os.remove(self._path(bucket_name, file_id))
+        except FileNotFoundError:
+            return bool(result.deleted_count)
+        return True
+
+    async def _delete_many(self, bucket_name: str, file_ids: List[ObjectId]):
+        await self.files_collection.delete_many(self._scope(bucket_name, {"_id": {"$in": file_ids}}))
+
+        def remove_files():
+            for file_id in file_ids:
+                try:
+                    os.remove(self._path(bucket_name, file_id))
+                except FileNotFoundError:
+                    pass
+
+        await asyncio.to_thread(remove_files)
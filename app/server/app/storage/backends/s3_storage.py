@@ -0,0 +1,201 @@
+"""Blob storage in an S3-compatible object store (AWS S3, MinIO, R2, ...).
+
+All logical buckets share one S3 bucket under ``<bucket>/<file id>`` keys.
+Large uploads go through multipart upload so memory stays bounded to one
+part; reads use ranged GETs so a Range request never fetches the whole
+object.
+"""
+import asyncio
+import logging
+from contextlib import AsyncExitStack
+from datetime import datetime
+from typing import AsyncIterable, AsyncIterator, List, Optional
+
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+from app.storage.backends.base import IndexedStorage
+
+logger = logging.getLogger(__name__)
+
+# Multipart part size; S3 requires at least 5 MB for every part but the last
+PART_SIZE = 8 * 1024 * 1024
+
+# Bytes read from a GET body at a time
+READ_SIZE = 256 * 1024
+
+# Keys per DeleteObjects request, the S3 maximum
+DELETE_BATCH_SIZE = 1000
+
+class S3Storage(IndexedStorage):
+    """Objects in one S3 bucket, described in ``s3_blob_files``"""
+
+    name = "s3"
+
+    def __init__(
+        self,
+        files_collection: AsyncIOMotorCollection,
+        bucket: str,
+        endpoint_url: Optional[str] = None,
+        region: Optional[str] = None,
+        access_key_id: Optional[str] = None,
+        secret_access_key: Optional[str] = None
+    ):
+        super().__init__(files_collection)
+        self.s3_bucket = bucket
+        self.endpoint_url = endpoint_url
+        self.region = region
+        self.access_key_id = access_key_id
+        self.secret_access_key = secret_access_key
+        self._client = None
+        self._exit_stack: Optional[AsyncExitStack] = None
+        self._lock = asyncio.Lock()
+
+    async def _get_client(self):
+        """Create the S3 client on first use and keep it for the process"""
+        if self._client is None:
+            async with self._lock:
+                if self._client is None:
+                    try:
+                        from aiobotocore.session import get_session
+                    except ImportError:
+                        raise RuntimeError("STORAGE_BACKEND=s3 requires the aiobotocore package")
+
+                    stack = AsyncExitStack()
+                    self._client = await stack.enter_async_context(get_session().create_client(
+                        "s3",
+                        endpoint_url=self.endpoint_url,
+                        region_name=self.region,
+                        aws_access_key_id=self.access_key_id,
+                        aws_secret_access_key=self.secret_access_key
+                    ))
+                    self._exit_stack = stack
+        return self._client
+
+    def _key(self, bucket_name: str, file_id: ObjectId) -> str:
+        return f"{bucket_name}/{file_id}"
+
+    async def ensure_ready(self):
+        client = await self._get_client()
+        try:
+            await client.head_bucket(Bucket=self.s3_bucket)
+        except client.exceptions.ClientError:
+            await client.create_bucket(Bucket=self.s3_bucket)
+            logger.info(f"✓ Created S3 bucket {self.s3_bucket}")
+
+    async def close(self):
+        if self._exit_stack:
+            await self._exit_stack.aclose()
+            self._client = None
+            self._exit_stack = None
+
+    async def _upload(self, key: str, pieces: AsyncIterable[bytes]) -> int:
+        """Upload in one PUT when the data fits in a part, else as a multipart upload"""
+        client = await self._get_client()
+        buffer = bytearray()
+        length = 0
+        upload_id = None
+        parts = []
+
+        try:
+            async for piece in pieces:
+                buffer += piece
+                length += len(piece)
+                if len(buffer) >= PART_SIZE:
+                    if upload_id is None:
+                        created = await client.create_multipart_upload(Bucket=self.s3_bucket, Key=key)
+                        upload_id = created["UploadId"]
+                    part_number = len(parts) + 1
+                    result = await client.upload_part(
+                        Bucket=self.s3_bucket, Key=key, UploadId=upload_id,
+                        PartNumber=part_number, Body=bytes(buffer)
+                    )
+                    parts.append({"PartNumber": part_number, "ETag": result["ETag"]})
+                    buffer.clear()
+
+            if upload_id is None:
+                await client.put_object(Bucket=self.s3_bucket, Key=key, Body=bytes(buffer))
+                return length
+
+            if buffer:
+                part_number = len(parts) + 1
+                result = await client.upload_part(
+                    Bucket=self.s3_bucket, Key=key, UploadId=upload_id,
+                    PartNumber=part_number, Body=bytes(buffer)
+                )
+                parts.append({"PartNumber": part_number, "ETag": result["ETag"]})
+            await client.complete_multipart_upload(
+                Bucket=self.s3_bucket, Key=key, UploadId=upload_id,
+                MultipartUpload={"Parts": parts}
+            )
+            return length
+        except BaseException:
+            if upload_id is not None:
+                await client.abort_multipart_upload(Bucket=self.s3_bucket, Key=key, UploadId=upload_id)
+            raise
+
+    async def _put_stream(
+        self,
+        bucket_name: str,
+        pieces: AsyncIterable[bytes],
+        filename: str,
+        metadata: dict,
+        file_id: Optional[ObjectId] = None,
+        upload_date: Optional[datetime] = None
+    ) -> dict:
+        file_id = file_id or ObjectId()
+        key = self._key(bucket_name, file_id)
+        length = await self._upload(key, pieces)
+
+        file_doc = self._file_doc(bucket_name, file_id, filename, length, metadata, upload_date)
+        try:
+            await self.files_collection.replace_one({"_id": file_id}, file_doc, upsert=True)
+        except BaseException:
+            client = await self._get_client()
+            await client.delete_object(Bucket=self.s3_bucket, Key=key)
+            raise
+        return file_doc
+
+    async def get_range(
+        self,
+        bucket_name: str,
+        file_doc: dict,
+        start: int = 0,
+        end: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        if end is None:
+            end = file_doc["length"] - 1
+        if end < start:
+            return
+
+        client = await self._get_client()
+        response = await client.get_object(
+            Bucket=self.s3_bucket,
+            Key=self._key(bucket_name, file_doc["_id"]),
+            Range=f"bytes={start}-{end}"
+        )
+        async with response["Body"] as body:
+            while True:
+                data = await body.read(READ_SIZE)
+                if not data:
+                    break
+                yield data
+
+    async def _delete(self, bucket_name: str, file_id: ObjectId) -> bool:
+        result = await self.files_collection.delete_one(self._scope(bucket_name, {"_id": file_id}))
+        client = await self._get_client()
+        # DeleteObject succeeds for missing keys, so the document decides
+        await client.delete_object(Bucket=self.s3_bucket, Key=self._key(bucket_name, file_id))
+        return bool(result.deleted_count)
+
+    async def _delete_many(self, bucket_name: str, file_ids: List[ObjectId]):
+        await self.files_collection.delete_many(self._scope(bucket_name, {"_id": {"$in": file_ids}}))
+        client = await self._get_client()
+        for start in range(0, len(file_ids), DELETE_BATCH_SIZE):
+            await client.delete_objects(
+                Bucket=self.s3_bucket,
+                Delete={
+                    "Objects": [{"Key": self._key(bucket_name, file_id)} for file_id in file_ids[start:start + DELETE_BATCH_SIZE]],
+                    "Quiet": True
+                }
+            )
@@ -0,0 +1,295 @@
+"""Content-addressed, reference-counted blob registry on top of the storage backend.
+
+Every stored file has a registry document in ``blobs`` whose ``_id`` is the
+storage file id::
+
+    {"_id": file_id, "bucket": "pdfs", "sha256": "...", "length": 123,
+     "refcount": 2, "created_at": datetime}
+
+Uploads with a digest that already exists in the same bucket reuse the
+existing file and bump its refcount instead of writing the bytes again.
+Bytes are only dropped when the last reference is released.
+
+Files generated from a blob (cover thumbnails and the like) are tracked in
+``blob_derivatives`` with the id of their source and are deleted with it.
+"""
+import hashlib
+import logging
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Tuple
+
+from bson import ObjectId
+from fastapi import HTTPException, UploadFile
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.database import blob_collection, derivative_collection, book_collection
+from app.storage.disk_cache import blob_cache
+from app.storage.stats import record_book_change
+from app.storage.store import storage
+from app.utils.blob_stream import PDF_BUCKET, COVER_BUCKET, UPLOAD_PIECE_SIZE, stream_upload
+
+logger = logging.getLogger(__name__)
+
+# Book field that references each uploaded bucket (pages only hold derivatives)
+BOOK_REFERENCE_FIELDS = {
+    PDF_BUCKET: "pdf_id",
+    COVER_BUCKET: "cover_id"
+}
+BOOK_SIZE_FIELDS = {
+    PDF_BUCKET: "file_size"
+}
+
+async def hash_upload(file: UploadFile, max_size: int) -> Tuple[str, int]:
+    """Compute the SHA-256 digest and size of a spooled upload, then rewind it"""
+    if file.size is not None and file.size > max_size:
+        raise HTTPException(
+            status_code=400,
+            detail=f"File too large. Maximum size: {max_size // (1024 * 1024)}MB"
+        )
+
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        piece = await file.read(UPLOAD_PIECE_SIZE)
+        if not piece:
+            break
+        size += len(piece)
+        if size > max_size:
+            raise HTTPException(
+                status_code=400,
+                detail=f"File too large. Maximum size: {max_size // (1024 * 1024)}MB"
+            )
+        digest.update(piece)
+
+    await file.seek(0)
+    return digest.hexdigest(), size
+
+async def _reuse_blob(bucket_name: str, sha256: str) -> Optional[dict]:
+    """Take a reference on an existing live blob with this digest"""
+    return await blob_collection.find_one_and_update(
+        {"bucket": bucket_name, "sha256": sha256, "refcount": {"$gt": 0}},
+        {"$inc": {"refcount": 1}},
+        return_document=ReturnDocument.AFTER
+    )
+
+async def store_blob(
+    file: UploadFile,
+    bucket_name: str,
+    filename: str,
+    metadata: dict,
+    max_size: int
+) -> Tuple[ObjectId, int, str, bool]:
+    """Store an upload, reusing an identical blob when one exists.
+
+    Returns (file_id, size, sha256, reused).
+    """
+    sha256, size = await hash_upload(file, max_size)
+
+    existing = await _reuse_blob(bucket_name, sha256)
+    if existing:
+        logger.info(f"Reusing {bucket_name} blob {existing['_id']} (refcount {existing['refcount']})")
+        return existing["_id"], existing["length"], sha256, True
+
+    file_id, size, sha256 = await stream_upload(
+        file, bucket_name, filename=filename, metadata=metadata, max_size=max_size
+    )
+
+    try:
+        await blob_collection.insert_one({
+            "_id": file_id,
+            "bucket": bucket_name,
+            "sha256": sha256,
+            "length": size,
+            "refcount": 1,
+            "created_at": datetime.utcnow()
+        })
+    except DuplicateKeyError:
+        # An identical upload registered first; keep theirs and drop ours
+        await storage.delete(bucket_name, file_id)
+        existing = await _reuse_blob(bucket_name, sha256)
+        if not existing:
+            raise HTTPException(status_code=409, detail="Concurrent upload conflict, please retry")
+        return existing["_id"], existing["length"], sha256, True
+
+    return file_id, size, sha256, False
+
+async def release_blob(bucket_name: str, file_id: ObjectId) -> bool:
+    """Drop one reference to a blob; delete its bytes if it was the last.
+
+    Returns True when the underlying file was deleted.
+    """
+    doc = await blob_collection.find_one_and_update(
+        {"_id": file_id},
+        {"$inc": {"refcount": -1}},
+        return_document=ReturnDocument.AFTER
+    )
+
+    if doc is None:
+        # Files uploaded before the registry existed were never shared
+        await storage.delete(bucket_name, file_id)
+        blob_cache.discard(bucket_name, file_id)
+        await delete_derivatives(file_id)
+        return True
+
+    if doc["refcount"] > 0:
+        return False
+
+    # Remove the registry entry first so no new upload can reuse it
+    result = await blob_collection.delete_one({"_id": file_id, "refcount": {"$lte": 0}})
+    if result.deleted_count:
+        await storage.delete(bucket_name, file_id)
+        blob_cache.discard(bucket_name, file_id)
+        await delete_derivatives(file_id)
+        return True
+    return False
+
+async def replace_blob(
+    bucket_name: str,
+    old_id: ObjectId,
+    new_id: ObjectId,
+    sha256: str,
+    length: int
+) -> ObjectId:
+    """Move every reference from a stored file to a re-encoded copy and delete the old file.
+
+    If the new content is already stored, the references are folded into
+    that blob and the new copy is dropped. Returns the id books now use.
+    """
+    field = BOOK_REFERENCE_FIELDS[bucket_name]
+    # Retire the old entry before counting its references, so no upload can
+    # take a new reference on a file about to be deleted
+    old = await blob_collection.find_one_and_update(
+        {"_id": old_id},
+        {"$unset": {"sha256": ""}},
+        return_document=ReturnDocument.AFTER
+    )
+    refcount = old["refcount"] if old else await book_collection.count_documents({field: old_id})
+
+    entry = {
+        "_id": new_id,
+        "bucket": bucket_name,
+        "sha256": sha256,
+        "length": length,
+        "refcount": refcount,
+        "created_at": datetime.utcnow()
+    }
+    target = new_id
+    try:
+        await blob_collection.insert_one(entry)
+    except DuplicateKeyError:
+        # Only a live blob takes the references; one being released is left alone
+        existing = await blob_collection.find_one_and_update(
+            {"bucket": bucket_name, "sha256": sha256, "refcount": {"$gt": 0}},
+            {"$inc": {"refcount": refcount}},
+            return_document=ReturnDocument.AFTER
+        )
+        if existing is not None:
+            target = existing["_id"]
+        else:
+            # Keep the new copy, without a digest for uploads to reuse
+            del entry["sha256"]
+            await blob_collection.insert_one(entry)
+
+    if target == new_id:
+        # Derivatives depend only on the content, which is unchanged
+        await derivative_collection.update_many({"source_id": old_id}, {"$set": {"source_id": new_id}})
+    else:
+        await storage.delete(bucket_name, new_id)
+        await delete_derivatives(old_id)
+
+    book_update = {field: target}
+    size_delta = 0
+    if bucket_name in BOOK_SIZE_FIELDS:
+        size_field = BOOK_SIZE_FIELDS[bucket_name]
+        book_update[size_field] = length
+        async for sizes in book_collection.aggregate([
+            {"$match": {field: old_id}},
+            {"$group": {"_id": None, "books": {"$sum": 1}, "bytes": {"$sum": f"${size_field}"}}}
+        ]):
+            size_delta = sizes["books"] * length - sizes["bytes"]
+    await book_collection.update_many({field: old_id}, {"$set": book_update})
+    if size_delta:
+        await record_book_change(pdf_bytes=size_delta)
+
+    await blob_collection.delete_one({"_id": old_id})
+    await storage.delete(bucket_name, old_id)
+    blob_cache.discard(bucket_name, old_id)
+    return target
+
+# ============ DERIVATIVES ============
+
+async def store_derivative(
+    bucket_name: str,
+    source_id: ObjectId,
+    kind: str,
+    data: bytes,
+    filename: str,
+    content_type: str,
+    **attributes
+) -> dict:
+    """Store a file generated from a blob and record it against its source"""
+    async def pieces() -> AsyncIterator[bytes]:
+        yield data
+
+    file_doc = await storage.put_stream(
+        bucket_name,
+        pieces(),
+        filename,
+        metadata={
+            "filename": filename,
+            "content_type": content_type,
+            "file_type": kind,
+            "derivative_of": source_id,
+            **attributes
+        }
+    )
+
+    doc = {
+        "_id": file_doc["_id"],
+        "source_id": source_id,
+        "bucket": bucket_name,
+        "kind": kind,
+        "content_type": content_type,
+        "length": len(data),
+        "created_at": datetime.utcnow(),
+        **attributes
+    }
+    await derivative_collection.insert_one(doc)
+    return doc
+
+async def list_derivatives(source_id: ObjectId, kind: str) -> List[dict]:
+    """All derivatives of one kind recorded for a blob"""
+    return await derivative_collection.find({"source_id": source_id, "kind": kind}).to_list(length=None)
+
+async def delete_derivatives(source_id: ObjectId, kind: Optional[str] = None) -> int:
+    """Delete the derivatives of a blob (optionally only one kind)"""
+    query = {"source_id": source_id}
+    if kind:
+        query["kind"] = kind
+
+    deleted = 0
+    async for doc in derivative_collection.find(query, {"bucket": 1}):
+        # Markers (page split claims) have no file
+        if doc.get("bucket"):
+            await storage.delete(doc["bucket"], doc["_id"])
+        await derivative_collection.delete_one({"_id": doc["_id"]})
+        deleted += 1
+    return deleted
+
+async def delete_derivatives_of(source_ids: List[ObjectId], batch_size: int = 1000) -> int:
+    """Delete every derivative of several blobs, `batch_size` files per delete"""
+    by_bucket = {}
+    async for doc in derivative_collection.find({"source_id": {"$in": source_ids}}, {"bucket": 1}):
+        by_bucket.setdefault(doc.get("bucket"), []).append(doc["_id"])
+
+    deleted = 0
+    for bucket_name, ids in by_bucket.items():
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            # Markers (page split claims) have no file
+            if bucket_name:
+                await storage.delete_many(bucket_name, batch)
+            await derivative_collection.delete_many({"_id": {"$in": batch}})
+            deleted += len(batch)
+    return deleted
@@ -0,0 +1,241 @@
+"""Background removal of stored files that nothing references.
+
+Runs as an ``orphan_cleanup`` job on the ingestion queue, one bucket after
+the other. The files of a bucket and its registry entries are both read
+sorted by ``_id`` and merged, so memory stays bounded to one batch however
+large the catalog is:
+
+- a file whose registry entry has no references left is deleted, along
+  with the entry and its derivatives;
+- a file without a registry entry predates the registry. It is adopted
+  with the number of books that point at it, or deleted if there are
+  none. Files younger than the grace period are left alone, since their
+  upload may still be registering.
+
+Deletes are batched (``delete_many`` on the file documents and on the
+chunks) with a pause between batches. The last id handled is saved on the
+job after every batch, so a retried attempt resumes there. A dry run only
+reports what would be deleted.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from app.database import blob_collection, book_collection
+from app.ingest.jobs import enqueue_job, record_stage, save_progress, set_stage
+from app.storage.blobs import BOOK_REFERENCE_FIELDS, delete_derivatives_of
+from app.storage.disk_cache import blob_cache
+from app.storage.store import storage
+from app.utils.blob_stream import PDF_BUCKET, COVER_BUCKET
+
+logger = logging.getLogger(__name__)
+
+JOB_TYPE = "orphan_cleanup"
+
+CLEANUP_BUCKETS = [PDF_BUCKET, COVER_BUCKET]
+
+# Files handled per batch, and the pause between batches to spare the database
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_PAUSE_SECONDS = 0.2
+
+# Unregistered files younger than this may belong to an upload in progress
+DEFAULT_GRACE_PERIOD = timedelta(hours=1)
+
+# Ids listed in a dry-run report, per bucket
+DRY_RUN_SAMPLE_SIZE = 100
+
+def new_report() -> dict:
+    return {
+        "scanned": 0,
+        "kept": 0,
+        "too_recent": 0,
+        "adopted": 0,
+        "deleted": 0,
+        "deleted_bytes": 0,
+        "stale_entries": 0,
+        "missing_files": 0
+    }
+
+async def schedule_cleanup(
+    buckets: Optional[List[str]] = None,
+    dry_run: bool = False,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    pause_seconds: float = DEFAULT_PAUSE_SECONDS,
+    grace_seconds: int = int(DEFAULT_GRACE_PERIOD.total_seconds())
+) -> ObjectId:
+    """Queue a cleanup run; returns the job id"""
+    for bucket_name in buckets or CLEANUP_BUCKETS:
+        if bucket_name not in BOOK_REFERENCE_FIELDS:
+            raise ValueError(f"Bucket '{bucket_name}' cannot be cleaned up")
+    return await enqueue_job(JOB_TYPE, None, {
+        "buckets": list(buckets or CLEANUP_BUCKETS),
+        "dry_run": dry_run,
+        "batch_size": batch_size,
+        "pause_seconds": pause_seconds,
+        "grace_seconds": grace_seconds
+    })
+
+async def _merged_batches(
+    bucket_name: str,
+    after: Optional[ObjectId],
+    batch_size: int
+) -> AsyncIterator[List[Tuple[Optional[dict], Optional[dict]]]]:
+    """Yield batches of (file document, registry entry) pairs merged on _id.
+
+    Either side is None when the id only exists on the other one.
+    """
+    id_range = {"_id": {"$gt": after}} if after else {}
+    files = storage.find_files(
+        bucket_name,
+        {**id_range, "metadata.derivative_of": {"$exists": False}},
+        {"length": 1, "uploadDate": 1, "metadata.sha256": 1}
+    ).sort("_id", 1).batch_size(batch_size).__aiter__()
+    entries = blob_collection.find(
+        {"bucket": bucket_name, **id_range},
+        {"refcount": 1}
+    ).sort("_id", 1).batch_size(batch_size).__aiter__()
+
+    file_doc = await anext(files, None)
+    entry = await anext(entries, None)
+    batch = []
+    while file_doc is not None or entry is not None:
+        if entry is None or (file_doc is not None and file_doc["_id"] < entry["_id"]):
+            batch.append((file_doc, None))
+            file_doc = await anext(files, None)
+        elif file_doc is None or entry["_id"] < file_doc["_id"]:
+            batch.append((None, entry))
+            entry = await anext(entries, None)
+        else:
+            batch.append((file_doc, entry))
+            file_doc = await anext(files, None)
+            entry = await anext(entries, None)
+
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+async def _adopt(bucket_name: str, file_doc: dict, refcount: int):
+    """Register a file stored before the registry existed"""
+    entry = {
+        "_id": file_doc["_id"],
+        "bucket": bucket_name,
+        "length": file_doc["length"],
+        "refcount": refcount,
+        "created_at": file_doc.get("uploadDate", datetime.utcnow())
+    }
+    sha256 = (file_doc.get("metadata") or {}).get("sha256")
+    if sha256:
+        entry["sha256"] = sha256
+    try:
+        await blob_collection.insert_one(entry)
+    except DuplicateKeyError:
+        # Same digest already registered by another file; track this copy
+        # without a digest so it is refcounted but never reused
+        entry.pop("sha256", None)
+        await blob_collection.insert_one(entry)
+
+async def _clean_batch(
+    bucket_name: str,
+    pairs: List[Tuple[Optional[dict], Optional[dict]]],
+    cutoff: datetime,
+    dry_run: bool,
+    report: dict
+):
+    dead_entries = []
+    unregistered = []
+    for file_doc, entry in pairs:
+        if file_doc is not None:
+            report["scanned"] += 1
+        if entry is not None and entry["refcount"] <= 0:
+            dead_entries.append((entry["_id"], file_doc))
+        elif entry is not None:
+            report["kept" if file_doc is not None else "missing_files"] += 1
+        elif file_doc["uploadDate"] >= cutoff:
+            report["too_recent"] += 1
+        else:
+            unregistered.append(file_doc)
+
+    doomed = []
+    if dead_entries:
+        # Entries with no references are never reused, so they can go first
+        if not dry_run:
+            await blob_collection.delete_many({
+                "_id": {"$in": [entry_id for entry_id, _ in dead_entries]},
+                "refcount": {"$lte": 0}
+            })
+        report["stale_entries"] += sum(1 for _, file_doc in dead_entries if file_doc is None)
+        doomed.extend(file_doc for _, file_doc in dead_entries if file_doc is not None)
+
+    if unregistered:
+        field = BOOK_REFERENCE_FIELDS[bucket_name]
+        references = {
+            doc["_id"]: doc["count"]
+            for doc in await book_collection.aggregate([
+                {"$match": {field: {"$in": [file_doc["_id"] for file_doc in unregistered]}}},
+                {"$group": {"_id": f"${field}", "count": {"$sum": 1}}}
+            ]).to_list(length=None)
+        }
+        for file_doc in unregistered:
+            refcount = references.get(file_doc["_id"], 0)
+            if refcount == 0:
+                doomed.append(file_doc)
+                continue
+            if not dry_run:
+                await _adopt(bucket_name, file_doc, refcount)
+            report["adopted"] += 1
+
+    if not doomed:
+        return
+    report["deleted"] += len(doomed)
+    report["deleted_bytes"] += sum(file_doc["length"] for file_doc in doomed)
+    ids = [file_doc["_id"] for file_doc in doomed]
+    if dry_run:
+        sample = report.setdefault("would_delete", [])
+        sample.extend(str(file_id) for file_id in ids[:max(0, DRY_RUN_SAMPLE_SIZE - len(sample))])
+        return
+
+    await storage.delete_many(bucket_name, ids)
+    await delete_derivatives_of(ids)
+    for file_id in ids:
+        blob_cache.discard(bucket_name, file_id)
+
+async def run_cleanup_job(job: dict) -> str:
+    """Clean the buckets of a cleanup job, resuming from its checkpoint"""
+    payload = job["payload"]
+    result = job.get("result") or {}
+    done = set(job.get("completed_stages") or [])
+    checkpoints = dict(result.get("checkpoint") or {})
+    reports = dict(result.get("report") or {})
+    dry_run = payload.get("dry_run", False)
+    batch_size = payload.get("batch_size", DEFAULT_BATCH_SIZE)
+    pause_seconds = payload.get("pause_seconds", DEFAULT_PAUSE_SECONDS)
+    cutoff = datetime.utcnow() - timedelta(seconds=payload.get("grace_seconds", DEFAULT_GRACE_PERIOD.total_seconds()))
+
+    for bucket_name in payload["buckets"]:
+        if bucket_name in done:
+            continue
+        await set_stage(job, bucket_name)
+        report = reports.get(bucket_name) or new_report()
+        started = time.perf_counter()
+
+        async for pairs in _merged_batches(bucket_name, checkpoints.get(bucket_name), batch_size):
+            await _clean_batch(bucket_name, pairs, cutoff, dry_run, report)
+            last = pairs[-1][0] or pairs[-1][1]
+            await save_progress(job, {
+                f"checkpoint.{bucket_name}": last["_id"],
+                f"report.{bucket_name}": report
+            })
+            if pause_seconds:
+                await asyncio.sleep(pause_seconds)
+
+        await record_stage(job, bucket_name, time.perf_counter() - started, {f"report.{bucket_name}": report})
+        logger.info(f"✓ {'Dry-run cleanup' if dry_run else 'Cleanup'} of {bucket_name}: {report}")
+
+    return "succeeded"
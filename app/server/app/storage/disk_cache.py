@@ -0,0 +1,201 @@
+"""Size-bounded LRU cache of hot blobs on local disk.
+
+Stored files never change once written, so a copy keyed by bucket and file id
+stays valid until the file is deleted. Cached files are served with
+FileResponse, which uses zero-copy sendfile when the server supports it and
+handles Range/If-Range itself. Misses are streamed from the storage backend
+while a single background task per file copies it to disk. Backends that
+already keep files on local disk are served directly without caching.
+"""
+import asyncio
+import logging
+import os
+import uuid
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+
+from app.config import BLOB_CACHE_DIR, BLOB_CACHE_MAX_BYTES
+from app.storage.store import storage
+from app.utils.blob_stream import (
+    blob_streaming_response, iter_blob, not_modified_response, validator_headers
+)
+
+logger = logging.getLogger(__name__)
+
+# Files larger than this share of the budget are never cached
+MAX_ENTRY_FRACTION = 4
+
+class BlobDiskCache:
+    """LRU of whole files on disk with a byte budget"""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.fills = 0
+        self.fill_errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _key(self, bucket_name: str, file_id) -> str:
+        return f"{bucket_name}/{file_id}"
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def path_for(self, bucket_name: str, file_id) -> str:
+        """Location of the cached copy of a file"""
+        return self._path(self._key(bucket_name, file_id))
+
+    def load(self):
+        """Index files left on disk by a previous run, oldest access first"""
+        if not self.enabled:
+            return
+        found = []
+        for bucket_name in os.listdir(self.directory) if os.path.isdir(self.directory) else []:
+            bucket_dir = os.path.join(self.directory, bucket_name)
+            for name in os.listdir(bucket_dir):
+                path = os.path.join(bucket_dir, name)
+                if ".tmp-" in name:
+                    os.remove(path)
+                    continue
+                st = os.stat(path)
+                found.append((st.st_atime, f"{bucket_name}/{name}", st.st_size))
+
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self.total_bytes += size
+        self._evict()
+        logger.info(f"Blob cache loaded {len(self._entries)} files ({self.total_bytes // (1024 * 1024)} MB)")
+
+    def lookup(self, bucket_name: str, file_doc: dict) -> Optional[os.stat_result]:
+        """Return the stat of the cached copy and mark it recently used, or None on a miss"""
+        if not self.enabled:
+            return None
+        key = self._key(bucket_name, file_doc["_id"])
+        if key in self._entries:
+            try:
+                st = os.stat(self._path(key))
+            except FileNotFoundError:
+                self.total_bytes -= self._entries.pop(key)
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return st
+        self.misses += 1
+        return None
+
+    def schedule_fill(self, bucket_name: str, file_doc: dict):
+        """Copy a file to disk in the background, at most once at a time per file"""
+        if not self.enabled or file_doc["length"] > self.max_bytes // MAX_ENTRY_FRACTION:
+            return
+        key = self._key(bucket_name, file_doc["_id"])
+        if key in self._entries or key in self._inflight:
+            return
+        task = asyncio.create_task(self._fill(key, bucket_name, file_doc))
+        self._inflight[key] = task
+        task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+    async def _fill(self, key: str, bucket_name: str, file_doc: dict):
+        path = self._path(key)
+        tmp_path = f"{path}.tmp-{uuid.uuid4().hex}"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "wb") as fh:
+                async for data in iter_blob(bucket_name, file_doc):
+                    await asyncio.to_thread(fh.write, data)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            self.fill_errors += 1
+            logger.warning(f"Blob cache fill failed for {key}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        self._entries[key] = file_doc["length"]
+        self.total_bytes += file_doc["length"]
+        self.fills += 1
+        self._evict()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def discard(self, bucket_name: str, file_id):
+        """Drop a file from the cache, e.g. after it was deleted from storage"""
+        key = self._key(bucket_name, file_id)
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self.total_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "directory": self.directory,
+            "entries": len(self._entries),
+            "size_mb": round(self.total_bytes / (1024 * 1024), 2),
+            "max_size_mb": round(self.max_bytes / (1024 * 1024), 2),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "fills": self.fills,
+            "fill_errors": self.fill_errors,
+            "fills_in_progress": len(self._inflight)
+        }
+
+blob_cache = BlobDiskCache(BLOB_CACHE_DIR, BLOB_CACHE_MAX_BYTES)
+
+def cached_blob_response(
+    request: Request,
+    bucket_name: str,
+    file_doc: dict,
+    media_type: Optional[str] = None,
+    disposition: str = "inline"
+) -> Response:
+    """Serve a blob from local disk when possible, otherwise from storage while filling the cache"""
+    not_modified = not_modified_response(request, file_doc)
+    if not_modified:
+        return not_modified
+
+    path = storage.local_path(bucket_name, file_doc["_id"])
+    stat_result = None
+    if path is None:
+        stat_result = blob_cache.lookup(bucket_name, file_doc)
+        if stat_result is None:
+            blob_cache.schedule_fill(bucket_name, file_doc)
+            return blob_streaming_response(request, bucket_name, file_doc, media_type=media_type, disposition=disposition)
+        path = blob_cache.path_for(bucket_name, file_doc["_id"])
+
+    metadata = file_doc.get("metadata") or {}
+    filename = metadata.get("filename", f"file_{file_doc['_id']}")
+    return FileResponse(
+        path,
+        media_type=media_type or metadata.get("content_type", "application/octet-stream"),
+        stat_result=stat_result,
+        headers={
+            "Content-Disposition": f"{disposition}; filename={filename}",
+            **validator_headers(file_doc)
+        }
+    )
@@ -0,0 +1,183 @@
+"""Storage statistics kept up to date as files and books change.
+
+One document per bucket of each storage backend, and one for the books::
+
+    {"_id": "gridfs:pdfs", "backend": "gridfs", "bucket": "pdfs",
+     "files": 120, "bytes": 734003200, "updated_at": datetime}
+    {"_id": "books", "books": 100, "books_with_pdf": 98,
+     "books_with_cover": 97, "pdf_bytes": 700000000,
+     "categories": {"นิยาย": 60, "การ์ตูน": 40}, "updated_at": datetime}
+
+Writers apply ``$inc`` deltas, so reading the statistics is a handful of
+point lookups whatever the size of the catalog. ``reconcile_stats``
+recomputes every document with ``$group`` aggregations to correct drift,
+e.g. from a process killed between storing a file and counting it.
+"""
+import logging
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, Iterable, Optional
+
+from app.database import book_collection, storage_stats_collection
+
+if TYPE_CHECKING:
+    from app.storage.backends.base import BlobStorage
+
+logger = logging.getLogger(__name__)
+
+BOOKS_STATS_ID = "books"
+
+# Category of books stored without one (as shown by BookResponse)
+DEFAULT_CATEGORY = "อื่นๆ"
+
+def bucket_stats_id(backend: str, bucket_name: str) -> str:
+    return f"{backend}:{bucket_name}"
+
+async def record_file_change(backend: str, bucket_name: str, files: int, length: int):
+    """Count files stored (positive) or deleted (negative) in a bucket"""
+    try:
+        await storage_stats_collection.update_one(
+            {"_id": bucket_stats_id(backend, bucket_name)},
+            {
+                "$inc": {"files": files, "bytes": length},
+                "$set": {"backend": backend, "bucket": bucket_name, "updated_at": datetime.utcnow()}
+            },
+            upsert=True
+        )
+    except Exception as e:
+        # The file operation itself succeeded; reconciliation corrects the counters
+        logger.warning(f"Could not update storage stats of {backend}:{bucket_name}: {e}")
+
+def book_counts(book: dict, sign: int = 1) -> dict:
+    """Counter deltas contributed by one book document"""
+    return {
+        "books": sign,
+        "books_with_pdf": sign if book.get("pdf_id") else 0,
+        "books_with_cover": sign if book.get("cover_id") else 0,
+        "pdf_bytes": sign * (book.get("file_size") or 0),
+        "categories": {book.get("category") or DEFAULT_CATEGORY: sign}
+    }
+
+async def record_book_change(
+    books: int = 0,
+    books_with_pdf: int = 0,
+    books_with_cover: int = 0,
+    pdf_bytes: int = 0,
+    categories: Optional[Dict[str, int]] = None
+):
+    """Apply deltas to the book counters"""
+    increments = {
+        "books": books,
+        "books_with_pdf": books_with_pdf,
+        "books_with_cover": books_with_cover,
+        "pdf_bytes": pdf_bytes
+    }
+    for category, delta in (categories or {}).items():
+        if delta:
+            increments[f"categories.{category}"] = delta
+    try:
+        await storage_stats_collection.update_one(
+            {"_id": BOOKS_STATS_ID},
+            {
+                "$inc": increments,
+                "$set": {"updated_at": datetime.utcnow()}
+            },
+            upsert=True
+        )
+    except Exception as e:
+        logger.warning(f"Could not update book stats: {e}")
+
+async def record_book_files(before: Optional[dict], fields: dict):
+    """Count files attached to a book, given the book as it was before the update"""
+    if before is None:
+        return
+    deltas = {}
+    if "pdf_id" in fields:
+        deltas["books_with_pdf"] = 0 if before.get("pdf_id") else 1
+        deltas["pdf_bytes"] = (fields.get("file_size") or 0) - (before.get("file_size") or 0)
+    if "cover_id" in fields:
+        deltas["books_with_cover"] = 0 if before.get("cover_id") else 1
+    if any(deltas.values()):
+        await record_book_change(**deltas)
+
+async def reconcile_stats(backend: "BlobStorage", buckets: Iterable[str]) -> dict:
+    """Recompute the counters of the given buckets and of the books from scratch"""
+    buckets = list(buckets)
+    now = datetime.utcnow()
+    for bucket_name in buckets:
+        usage = await backend.usage(bucket_name)
+        await storage_stats_collection.replace_one(
+            {"_id": bucket_stats_id(backend.name, bucket_name)},
+            {
+                "backend": backend.name,
+                "bucket": bucket_name,
+                "files": usage["files"],
+                "bytes": usage["bytes"],
+                "updated_at": now,
+                "reconciled_at": now
+            },
+            upsert=True
+        )
+
+    result = await book_collection.aggregate([
+        {"$group": {
+            "_id": None,
+            "books": {"$sum": 1},
+            "books_with_pdf": {"$sum": {"$cond": [{"$ifNull": ["$pdf_id", False]}, 1, 0]}},
+            "books_with_cover": {"$sum": {"$cond": [{"$ifNull": ["$cover_id", False]}, 1, 0]}},
+            "pdf_bytes": {"$sum": {"$ifNull": ["$file_size", 0]}}
+        }}
+    ]).to_list(length=1)
+    books = result[0] if result else {"books": 0, "books_with_pdf": 0, "books_with_cover": 0, "pdf_bytes": 0}
+    categories = {
+        group["_id"]: group["count"]
+        async for group in book_collection.aggregate([
+            {"$group": {"_id": {"$ifNull": ["$category", DEFAULT_CATEGORY]}, "count": {"$sum": 1}}}
+        ])
+    }
+    await storage_stats_collection.replace_one(
+        {"_id": BOOKS_STATS_ID},
+        {
+            "books": books["books"],
+            "books_with_pdf": books["books_with_pdf"],
+            "books_with_cover": books["books_with_cover"],
+            "pdf_bytes": books["pdf_bytes"],
+            "categories": categories,
+            "updated_at": now,
+            "reconciled_at": now
+        },
+        upsert=True
+    )
+    logger.info(f"✓ Reconciled storage stats of {backend.name}")
+    return await read_stats(backend, buckets)
+
+async def read_stats(backend: "BlobStorage", buckets: Iterable[str]) -> dict:
+    """Current counters of the books and the given buckets.
+
+    Counters that were never reconciled only hold the changes made since
+    they were introduced, so they are computed from scratch once first.
+    """
+    buckets = list(buckets)
+    ids = [BOOKS_STATS_ID] + [bucket_stats_id(backend.name, bucket_name) for bucket_name in buckets]
+    docs = {doc["_id"]: doc async for doc in storage_stats_collection.find({"_id": {"$in": ids}})}
+    if (
+        any("reconciled_at" not in docs.get(stats_id, {}) for stats_id in ids)
+        or "categories" not in docs[BOOKS_STATS_ID]
+    ):
+        return await reconcile_stats(backend, buckets)
+
+    def bucket_usage(bucket_name: str) -> dict:
+        doc = docs.get(bucket_stats_id(backend.name, bucket_name)) or {}
+        return {"files": doc.get("files", 0), "bytes": doc.get("bytes", 0)}
+
+    books = docs[BOOKS_STATS_ID]
+    return {
+        "books": {
+            "books": books.get("books", 0),
+            "books_with_pdf": books.get("books_with_pdf", 0),
+            "books_with_cover": books.get("books_with_cover", 0),
+            "pdf_bytes": books.get("pdf_bytes", 0),
+            "categories": {category: count for category, count in books["categories"].items() if count > 0}
+        },
+        "buckets": {bucket_name: bucket_usage(bucket_name) for bucket_name in buckets},
+        "reconciled_at": books.get("reconciled_at")
+    }
@@ -0,0 +1,31 @@
+"""Selection of the blob storage backend configured for this deployment"""
+from app.config import (
+    STORAGE_BACKEND, LOCAL_STORAGE_DIR,
+    S3_ENDPOINT_URL, S3_BUCKET, S3_REGION, S3_ACCESS_KEY_ID, S3_SECRET_ACCESS_KEY
+)
+from app.database import database, local_file_collection, s3_file_collection
+from app.storage.backends.base import BlobStorage
+from app.storage.backends.gridfs_storage import GridFSStorage
+from app.storage.backends.local_storage import LocalStorage
+from app.storage.backends.s3_storage import S3Storage
+
+STORAGE_BACKENDS = ("gridfs", "local", "s3")
+
+def create_storage(backend: str) -> BlobStorage:
+    """Build a storage backend by name"""
+    if backend == "gridfs":
+        return GridFSStorage(database)
+    if backend == "local":
+        return LocalStorage(LOCAL_STORAGE_DIR, local_file_collection)
+    if backend == "s3":
+        return S3Storage(
+            s3_file_collection,
+            bucket=S3_BUCKET,
+            endpoint_url=S3_ENDPOINT_URL,
+            region=S3_REGION,
+            access_key_id=S3_ACCESS_KEY_ID,
+            secret_access_key=S3_SECRET_ACCESS_KEY
+        )
+    raise ValueError(f"Unknown storage backend '{backend}', expected one of {', '.join(STORAGE_BACKENDS)}")
+
+storage = create_storage(STORAGE_BACKEND)
@@ -0,0 +1,298 @@
+"""HTTP streaming helpers for stored blobs, independent of the storage backend"""
+import hashlib
+import logging
+import uuid
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import AsyncIterator, List, Optional, Tuple
+
+from bson import ObjectId
+from fastapi import HTTPException, Request, UploadFile
+from fastapi.responses import Response, StreamingResponse
+
+from app.storage.store import storage
+
+logger = logging.getLogger(__name__)
+
+# Bucket names used by the book routers
+PDF_BUCKET = "pdfs"
+COVER_BUCKET = "covers"
+PAGE_BUCKET = "pages"
+STAGING_BUCKET = "staging"  # Raw uploads waiting for the ingestion workers
+
+# Size of the pieces read from an upload and handed to the storage backend.
+# Matching the default GridFS chunk size means every write fills exactly one chunk.
+UPLOAD_PIECE_SIZE = 255 * 1024
+
+# Requests asking for more ranges than this get the full file instead
+MAX_RANGES = 16
+
+# Stored files never change (a new upload gets a new id), so clients may keep
+# them for a year. Private because every file endpoint requires a login.
+FILE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+async def get_blob_file(bucket_name: str, file_id: ObjectId) -> dict:
+    """Get the file document of a stored blob or raise 404"""
+    file_doc = await storage.stat(bucket_name, file_id)
+    if not file_doc:
+        raise HTTPException(status_code=404, detail="File not found")
+    return file_doc
+
+def iter_blob(
+    bucket_name: str,
+    file_doc: dict,
+    start: int = 0,
+    end: Optional[int] = None
+) -> AsyncIterator[bytes]:
+    """Yield bytes start..end (inclusive, default to the end) of a stored blob"""
+    return storage.get_range(bucket_name, file_doc, start, end)
+
+async def stream_upload(
+    file: UploadFile,
+    bucket_name: str,
+    filename: str,
+    metadata: dict,
+    max_size: int
+) -> Tuple[ObjectId, int, str]:
+    """Copy an upload into blob storage piece by piece.
+
+    The size limit is checked as bytes arrive and the SHA-256 digest is
+    computed in the same pass. Returns (file_id, size, sha256 hex digest).
+    """
+    too_large = HTTPException(
+        status_code=400,
+        detail=f"File too large. Maximum size: {max_size // (1024 * 1024)}MB"
+    )
+    if file.size is not None and file.size > max_size:
+        raise too_large
+
+    digest = hashlib.sha256()
+    metadata = dict(metadata)
+
+    async def pieces():
+        file_size = 0
+        while True:
+            piece = await file.read(UPLOAD_PIECE_SIZE)
+            if not piece:
+                break
+            file_size += len(piece)
+            if file_size > max_size:
+                raise too_large
+            digest.update(piece)
+            yield piece
+        # The backend reads the metadata once the stream is exhausted
+        metadata["original_size"] = file_size
+        metadata["sha256"] = digest.hexdigest()
+
+    file_doc = await storage.put_stream(bucket_name, pieces(), filename, metadata)
+    return file_doc["_id"], file_doc["length"], digest.hexdigest()
+
+def _upload_date(file_doc: dict) -> datetime:
+    """uploadDate as an aware UTC datetime truncated to HTTP date precision"""
+    return file_doc["uploadDate"].replace(microsecond=0, tzinfo=timezone.utc)
+
+def file_etag(file_doc: dict) -> str:
+    """Strong validator for a stored file: its content digest, or its id for older uploads"""
+    sha256 = (file_doc.get("metadata") or {}).get("sha256")
+    if sha256:
+        return f'"sha256-{sha256}"'
+    return f'"{file_doc["_id"]}"'
+
+def file_last_modified(file_doc: dict) -> str:
+    """HTTP date of the upload"""
+    return format_datetime(_upload_date(file_doc), usegmt=True)
+
+def validator_headers(file_doc: dict) -> dict:
+    """ETag, Last-Modified and Cache-Control for an immutable stored file"""
+    return {
+        "ETag": file_etag(file_doc),
+        "Last-Modified": file_last_modified(file_doc),
+        "Cache-Control": FILE_CACHE_CONTROL
+    }
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match list against an ETag"""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == opaque
+        for candidate in if_none_match.split(",")
+    )
+
+def not_modified_response(request: Request, file_doc: dict) -> Optional[Response]:
+    """Return a 304 when the client's cached copy is current, else None.
+
+    Uses only the file document, so revalidation never reads the bytes.
+    If-None-Match takes precedence over If-Modified-Since.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if not _etag_matches(if_none_match, file_etag(file_doc)):
+            return None
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        if not if_modified_since:
+            return None
+        try:
+            if _upload_date(file_doc) > parsedate_to_datetime(if_modified_since):
+                return None
+        except (TypeError, ValueError):
+            return None
+
+    return Response(status_code=304, headers=validator_headers(file_doc))
+
+def parse_range_header(range_header: str, length: int) -> Optional[List[Tuple[int, int]]]:
+    """Parse a bytes Range header into sorted, merged (start, end) pairs.
+
+    Returns None when the header should be ignored and the full file sent.
+    Raises 416 when none of the ranges can be satisfied.
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+
+    ranges = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, sep, last = part.partition("-")
+        if not sep:
+            return None
+        try:
+            if first == "":
+                # Suffix range: the last N bytes
+                suffix = int(last)
+                if suffix <= 0:
+                    continue
+                ranges.append((max(length - suffix, 0), length - 1))
+            else:
+                start = int(first)
+                if start >= length:
+                    continue
+                end = int(last) if last else length - 1
+                if start > end:
+                    return None
+                ranges.append((start, min(end, length - 1)))
+        except ValueError:
+            return None
+
+    if not ranges:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{length}"}
+        )
+
+    if len(ranges) > MAX_RANGES:
+        return None
+
+    # Coalesce overlapping or adjacent ranges so no byte is fetched twice
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        prev_start, prev_end = merged[-1]
+        if start <= prev_end + 1:
+            merged[-1] = (prev_start, max(prev_end, end))
+        else:
+            merged.append((start, end))
+    return merged
+
+def if_range_matches(if_range: Optional[str], file_doc: dict) -> bool:
+    """Check an If-Range validator (ETag or HTTP date) against the file"""
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        return if_range == file_etag(file_doc)
+    try:
+        return parsedate_to_datetime(if_range) == _upload_date(file_doc)
+    except (TypeError, ValueError):
+        return False
+
+async def _iter_multipart_ranges(
+    bucket_name: str,
+    file_doc: dict,
+    ranges: List[Tuple[int, int]],
+    part_headers: List[bytes],
+    boundary: str
+) -> AsyncIterator[bytes]:
+    """Yield a multipart/byteranges body"""
+    for (start, end), header in zip(ranges, part_headers):
+        yield header
+        async for data in iter_blob(bucket_name, file_doc, start, end):
+            yield data
+    yield f"\r\n--{boundary}--\r\n".encode()
+
+def blob_streaming_response(
+    request: Request,
+    bucket_name: str,
+    file_doc: dict,
+    media_type: Optional[str] = None,
+    disposition: str = "inline"
+) -> Response:
+    """Build a response that streams a stored blob.
+
+    Conditional requests are answered with 304 before any byte is read;
+    Range and If-Range are honoured otherwise.
+    """
+    not_modified = not_modified_response(request, file_doc)
+    if not_modified:
+        return not_modified
+
+    metadata = file_doc.get("metadata") or {}
+    filename = metadata.get("filename", f"file_{file_doc['_id']}")
+    media_type = media_type or metadata.get("content_type", "application/octet-stream")
+    length = file_doc["length"]
+
+    headers = {
+        "Content-Disposition": f"{disposition}; filename={filename}",
+        "Accept-Ranges": "bytes",
+        **validator_headers(file_doc)
+    }
+
+    range_header = request.headers.get("range")
+    ranges = None
+    if range_header and length > 0 and if_range_matches(request.headers.get("if-range"), file_doc):
+        ranges = parse_range_header(range_header, length)
+
+    if not ranges:
+        headers["Content-Length"] = str(length)
+        return StreamingResponse(
+            iter_blob(bucket_name, file_doc),
+            media_type=media_type,
+            headers=headers
+        )
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers["Content-Range"] = f"bytes {start}-{end}/{length}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(
+            iter_blob(bucket_name, file_doc, start, end),
+            status_code=206,
+            media_type=media_type,
+            headers=headers
+        )
+
+    # Multiple ranges: multipart/byteranges with an exact Content-Length
+    boundary = uuid.uuid4().hex
+    part_headers = [
+        (
+            f"\r\n--{boundary}\r\n"
+            f"Content-Type: {media_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{length}\r\n\r\n"
+        ).encode()
+        for start, end in ranges
+    ]
+    body_length = sum(len(h) for h in part_headers) + sum(end - start + 1 for start, end in ranges)
+    body_length += len(f"\r\n--{boundary}--\r\n")
+    headers["Content-Length"] = str(body_length)
+
+    return StreamingResponse(
+        _iter_multipart_ranges(bucket_name, file_doc, ranges, part_headers, boundary),
+        status_code=206,
+        media_type=f"multipart/byteranges; boundary={boundary}",
+        headers=headers
+    )
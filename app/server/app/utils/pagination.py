@@ -0,0 +1,140 @@
+"""Keyset (cursor) pagination for sorted listings.
+
+A page is requested relative to the sort key of an item the client already
+has instead of an offset, so each page is a range scan of a compound index
+ending in ``_id`` however deep it is, and books inserted meanwhile do not
+shift the following pages. Cursors are opaque to clients: URL-safe base64
+of the sort field and direction, the sort value and the ``_id``.
+
+Listings return the cursors of the neighbouring pages in the
+``X-Next-Cursor`` and ``X-Prev-Cursor`` headers, leaving the response body
+unchanged; pass one back as ``after`` or ``before``. Without a cursor the
+old ``skip`` parameter still applies.
+"""
+import base64
+from dataclasses import dataclass
+from typing import Any, Optional, Tuple
+
+from bson import json_util
+from fastapi import HTTPException, Response
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+PREV_CURSOR_HEADER = "X-Prev-Cursor"
+
+def encode_cursor(sort_field: str, sort_order: int, doc: dict) -> str:
+    payload = json_util.dumps({"f": sort_field, "o": sort_order, "v": doc.get(sort_field), "id": doc["_id"]})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(token: str, sort_field: str, sort_order: int) -> Tuple[Any, Any]:
+    """Sort value and _id of a cursor issued for the same sort"""
+    try:
+        payload = json_util.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        field, order, value, doc_id = payload["f"], payload["o"], payload["v"], payload["id"]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if (field, order) != (sort_field, sort_order):
+        raise HTTPException(status_code=400, detail="Cursor does not match the requested sort order")
+    return value, doc_id
+
+def keyset_filter(sort_field: str, sort_order: int, value: Any, doc_id: Any, forward: bool) -> dict:
+    """Items strictly after (forward) or before the given key in the sort order"""
+    op = "$gt" if (sort_order == 1) == forward else "$lt"
+    return {"$or": [
+        {sort_field: {op: value}},
+        {sort_field: value, "_id": {op: doc_id}}
+    ]}
+
+@dataclass
+class Page:
+    items: list
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+
+    def set_headers(self, response: Response):
+        if self.next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = self.next_cursor
+        if self.prev_cursor:
+            response.headers[PREV_CURSOR_HEADER] = self.prev_cursor
+
+@dataclass
+class PageQuery:
+    """Filter, sort and bounds that read one page, before or after a cursor"""
+    filter: dict
+    sort: list
+    skip: int
+    fetch: int
+    forward: bool
+    sort_field: str
+    sort_order: int
+    from_start: bool
+
+def page_query(
+    query_filter: dict,
+    sort_field: str,
+    sort_order: int,
+    limit: int,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    skip: int = 0
+) -> PageQuery:
+    if after and before:
+        raise HTTPException(status_code=400, detail="Pass either after or before, not both")
+    token = after or before
+    forward = before is None
+
+    if token:
+        value, doc_id = decode_cursor(token, sort_field, sort_order)
+        key_range = keyset_filter(sort_field, sort_order, value, doc_id, forward)
+        query_filter = {"$and": [query_filter, key_range]} if query_filter else key_range
+
+    # Pages before a cursor are read backwards from it, then put back in order
+    direction = sort_order if forward else -sort_order
+    return PageQuery(
+        filter=query_filter,
+        sort=[(sort_field, direction), ("_id", direction)],
+        skip=0 if token else skip,
+        fetch=limit + 1,
+        forward=forward,
+        sort_field=sort_field,
+        sort_order=sort_order,
+        from_start=not (after or skip)
+    )
+
+def build_page(docs: list, query: PageQuery) -> Page:
+    """Page and neighbouring cursors from the documents read for a PageQuery"""
+    limit = query.fetch - 1
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    if not query.forward:
+        docs.reverse()
+    if not docs:
+        return Page(docs)
+
+    first = encode_cursor(query.sort_field, query.sort_order, docs[0])
+    last = encode_cursor(query.sort_field, query.sort_order, docs[-1])
+    if query.forward:
+        return Page(docs, last if has_more else None, None if query.from_start else first)
+    return Page(docs, last, first if has_more else None)
+
+async def fetch_page(
+    collection: AsyncIOMotorCollection,
+    query_filter: dict,
+    sort_field: str,
+    sort_order: int,
+    limit: int,
+    after: Optional[str] = None,
+    before: Optional[str] = None,
+    skip: int = 0,
+    projection: Optional[dict] = None
+) -> Page:
+    """One page sorted by (sort_field, _id), relative to a cursor or an offset.
+
+    Needs an index on the equality fields of query_filter followed by
+    (sort_field, _id) to stay a bounded scan.
+    """
+    query = page_query(query_filter, sort_field, sort_order, limit, after, before, skip)
+    cursor = collection.find(query.filter, projection).sort(query.sort)
+    if query.skip:
+        cursor = cursor.skip(query.skip)
+    return build_page(await cursor.limit(query.fetch).to_list(length=query.fetch), query)
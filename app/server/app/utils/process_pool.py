@@ -0,0 +1,34 @@
+"""Shared process pool for CPU-heavy work (image resizing, PDF processing)"""
+import asyncio
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+
+from app.config import PROCESS_POOL_WORKERS
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Create the pool on first use so importing the app never forks"""
+    global _pool
+    if _pool is None:
+        workers = PROCESS_POOL_WORKERS or max(1, (os.cpu_count() or 2) - 1)
+        _pool = ProcessPoolExecutor(max_workers=workers)
+        logger.info(f"Started process pool with {workers} workers")
+    return _pool
+
+async def run_in_process(func: Callable, *args, **kwargs) -> Any:
+    """Run a picklable top-level function in the process pool without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), partial(func, *args, **kwargs))
+
+def shutdown_process_pool():
+    """Stop the pool on application shutdown"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
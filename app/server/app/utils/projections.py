@@ -0,0 +1,76 @@
+"""Named field sets for reading book documents.
+
+Book documents embed every review, so a list endpoint that reads whole
+documents mostly transfers review text it then throws away. Each response
+model has the projection of the fields it is built from; queries pass it to
+``find`` (or a ``$project`` stage) instead of reading everything.
+
+With WARN_UNPROJECTED_QUERIES set, ``UnprojectedQueryListener`` logs every
+query that reads whole book documents as a list (single-document lookups
+are allowed), to catch new endpoints that forget their projection;
+``app.scripts.check_query_plans`` fails on them.
+"""
+import logging
+from typing import Any, Iterable, Optional, Tuple
+
+from bson import json_util
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+def fields(*names: str) -> dict:
+    return {name: 1 for name in names}
+
+# BookResponse (listings, details, search results)
+BOOK_SUMMARY = fields(
+    "title", "author", "cover_id", "pdf_id", "rating", "description", "category",
+    "price", "created_at", "file_size", "status", "ingest_job_id"
+)
+# Personalized recommendations
+BOOK_RECOMMENDATION = fields(
+    "title", "author", "rating", "category", "price", "description", "created_at", "cover_id", "pdf_id"
+)
+# Category recommendations
+BOOK_CARD = fields("title", "author", "rating", "category", "price")
+# ReadingSessionResponse
+BOOK_READING = fields("title", "page_count")
+# CreatorBook
+CREATOR_BOOK = fields("title", "price", "is_public", "created_at", "comments_count")
+# Storage counters of a book (app.storage.stats.book_counts)
+BOOK_FILES = fields("pdf_id", "cover_id", "file_size")
+# Existence checks and id lists
+BOOK_ID = fields("_id")
+
+# Aggregation stages after which documents are no longer whole
+SHAPING_STAGES = {"$project", "$group", "$count", "$replaceRoot", "$replaceWith", "$unset", "$facet"}
+
+def unprojected_query(command_name: str, command: dict) -> Optional[Tuple[str, Any]]:
+    """Collection and filter (or pipeline) of a command reading whole documents as a list"""
+    if command_name == "find":
+        if command.get("projection") or command.get("limit") == 1:
+            return None
+        return command.get("find"), command.get("filter")
+    if command_name == "aggregate":
+        pipeline = command.get("pipeline") or []
+        if any(SHAPING_STAGES & set(stage) for stage in pipeline):
+            return None
+        return command.get("aggregate"), pipeline
+    return None
+
+class UnprojectedQueryListener(monitoring.CommandListener):
+    """Log list queries that read whole documents of the given collections"""
+
+    def __init__(self, collections: Iterable[str]):
+        self.collections = set(collections)
+
+    def started(self, event):
+        unprojected = unprojected_query(event.command_name, event.command)
+        if unprojected and unprojected[0] in self.collections:
+            collection, query = unprojected
+            logger.error(f"⚠️ Unprojected {event.command_name} on {collection}: {json_util.dumps(query)}")
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
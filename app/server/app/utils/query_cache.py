@@ -0,0 +1,228 @@
+"""In-process LRU/TTL cache of catalog query results.
+
+The first pages of the catalog listings are requested far more often than
+books change, so their built responses are kept in memory keyed by the
+normalized query. Concurrent misses of one key share a single load.
+
+Every entry carries tags naming what it depends on (``catalog_tags``); a
+write to a book invalidates the tags of its category, so only listings that
+could contain the book are dropped. A load that was already running when
+its tags were invalidated still answers its callers but is not cached.
+Lookups of many keys at once (``get_many_or_load``) load all their misses
+in one call and learn the tags of each value from the loader.
+Writes made by other processes (a separate ingest worker, the import
+script) are not seen here and show up once entries expire after the TTL.
+"""
+import asyncio
+import logging
+import sys
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from pydantic import BaseModel
+
+from app.config import QUERY_CACHE_MAX_BYTES, QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+def approximate_size(value: Any) -> int:
+    """Rough deep size in bytes of a cached response"""
+    if isinstance(value, BaseModel):
+        return sys.getsizeof(value) + approximate_size(value.__dict__)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(approximate_size(k) + approximate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(approximate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+@dataclass
+class CacheEntry:
+    value: Any
+    expires_at: float
+    tags: Tuple[str, ...]
+    size: int
+
+class QueryCache:
+    """LRU of query results with a TTL, an entry and a byte budget"""
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._tagged: Dict[str, Set[Hashable]] = defaultdict(set)
+        self._tag_versions: Dict[str, int] = defaultdict(int)
+        self._inflight: Dict[Hashable, Tuple[asyncio.Future, Tuple[str, ...]]] = {}
+        self._generation = 0  # invalidations so far, for loads whose tags are not known ahead
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.merged = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    async def get_or_load(self, key: Hashable, tags: Iterable[str], loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Cached value of key, or the result of loader (run once for concurrent misses)"""
+        if not self.enabled:
+            return await loader()
+
+        entry = self._lookup(key)
+        if entry is not None:
+            self.hits += 1
+            return entry.value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.merged += 1
+            return await asyncio.shield(inflight[0])
+
+        self.misses += 1
+        tags = tuple(tags)
+        versions = [self._tag_versions[tag] for tag in tags]
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = (future, tags)
+        try:
+            value = await loader()
+        except BaseException as e:
+            future.set_exception(e)
+            # Retrieved here so waiter-less failures are not logged as unhandled
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            if versions == [self._tag_versions[tag] for tag in tags]:
+                self._store(key, value, tags)
+            return value
+        finally:
+            if self._inflight.get(key, (None,))[0] is future:
+                del self._inflight[key]
+
+    async def get_many_or_load(
+        self,
+        keys: Iterable[Hashable],
+        loader: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Tuple[Any, Iterable[str]]]]]
+    ) -> Dict[Hashable, Any]:
+        """Cached values of keys, with every miss read in one loader call.
+        
+        loader gets the missing keys and returns (value, tags) for those it
+        found; keys it does not return are left out and not cached. Misses
+        are not shared with concurrent loads of the same keys.
+        """
+        keys = list(dict.fromkeys(keys))
+        if not self.enabled:
+            return {key: value for key, (value, _) in (await loader(keys)).items()}
+
+        values: Dict[Hashable, Any] = {}
+        missing = []
+        for key in keys:
+            entry = self._lookup(key)
+            if entry is None:
+                missing.append(key)
+            else:
+                values[key] = entry.value
+        self.hits += len(values)
+        if not missing:
+            return values
+
+        self.misses += len(missing)
+        generation = self._generation
+        loaded = await loader(missing)
+        # An invalidation during the load may concern any of the values
+        store = generation == self._generation
+        for key, (value, tags) in loaded.items():
+            values[key] = value
+            if store:
+                self._store(key, value, tuple(tags))
+        return values
+
+    def _lookup(self, key: Hashable) -> Optional[CacheEntry]:
+        """Live entry of key, dropping it if expired"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at > time.monotonic():
+            self._entries.move_to_end(key)
+            return entry
+        self._remove(key)
+        self.expirations += 1
+        return None
+
+    def _store(self, key: Hashable, value: Any, tags: Tuple[str, ...]):
+        size = approximate_size(value)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = CacheEntry(value, time.monotonic() + self.ttl_seconds, tags, size)
+        self.total_bytes += size
+        for tag in tags:
+            self._tagged[tag].add(key)
+        while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key)
+        self.total_bytes -= entry.size
+        for tag in entry.tags:
+            keys = self._tagged.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tagged[tag]
+
+    def invalidate(self, *tags: str):
+        """Drop every entry and pending load that depends on one of the tags"""
+        self._generation += 1
+        for tag in tags:
+            self._tag_versions[tag] += 1
+            for key in list(self._tagged.get(tag, ())):
+                self._remove(key)
+                self.invalidations += 1
+        # Later misses start a fresh load instead of joining a stale one
+        for key, (_, entry_tags) in list(self._inflight.items()):
+            if set(entry_tags) & set(tags):
+                del self._inflight[key]
+
+    def clear(self):
+        self._entries.clear()
+        self._tagged.clear()
+        self.total_bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.merged
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "size_mb": round(self.total_bytes / (1024 * 1024), 2),
+            "max_size_mb": round(self.max_bytes / (1024 * 1024), 2),
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "merged": self.merged,
+            "hit_rate": round((self.hits + self.merged) / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "loads_in_progress": len(self._inflight)
+        }
+
+catalog_cache = QueryCache(QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_MAX_BYTES, QUERY_CACHE_TTL_SECONDS)
+
+ALL_CATEGORIES_TAG = "books:all"
+
+def catalog_tags(category: Optional[str]) -> Tuple[str, ...]:
+    """Tags of a cached result over one category, or over all books"""
+    return (f"books:category:{category}",) if category else (ALL_CATEGORIES_TAG,)
+
+def invalidate_book(category: Optional[str]):
+    """Forget the cached results a book of this category may appear in"""
+    catalog_cache.invalidate(ALL_CATEGORIES_TAG, *catalog_tags(category or "อื่นๆ"))
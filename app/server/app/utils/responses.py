@@ -0,0 +1,23 @@
+"""JSON responses for data the application built itself.
+
+FastAPI validates whatever an endpoint returns against its response_model
+before serializing it, and encodes endpoints without one through
+``jsonable_encoder`` and the stdlib ``json``. For list endpoints returning
+documents they mapped themselves, both cost more than the rest of the
+request: those endpoints build plain dicts and return them encoded here with
+orjson. The route keeps its response_model for the OpenAPI schema.
+
+Values must already be JSON types, datetimes or None (convert ObjectIds).
+"""
+from typing import Any, Optional
+
+import orjson
+from fastapi import Response
+
+def json_response(content: Any, status_code: int = 200, headers: Optional[dict] = None) -> Response:
+    return Response(
+        orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS),
+        status_code=status_code,
+        headers=headers,
+        media_type="application/json"
+    )